@@ -0,0 +1,19 @@
+"""
+Minimal settings for data generator, strategy executer, replay and backtest
+processes (see comhelper.setDjangoEnvironment(runtime=True)).
+
+Only the database app is installed, so django.setup() does not import admin,
+auth, sessions, django_extensions or django_nose, and DEBUG is off so the
+connection does not keep every executed query in memory.
+"""
+from CTPTrader.settings import *
+
+DEBUG = False
+
+TEMPLATE_DEBUG = False
+
+INSTALLED_APPS = (
+    'database',
+)
+
+MIDDLEWARE_CLASSES = ()
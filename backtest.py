@@ -0,0 +1,599 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+回测引擎
+将一段时间的行情数据一次性载入numpy数组,按时间顺序调用策略的onDataArrived,
+交易使用内存中的模拟交易接口(BacktestTrader),撮合规则与SimulateTrader相同(见orderbook),
+不写数据库,输出成交记录和权益曲线
+用法:
+    python backtest.py <策略文件> <配置文件> --instrument IF1508 IF1509 --day 20150801 [--store 行情目录]
+"""
+from __future__ import division
+from orderbook import OrderBook
+from callback import CallbackManager
+from positionbook import PositionBook
+from futures import Future
+from comhelper import ns2datetime
+from tickstore import TickStore, TICK_COLUMNS
+from datetime import datetime
+import itertools
+import numpy
+import json
+import imp
+import os
+
+# 回测使用的行情列
+BACKTEST_COLUMNS = ['timestamp', 'AskPrice1', 'BidPrice1', 'AskVolume1', 'BidVolume1', 'LastPrice', 'Volume']
+
+# 回测时每次转化为python列表的记录数
+CHUNK_SIZE = 65536
+
+
+def loadTicks(instrumentIdList, tradingDayList, store=None, dataCatalog=None):
+    """
+    载入多个品种多个交易日的行情数据,按时间排序合并
+    优先使用行情文件(TickStore),没有文件时从数据库(ModelDepthMarketData)读取
+    参数:
+        instrumentIdList 品种列表
+        tradingDayList 交易日列表
+        store TickStore,默认为None表示只从数据库读取
+        dataCatalog 从数据库读取时使用的数据目录
+    返回:
+        列数据字典,包含BACKTEST_COLUMNS中的列和instrument列(品种在instrumentIdList中的序号)
+    """
+    partList = []
+    for tradingDay in tradingDayList:
+        for index, instrumentId in enumerate(instrumentIdList):
+            if store is not None and store.exists(instrumentId, tradingDay):
+                tickFile = store.load(instrumentId, tradingDay)
+                columns = dict((name, tickFile[name]) for name in BACKTEST_COLUMNS)
+            else:
+                columns = _loadFromDatabase(instrumentId, tradingDay, dataCatalog)
+            rows = len(columns['timestamp'])
+            if rows == 0:
+                continue
+            columns['instrument'] = numpy.empty(rows, dtype='<i4')
+            columns['instrument'].fill(index)
+            partList.append(columns)
+
+    dtypes = dict(TICK_COLUMNS)
+    if not partList:
+        ticks = dict((name, numpy.empty(0, dtype=dtypes[name])) for name in BACKTEST_COLUMNS)
+        ticks['instrument'] = numpy.empty(0, dtype='<i4')
+        return ticks
+    ticks = {}
+    for name in BACKTEST_COLUMNS + ['instrument']:
+        ticks[name] = numpy.concatenate([part[name] for part in partList])
+    # 按时间排序,时间相同时保持品种和记录的顺序
+    index = numpy.argsort(ticks['timestamp'], kind='mergesort')
+    for name in ticks:
+        ticks[name] = ticks[name][index]
+    return ticks
+
+
+def _loadFromDatabase(instrumentId, tradingDay, dataCatalog=None):
+    """
+    从数据库读取一个品种一个交易日的行情数据
+    """
+    from database.models import ModelDepthMarketData
+    from comhelper import getTickTime, datetime2ns
+
+    querySet = ModelDepthMarketData.objects.filter(InstrumentID=instrumentId, TradingDay=tradingDay)
+    if dataCatalog is not None:
+        querySet = querySet.filter(dataCatalog=dataCatalog)
+    fields = ['TradingDay', 'UpdateTime', 'UpdateMillisec'] + BACKTEST_COLUMNS[1:] + ['ActionDay']
+    rows = list(querySet.order_by('id').values_list(*fields))
+    dtypes = dict(TICK_COLUMNS)
+    columns = {}
+    columns['timestamp'] = numpy.array(
+        [datetime2ns(getTickTime(row[0], row[1], row[2], row[-1])) for row in rows], dtype='<i8')
+    for i, name in enumerate(BACKTEST_COLUMNS[1:]):
+        columns[name] = numpy.array([row[i + 3] for row in rows], dtype=dtypes[name])
+    return columns
+
+
+class _Record(object):
+    """
+    内存中的报单和头寸,字段名称与ModelOrder和ModelPosition一致
+    """
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.__dict__)
+
+
+class BacktestOrder(_Record):
+    pass
+
+
+class BacktestPosition(_Record):
+    pass
+
+
+class BacktestTrader(object):
+    """
+    回测使用的模拟交易接口
+    接口与Trader一致,报单和头寸只保存在内存中
+    NOTE: matchOnSubmit为True时,报单在提交时立即用最近的报价撮合,
+    策略可以在onDataArrived中同步等待openPositionAsync的结果;
+    为False时与SimulateTrader一样在下一个报价到达时撮合
+    """
+
+    def __init__(self, multiplier=1, matchOnSubmit=True):
+        """
+        multiplier 合约乘数,用于计算盈亏
+        matchOnSubmit 报单提交时是否立即撮合
+        """
+        self.multiplier = multiplier
+        self.matchOnSubmit = matchOnSubmit
+        self.events = [m for m in dir(self) if callable(getattr(self, m)) and m.startswith('on')]
+        self.__callbackManager = CallbackManager()
+        self.__orderBook = OrderBook()
+        self.__counter = itertools.count(1)
+        self.__orderDict = {}
+        self.__positionDict = {}
+        self.__futureDict = {}
+        # 品种 -> (ask, bid)
+        self.__quotes = {}
+        self.dataTime = None
+        # 已实现盈亏及每个品种的净头寸和持仓成本,用于计算权益
+        self.realizedPnl = 0.
+        self.__netVolume = {}
+        self.__cost = {}
+        # 已平仓的头寸
+        self.trades = []
+        self.positionBook = PositionBook()
+
+    def getClass(self):
+        return self.__class__.__name__
+
+    def bind(self, callbackName, funcToCall):
+        if callbackName not in self.events:
+            raise Exception('尝试绑带无效事件')
+        return self.__callbackManager.bind(callbackName, funcToCall)
+
+    def unbind(self, bindId):
+        return self.__callbackManager.unbind(bindId)
+
+    def __newOrder(self, position, action, **kwargs):
+        order = BacktestOrder(
+            id=next(self.__counter),
+            position=position,
+            instrumentId=position.instrumentId,
+            action=action,
+            direction=position.direction,
+            volume=position.volume,
+            openLimitPrice=position.openLimitPrice,
+            openPrice=position.openPrice,
+            closeLimitPrice=position.closeLimitPrice,
+            closePrice=None,
+            stopPrice=position.stopPrice,
+            profitPrice=position.profitPrice,
+            state='insert',
+            errorId=0,
+            errorMsg='',
+            createTime=self.dataTime,
+            finishTime=None,
+        )
+        order.__dict__.update(kwargs)
+        self.__orderDict[order.id] = order
+        return order
+
+    def openPosition(self, instrumentId, direction, volume=1, openLimitPrice=0, stopPrice=0, profitPrice=0):
+        """
+        开仓操作,参数见Trader.openPosition
+        """
+        order = self.__addOpenOrder(instrumentId, direction, volume, openLimitPrice, stopPrice, profitPrice)
+        self.__matchOnSubmit(instrumentId)
+        return order
+
+    def openPositions(self, legList):
+        """
+        批量开仓,参数见Trader.openPositions
+        所有报单提交后再撮合
+        """
+        orderList = []
+        for leg in legList:
+            if isinstance(leg, dict):
+                orderList.append(self.__addOpenOrder(**leg))
+            else:
+                orderList.append(self.__addOpenOrder(*leg))
+        for instrumentId in sorted(set(order.instrumentId for order in orderList)):
+            self.__matchOnSubmit(instrumentId)
+        return orderList
+
+    def __addOpenOrder(self, instrumentId, direction, volume=1, openLimitPrice=0, stopPrice=0, profitPrice=0):
+        """
+        创建开仓报单并加入报单簿
+        """
+        position = BacktestPosition(
+            id=next(self.__counter),
+            instrumentId=instrumentId,
+            direction=direction,
+            volume=volume,
+            openLimitPrice=openLimitPrice,
+            openPrice=None,
+            closeLimitPrice=0,
+            closePrice=None,
+            stopPrice=stopPrice,
+            profitPrice=profitPrice,
+            state='preopen',
+            openTime=None,
+            closeTime=None,
+        )
+        self.__positionDict[position.id] = position
+        order = self.__newOrder(position, 'open')
+        self.__orderBook.addOrder(order)
+        return order
+
+    def closePosition(self, positionId, closeLimitPrice=0):
+        """
+        平仓操作,参数见Trader.closePosition
+        """
+        return self.closePositions([positionId], closeLimitPrice)[0]
+
+    def closePositions(self, positionIdList, closeLimitPrice=0):
+        """
+        批量平仓,参数见Trader.closePositions
+        所有报单提交后再撮合
+        """
+        positionList = []
+        for positionId in positionIdList:
+            position = self.__positionDict.get(positionId)
+            if position is None or position.state != 'open':
+                raise Exception(u'头寸不存在或者不处于打开状态')
+            positionList.append(position)
+        orderList = []
+        for position in positionList:
+            position.state = 'preclose'
+            position.closeLimitPrice = closeLimitPrice
+            self.__orderBook.removePosition(position.id)
+            order = self.__newOrder(position, 'close', closeLimitPrice=closeLimitPrice)
+            self.__orderBook.addOrder(order)
+            orderList.append(order)
+        for instrumentId in sorted(set(order.instrumentId for order in orderList)):
+            self.__matchOnSubmit(instrumentId)
+        return orderList
+
+    def closeAll(self, instrumentId=None, direction=None):
+        """
+        平掉所有已打开的头寸,参数见Trader.closeAll
+        """
+        return self.closePositions([position.id for position in
+                                    self.positionBook.getPositionList(instrumentId, direction)
+                                    if position.state == 'open'])
+
+    def getLongVolume(self, instrumentId=None):
+        return self.positionBook.getLongVolume(instrumentId)
+
+    def getShortVolume(self, instrumentId=None):
+        return self.positionBook.getShortVolume(instrumentId)
+
+    def getNetVolume(self, instrumentId=None):
+        return self.positionBook.getNetVolume(instrumentId)
+
+    def cancelOrder(self, orderId):
+        """
+        取消挂单,立即生效
+        """
+        toOrder = self.__orderDict[orderId]
+        order = self.__newOrder(toOrder.position, 'cancel', order=toOrder)
+        if self.__orderBook.removeOrder(orderId) is None:
+            order.state = 'error'
+            return order
+        order.state = 'finish'
+        toOrder.state = 'cancel'
+        if toOrder.action == 'open':
+            toOrder.position.state = 'cancel'
+        else:
+            # 平仓挂单取消后头寸恢复为打开状态
+            toOrder.position.state = 'open'
+            self.__orderBook.addPosition(toOrder.position)
+        self.__resolveFuture(toOrder, cancel=True)
+        return order
+
+    def setStopPrice(self, positionId, stopPrice):
+        """
+        设置头寸的止损线,立即生效
+        """
+        position = self.__positionDict[positionId]
+        position.stopPrice = stopPrice
+        self.__orderBook.updatePosition(position)
+        return self.__newOrder(position, 'setstop', state='finish')
+
+    def setProfitPrice(self, positionId, profitPrice):
+        """
+        设置头寸的止盈线,立即生效
+        """
+        position = self.__positionDict[positionId]
+        position.profitPrice = profitPrice
+        self.__orderBook.updatePosition(position)
+        return self.__newOrder(position, 'setprofit', state='finish')
+
+    def openPositionAsync(self, *args, **kwargs):
+        """
+        参数和返回值见Trader.openPositionAsync
+        """
+        future = Future()
+        order = self.openPosition(*args, **kwargs)
+        self.__registerFuture(order, future)
+        return future
+
+    def closePositionAsync(self, *args, **kwargs):
+        """
+        参数和返回值见Trader.closePositionAsync
+        """
+        future = Future()
+        order = self.closePosition(*args, **kwargs)
+        self.__registerFuture(order, future)
+        return future
+
+    def openPositionsAsync(self, legList):
+        """
+        参数和返回值见Trader.openPositionsAsync
+        """
+        futureList = [Future() for leg in legList]
+        for order, future in zip(self.openPositions(legList), futureList):
+            self.__registerFuture(order, future)
+        return futureList
+
+    def closePositionsAsync(self, positionIdList, closeLimitPrice=0):
+        """
+        参数和返回值见Trader.closePositionsAsync
+        """
+        futureList = [Future() for positionId in positionIdList]
+        for order, future in zip(self.closePositions(positionIdList, closeLimitPrice), futureList):
+            self.__registerFuture(order, future)
+        return futureList
+
+    def __registerFuture(self, order, future):
+        # 提交时已经成交的报单直接设置结果
+        if order.state == 'finish':
+            future.setResult(order)
+        else:
+            self.__futureDict[order.id] = future
+
+    def __resolveFuture(self, order, cancel=False):
+        future = self.__futureDict.pop(order.id, None)
+        if future is None:
+            return
+        if cancel:
+            future.cancel()
+        else:
+            future.setResult(order)
+
+    def getPositionList(self, **kwargs):
+        """
+        头寸查询,kwargs为字段相等的查询条件
+        """
+        return [p for p in self.__positionDict.values() if all(getattr(p, k) == v for k, v in kwargs.items())]
+
+    def getOrderList(self, **kwargs):
+        """
+        报单查询,kwargs为字段相等的查询条件
+        """
+        return [o for o in self.__orderDict.values() if all(getattr(o, k) == v for k, v in kwargs.items())]
+
+    def __matchOnSubmit(self, instrumentId):
+        if self.matchOnSubmit and instrumentId in self.__quotes:
+            ask, bid = self.__quotes[instrumentId]
+            self.__matchOrders(instrumentId, ask, bid)
+
+    def __matchOrders(self, instrumentId, ask, bid):
+        for order, price in self.__orderBook.matchOrders(instrumentId, 'open', ask, bid):
+            order.openPrice = order.position.openPrice = price
+            self.__orderBook.addPosition(order.position)
+            self.onPositionOpened(order, order.position)
+        for order, price in self.__orderBook.matchOrders(instrumentId, 'close', ask, bid):
+            order.closePrice = order.position.closePrice = price
+            self.onPositionClosed(order, order.position)
+
+    def onDataArrived(self, instrumentId, ask, bid, dataTime=None):
+        """
+        品种的最近报价到达,处理顺序与SimulateTrader.onDataArrived相同
+        """
+        self.dataTime = dataTime
+        self.__quotes[instrumentId] = (ask, bid)
+        for kind in ('stop', 'profit'):
+            for position in self.__orderBook.matchTriggers(instrumentId, kind, ask, bid):
+                position.state = 'preclose'
+                self.__orderBook.addOrder(self.__newOrder(position, 'close'))
+        self.__matchOrders(instrumentId, ask, bid)
+
+    def onPositionOpened(self, order, position):
+        order.state = 'finish'
+        order.finishTime = self.dataTime
+        position.state = 'open'
+        position.openTime = self.dataTime
+        self.positionBook.add(position)
+        sign = 1 if position.direction == 'buy' else -1
+        self.__netVolume[position.instrumentId] = self.__netVolume.get(position.instrumentId, 0) + sign * position.volume
+        self.__cost[position.instrumentId] = \
+            self.__cost.get(position.instrumentId, 0) + sign * position.volume * position.openPrice
+        self.__resolveFuture(order)
+        self.__callbackManager.callback('onPositionOpened', {'order': order, 'position': position})
+
+    def onPositionClosed(self, order, position):
+        order.state = 'finish'
+        order.finishTime = self.dataTime
+        position.state = 'close'
+        position.closeTime = self.dataTime
+        self.positionBook.remove(position.id)
+        sign = 1 if position.direction == 'buy' else -1
+        self.__netVolume[position.instrumentId] -= sign * position.volume
+        self.__cost[position.instrumentId] -= sign * position.volume * position.openPrice
+        pnl = sign * (position.closePrice - position.openPrice) * position.volume * self.multiplier
+        self.realizedPnl += pnl
+        self.trades.append((position, pnl))
+        self.__resolveFuture(order)
+        self.__callbackManager.callback('onPositionClosed', {'order': order, 'position': position})
+
+    def getEquity(self):
+        """
+        当前权益 = 已实现盈亏 + 按各品种最近的中间价计算的浮动盈亏
+        """
+        equity = self.realizedPnl
+        for instrumentId, netVolume in self.__netVolume.items():
+            if netVolume == 0 and self.__cost[instrumentId] == 0:
+                continue
+            ask, bid = self.__quotes[instrumentId]
+            equity += (netVolume * (ask + bid) / 2 - self.__cost[instrumentId]) * self.multiplier
+        return equity
+
+
+class BacktestResult(object):
+    """
+    回测结果
+    """
+
+    def __init__(self, trader, timestamps, equity):
+        """
+        trader 回测使用的BacktestTrader
+        timestamps 每个报价的时间戳
+        equity 每个报价之后的权益
+        """
+        self.trader = trader
+        self.timestamps = timestamps
+        self.equity = equity
+        self.trades = [{
+            'instrumentId': position.instrumentId,
+            'direction': position.direction,
+            'volume': position.volume,
+            'openTime': position.openTime,
+            'openPrice': position.openPrice,
+            'closeTime': position.closeTime,
+            'closePrice': position.closePrice,
+            'pnl': pnl,
+        } for position, pnl in trader.trades]
+
+    def getMaxDrawdown(self):
+        """
+        权益曲线的最大回撤
+        """
+        if len(self.equity) == 0:
+            return 0.
+        return float(numpy.max(numpy.maximum.accumulate(self.equity) - self.equity))
+
+    def getSummary(self):
+        """
+        回测结果汇总
+        """
+        pnlList = numpy.array([trade['pnl'] for trade in self.trades])
+        return {
+            'pnl': float(self.equity[-1]) if len(self.equity) else 0.,
+            'realizedPnl': self.trader.realizedPnl,
+            'maxDrawdown': self.getMaxDrawdown(),
+            'tradeCount': len(self.trades),
+            'winRate': float(numpy.mean(pnlList > 0)) if len(pnlList) else 0.,
+            'ticks': len(self.timestamps),
+        }
+
+
+def loadStrategy(strategyFile, moduleName=None):
+    """
+    载入策略模块,每次载入都是新的模块,模块中的全局变量互不影响
+    """
+    moduleName = moduleName or 'backtest_%s_%d' % (os.path.splitext(os.path.basename(strategyFile))[0], id(object()))
+    module = imp.load_source(moduleName, strategyFile)
+    if not hasattr(module, 'onDataArrived'):
+        raise Exception(u'交易策略必须实现onDataArrived方法')
+    return module
+
+
+def runBacktest(strategyModule, config, instrumentIdList, ticks, multiplier=1, matchOnSubmit=True):
+    """
+    运行回测
+    参数:
+        strategyModule 策略模块(或策略文件路径)
+        config 策略配置(字典),传给策略的onInit
+        instrumentIdList 品种列表,与ticks中的instrument列对应
+        ticks loadTicks的返回值
+        multiplier 合约乘数
+        matchOnSubmit 报单提交时是否立即撮合,见BacktestTrader
+    返回:
+        BacktestResult
+    """
+    if isinstance(strategyModule, basestring):
+        strategyModule = loadStrategy(strategyModule)
+    trader = BacktestTrader(multiplier, matchOnSubmit)
+    if hasattr(strategyModule, 'onInit'):
+        strategyModule.onInit(config)
+    varNames = strategyModule.onDataArrived.func_code.co_varnames
+
+    timestamps = ticks['timestamp']
+    equity = numpy.empty(len(timestamps), dtype='<f8')
+    names = ('instrument', 'timestamp', 'AskPrice1', 'BidPrice1', 'AskVolume1', 'BidVolume1', 'LastPrice', 'Volume')
+    i = 0
+    # NOTE: 分段转化为python列表,逐条读取比numpy标量快,又不需要复制全部数据(ticks可以是共享的memmap)
+    for start in range(0, len(timestamps), CHUNK_SIZE):
+        columns = [ticks[name][start:start + CHUNK_SIZE].tolist() for name in names]
+        for instrument, timestamp, ask, bid, askVolume, bidVolume, lastPrice, volume in zip(*columns):
+            instrumentId = instrumentIdList[instrument]
+            dataTime = ns2datetime(timestamp)
+            trader.onDataArrived(instrumentId, ask, bid, dataTime)
+            data = {
+                'instrumentID': instrumentId,
+                'ask': ask,
+                'bid': bid,
+                'askVolume': askVolume,
+                'bidVolume': bidVolume,
+                'lastPrice': lastPrice,
+                'volume': volume,
+                'timestamp': timestamp,
+                'dataTime': dataTime,
+            }
+            kwargs = {}
+            if 'data' in varNames:
+                kwargs['data'] = data
+            if 'trader' in varNames:
+                kwargs['trader'] = trader
+            strategyModule.onDataArrived(**kwargs)
+            equity[i] = trader.getEquity()
+            i += 1
+
+    if hasattr(strategyModule, 'onExit'):
+        strategyModule.onExit(trader)
+    return BacktestResult(trader, timestamps, equity)
+
+
+def main():
+    """
+    命令行入口
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('strategy', help=u'策略文件')
+    parser.add_argument('config', help=u'策略配置文件')
+    parser.add_argument('--instrument', nargs='+', required=True)
+    parser.add_argument('--day', nargs='+', required=True)
+    parser.add_argument('--store', help=u'行情文件目录,见tickstore.py')
+    parser.add_argument('--catalog', type=int)
+    parser.add_argument('--multiplier', type=float, default=1)
+    parser.add_argument('--output', help=u'成交记录输出文件(json)')
+    args = parser.parse_args()
+
+    from comhelper import setDjangoEnvironment
+    setDjangoEnvironment(runtime=True)
+
+    store = TickStore(args.store) if args.store else None
+    t0 = datetime.now()
+    ticks = loadTicks(args.instrument, args.day, store, args.catalog)
+    t1 = datetime.now()
+    with open(args.config) as f:
+        config = json.load(f)
+    result = runBacktest(args.strategy, config, args.instrument, ticks, args.multiplier)
+    t2 = datetime.now()
+
+    print u'载入%d条行情数据,耗时%.1f秒,回测耗时%.1f秒' % (
+        len(result.timestamps), (t1 - t0).total_seconds(), (t2 - t1).total_seconds())
+    for name, value in sorted(result.getSummary().items()):
+        print '%s = %s' % (name, value)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result.trades, f, default=str, indent=1)
+
+
+if __name__ == '__main__':
+    main()
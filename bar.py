@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+流式棒线(OHLCV)生成
+数据生成器每收到一条行情调用BarAggregator.update,得到已完成的棒线,随行情广播(BarData)并批量保存
+棒线周期:
+    <n>s, <n>m, <n>h 时间棒线,按时间戳对齐,下一个周期的第一条行情到达时完成
+    v<n>             成交量棒线,累计成交量达到n时完成
+"""
+from comhelper import ns2datetime
+
+# 默认的棒线周期
+DEFAULT_BAR_PERIODS = ['1s', '1m', '5m']
+
+# 时间单位 -> 纳秒
+TIME_UNITS = {'s': 1000000000, 'm': 60 * 1000000000, 'h': 3600 * 1000000000}
+
+
+def parsePeriod(period):
+    """
+    解析棒线周期
+    参数:
+        period 周期字符串,如'1m','v100'
+    返回:
+        ('time', 纳秒) 或 ('volume', 成交量)
+    """
+    try:
+        if period[0] == 'v':
+            size = int(period[1:])
+            kind = 'volume'
+        else:
+            size = int(period[:-1]) * TIME_UNITS[period[-1]]
+            kind = 'time'
+    except (ValueError, KeyError, IndexError):
+        raise Exception(u'无效的棒线周期:%s' % period)
+    if size <= 0:
+        raise Exception(u'无效的棒线周期:%s' % period)
+    return kind, size
+
+
+class Bar(object):
+    """
+    一根棒线
+    beginTime,endTime为纳秒时间戳,时间棒线为周期的起止时间,成交量棒线为第一条和最后一条行情的时间
+    """
+    __slots__ = ('instrumentId', 'period', 'beginTime', 'endTime', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, instrumentId, period, beginTime, endTime, open, high, low, close, volume):
+        self.instrumentId = instrumentId
+        self.period = period
+        self.beginTime = beginTime
+        self.endTime = endTime
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    def __repr__(self):
+        return '<Bar %s %s %s O:%s H:%s L:%s C:%s V:%s>' % (
+            self.instrumentId, self.period, ns2datetime(self.beginTime),
+            self.open, self.high, self.low, self.close, self.volume)
+
+    def toDict(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def toModel(self, dataCatalog=None):
+        """
+        转化为数据实体(ModelBarData)
+        """
+        from database.models import ModelBarData
+        return ModelBarData(
+            dataCatalog=dataCatalog,
+            InstrumentID=self.instrumentId,
+            period=self.period,
+            beginTime=ns2datetime(self.beginTime),
+            endTime=ns2datetime(self.endTime),
+            OpenPrice=self.open,
+            HighPrice=self.high,
+            LowPrice=self.low,
+            ClosePrice=self.close,
+            Volume=self.volume,
+        )
+
+
+class BarBuilder(object):
+    """
+    一个品种一个周期的棒线生成器
+    """
+
+    def __init__(self, instrumentId, period):
+        """
+        instrumentId 品种
+        period 棒线周期,见parsePeriod
+        """
+        self.instrumentId = instrumentId
+        self.period = period
+        self.kind, self.size = parsePeriod(period)
+        # 正在生成的棒线
+        self.bar = None
+
+    def update(self, timestamp, price, volume):
+        """
+        加入一条行情
+        参数:
+            timestamp 纳秒时间戳
+            price 最新价
+            volume 与上一条行情之间的成交量
+        返回:
+            已完成的棒线,没有时返回None
+        """
+        result = None
+        bar = self.bar
+        if self.kind == 'time':
+            beginTime = timestamp - timestamp % self.size
+            if bar is not None and bar.beginTime != beginTime:
+                result, bar = bar, None
+            if bar is None:
+                bar = self.bar = Bar(
+                    self.instrumentId, self.period, beginTime, beginTime + self.size, price, price, price, price, 0)
+        elif bar is None:
+            bar = self.bar = Bar(self.instrumentId, self.period, timestamp, timestamp, price, price, price, price, 0)
+
+        if price > bar.high:
+            bar.high = price
+        if price < bar.low:
+            bar.low = price
+        bar.close = price
+        bar.volume += volume
+
+        if self.kind == 'volume':
+            bar.endTime = timestamp
+            if bar.volume >= self.size:
+                result, self.bar = bar, None
+        return result
+
+    def flush(self):
+        """
+        结束生成,返回未完成的棒线,没有时返回None
+        """
+        bar, self.bar = self.bar, None
+        return bar
+
+
+class BarAggregator(object):
+    """
+    多个品种多个周期的棒线生成器
+    行情中的成交量(Volume)为当日累计值,按与上一条行情的差值计入棒线
+    """
+
+    def __init__(self, periodList=None):
+        """
+        periodList 棒线周期列表,默认为DEFAULT_BAR_PERIODS
+        """
+        self.periodList = list(periodList if periodList is not None else DEFAULT_BAR_PERIODS)
+        for period in self.periodList:
+            parsePeriod(period)
+        # 品种 -> 生成器列表
+        self.__builders = {}
+        # 品种 -> 上一条行情的累计成交量
+        self.__lastVolume = {}
+
+    def update(self, instrumentId, timestamp, price, totalVolume):
+        """
+        加入一条行情
+        参数:
+            instrumentId 品种
+            timestamp 纳秒时间戳
+            price 最新价,为0(没有成交价)时忽略
+            totalVolume 当日累计成交量
+        返回:
+            已完成的棒线列表
+        """
+        lastVolume = self.__lastVolume.get(instrumentId)
+        self.__lastVolume[instrumentId] = totalVolume
+        if not price:
+            return []
+        # NOTE: 第一条行情之前的成交量未知,不计入;累计成交量变小说明进入了新的交易日
+        if lastVolume is None:
+            volume = 0
+        elif totalVolume >= lastVolume:
+            volume = totalVolume - lastVolume
+        else:
+            volume = totalVolume
+
+        builders = self.__builders.get(instrumentId)
+        if builders is None:
+            builders = self.__builders[instrumentId] = [BarBuilder(instrumentId, p) for p in self.periodList]
+        result = []
+        for builder in builders:
+            bar = builder.update(timestamp, price, volume)
+            if bar is not None:
+                result.append(bar)
+        return result
+
+    def flush(self):
+        """
+        结束生成,返回所有未完成的棒线
+        """
+        result = []
+        for instrumentId in sorted(self.__builders):
+            for builder in self.__builders[instrumentId]:
+                bar = builder.flush()
+                if bar is not None:
+                    result.append(bar)
+        return result
@@ -0,0 +1,4 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+
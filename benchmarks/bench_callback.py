@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from callback import CallbackManager
+import argparse
+import threading
+import time
+import uuid
+
+
+class LockedCallbackManager(object):
+    """
+    原有实现: 调用回调函数的整个过程都持有锁,每个回调函数查两次字典
+    """
+
+    def __init__(self):
+        self.__callbackDict = {}
+        self.__callbackUuidDict = {}
+        self.__callbackLock = threading.RLock()
+
+    def bind(self, callbackName, funcToCall):
+        with self.__callbackLock:
+            callbackUuid = uuid.uuid1()
+            self.__callbackUuidDict[callbackUuid] = {'callbackName': callbackName, 'funcToCall': funcToCall}
+            if callbackName in self.__callbackDict.keys():
+                self.__callbackDict[callbackName].append(callbackUuid)
+            else:
+                self.__callbackDict[callbackName] = [callbackUuid]
+            return callbackUuid
+
+    def callback(self, callbackName, args):
+        self.__callbackLock.acquire()
+        try:
+            if callbackName not in self.__callbackDict.keys():
+                return
+            for callbackUuid in self.__callbackDict[callbackName]:
+                funcToCall = self.__callbackUuidDict[callbackUuid]['funcToCall']
+                try:
+                    funcToCall(**args)
+                except Exception as e:
+                    print e
+        finally:
+            self.__callbackLock.release()
+
+
+def handler(order, position):
+    pass
+
+
+def bench(managerClass, handlerCount, calls, eventCount):
+    """
+    绑定eventCount种事件,每种事件handlerCount个回调函数,调用calls次其中一种事件
+    返回: 每次调用的平均耗时,单位:微秒
+    """
+    manager = managerClass()
+    for i in range(eventCount):
+        for j in range(handlerCount):
+            manager.bind('onEvent%d' % i, handler)
+    args = {'order': None, 'position': None}
+    t0 = time.time()
+    for i in range(calls):
+        manager.callback('onEvent0', args)
+    return (time.time() - t0) / calls * 1e6
+
+
+def main():
+    """
+    比较回调函数调用的两种实现
+    python benchmarks/bench_callback.py [--calls 100000] [--events 12]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=12)
+    args = parser.parse_args()
+
+    print '%-9s %14s %14s %8s' % ('handlers', 'locked(us)', 'snapshot(us)', 'speedup')
+    for handlerCount in (1, 10, 100):
+        calls = max(args.calls // handlerCount, 1)
+        locked = bench(LockedCallbackManager, handlerCount, calls, args.events)
+        snapshot = bench(CallbackManager, handlerCount, calls, args.events)
+        print '%-9d %14.3f %14.3f %7.1fx' % (handlerCount, locked, snapshot, locked / snapshot)
+
+
+if __name__ == '__main__':
+    main()
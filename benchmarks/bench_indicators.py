@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strategies.indicators import RollingStats
+from collections import deque
+from pandas import Series
+import argparse
+import random
+import time
+
+
+def benchSeries(values, window):
+    """
+    原有实现: 每次使用deque构造Series再计算均值
+    """
+    diffs = deque(maxlen=window)
+    result = 0
+    for value in values:
+        diffs.append(value)
+        result = Series(diffs).mean()
+    return result
+
+
+def benchRollingStats(values, window):
+    """
+    增量实现: RollingStats
+    """
+    diffs = RollingStats(window)
+    result = 0
+    for value in values:
+        diffs.append(value)
+        result = diffs.mean()
+    return result
+
+
+def main():
+    """
+    比较sample策略中价差均值的两种计算方式
+    python benchmarks/bench_indicators.py [--ticks 20000] [--window 400]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ticks', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=400)
+    args = parser.parse_args()
+
+    random.seed(0)
+    values = [random.gauss(0, 5) for i in range(args.ticks)]
+
+    results = []
+    for name, func in (('Series', benchSeries), ('RollingStats', benchRollingStats)):
+        t0 = time.time()
+        mean = func(values, args.window)
+        dt = time.time() - t0
+        results.append(dt)
+        print '%-12s %8.3fs %10.0f ticks/s  mean=%.6f' % (name, dt, args.ticks / dt, mean)
+    print 'speedup = %.1fx' % (results[0] / results[1])
+
+
+if __name__ == '__main__':
+    main()
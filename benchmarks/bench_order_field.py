@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from orderfield import InputOrderFieldPool
+from comhelper import orderId2Ref
+import argparse
+import time
+
+
+class Field(object):
+    """
+    pyctp不可用时使用的报单数据,只比较python层面设置字段的开销
+    """
+    pass
+
+
+class CountingField(object):
+    """
+    统计字段写入次数的报单数据
+    """
+    writes = 0
+
+    def __setattr__(self, name, value):
+        CountingField.writes += 1
+        object.__setattr__(self, name, value)
+
+
+def countWrites(bench, orderList):
+    """
+    返回: 每个报单平均写入的字段数量,pyctp报单数据的每次写入都要经过扩展模块转换
+    """
+    CountingField.writes = 0
+    bench(CountingField, orderList)
+    return CountingField.writes / len(orderList)
+
+
+class Order(object):
+
+    def __init__(self, id, instrumentId, action, direction, volume):
+        self.id = id
+        self.instrumentId = instrumentId
+        self.action = action
+        self.direction = direction
+        self.volume = volume
+
+
+def buildField(fieldClass, brokerID, userID, order):
+    """
+    原有实现: 每个报单创建新的报单数据并设置全部字段
+    """
+    inputOrderField = fieldClass()
+    inputOrderField.BrokerID = brokerID
+    inputOrderField.InvestorID = userID
+    inputOrderField.InstrumentID = order.instrumentId
+    inputOrderField.OrderRef = orderId2Ref(order.id)
+    inputOrderField.UserID = userID
+    inputOrderField.OrderPriceType = '1'
+    if order.action == 'open':
+        inputOrderField.CombOffsetFlag = '0'
+        inputOrderField.Direction = {'buy': '0', 'sell': '1'}[order.direction]
+    elif order.action == 'close':
+        inputOrderField.CombOffsetFlag = '1'
+        inputOrderField.Direction = {'buy': '1', 'sell': '0'}[order.direction]
+    else:
+        raise Exception(u'未知的操作方向')
+    inputOrderField.CombHedgeFlag = '1'
+    inputOrderField.LimitPrice = 0
+    inputOrderField.VolumeTotalOriginal = order.volume
+    inputOrderField.TimeCondition = '1'
+    inputOrderField.GTDDate = ''
+    inputOrderField.VolumeCondition = '1'
+    inputOrderField.MinVolume = order.volume
+    inputOrderField.ContingentCondition = '1'
+    inputOrderField.StopPrice = 0
+    inputOrderField.ForceCloseReason = '0'
+    inputOrderField.IsAutoSuspend = 0
+    inputOrderField.BusinessUnit = ''
+    inputOrderField.RequestID = 1
+    inputOrderField.UserForceClose = 0
+    inputOrderField.IsSwapOrder = 0
+    return inputOrderField
+
+
+def benchBuild(fieldClass, orderList):
+    """
+    返回: 每个报单的平均耗时,单位:微秒
+    """
+    t0 = time.time()
+    for order in orderList:
+        buildField(fieldClass, '9999', '000001', order)
+    return (time.time() - t0) / len(orderList) * 1e6
+
+
+def benchPool(fieldClass, orderList):
+    """
+    返回: 每个报单的平均耗时(获取并放回),单位:微秒
+    """
+    pool = InputOrderFieldPool(fieldClass, '9999', '000001')
+    t0 = time.time()
+    for order in orderList:
+        pool.release(pool.acquire(order))
+    return (time.time() - t0) / len(orderList) * 1e6
+
+
+def main():
+    """
+    比较报单数据的两种构造方式,每种方式重复测试若干次取最小值
+    安装了pyctp时使用CThostFtdcInputOrderField,否则使用普通的python对象
+    python benchmarks/bench_order_field.py [--orders 100000] [--instruments 4] [--repeat 5]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--instruments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import pyctp
+        fieldClass = pyctp.struct.CThostFtdcInputOrderField
+    except ImportError:
+        fieldClass = Field
+    print 'field class: %s.%s' % (fieldClass.__module__, fieldClass.__name__)
+
+    orderList = [
+        Order(i + 1, 'IF15%02d' % (i % args.instruments), ('open', 'close')[i // 2 % 2], ('buy', 'sell')[i % 2], 1)
+        for i in range(args.orders)
+    ]
+    build = min(benchBuild(fieldClass, orderList) for i in range(args.repeat))
+    pooled = min(benchPool(fieldClass, orderList) for i in range(args.repeat))
+    print '%14s %14s %8s %16s %16s' % ('build(us)', 'pool(us)', 'speedup', 'build(writes)', 'pool(writes)')
+    print '%14.3f %14.3f %7.1fx %16.1f %16.1f' % (
+        build, pooled, build / pooled, countWrites(benchBuild, orderList), countWrites(benchPool, orderList))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comhelper import setDjangoEnvironment
+setDjangoEnvironment(runtime=True)
+from database.models import ModelStrategyExecuter, ModelDataGenerator
+from trader import SimulateTrader
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from datetime import datetime
+import subprocess
+import argparse
+import resource
+import random
+import json
+import time
+
+# 默认的测试场景: (品种数量, 挂单数量, 带止损止盈的头寸数量, 每100个报价新开的市价单数量)
+SCENARIOS = [
+    (1, 0, 0, 0),
+    (1, 100, 100, 0),
+    (1, 1000, 1000, 0),
+    (10, 1000, 1000, 0),
+    (1, 100, 100, 10),
+]
+
+RESULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'bench_simulate_trader.jsonl')
+
+
+def getRss():
+    """
+    当前进程占用的物理内存,单位:MB
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+    except IOError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def getCommit():
+    """
+    当前代码的提交编号
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def createExecuter(name):
+    """
+    为每个场景创建单独的策略执行器,场景之间的报单互不影响
+    """
+    modelDataGenerator = ModelDataGenerator(
+        code=name, name=name, dataSource='database', instrumentIdList='[]')
+    modelDataGenerator.save()
+    modelStrategyExecuter = ModelStrategyExecuter(
+        code=name, name=name, dataGenerator=modelDataGenerator, instrumentIdList='[]', traderClass='SimulateTrader')
+    modelStrategyExecuter.save()
+    return modelStrategyExecuter
+
+
+def generateTicks(instrumentIdList, count, seed):
+    """
+    生成随机游走的报价,价格不会触及挂单和止损止盈
+    返回: [(品种, ask, bid), ...]
+    """
+    random_ = random.Random(seed)
+    prices = dict((instrumentId, 3900.) for instrumentId in instrumentIdList)
+    ticks = []
+    for i in range(count):
+        instrumentId = random_.choice(instrumentIdList)
+        price = min(max(prices[instrumentId] + random_.choice((-.2, 0, .2)), 3000), 4800)
+        prices[instrumentId] = price
+        ticks.append((instrumentId, price + .2, price))
+    return ticks
+
+
+def runScenario(instrumentCount, orderCount, positionCount, churn, tickCount, seed):
+    """
+    运行一个测试场景
+    返回: 测试结果字典
+    """
+    name = 'bench-%d-%d-%d-%d-%d' % (instrumentCount, orderCount, positionCount, churn, time.time() * 1000)
+    trader = SimulateTrader(createExecuter(name))
+    instrumentIdList = ['IF%04d' % (1508 + i) for i in range(instrumentCount)]
+    random_ = random.Random(seed)
+
+    # 挂单: 买单价格远低于报价,卖单价格远高于报价,不会成交
+    for i in range(orderCount):
+        instrumentId = instrumentIdList[i % instrumentCount]
+        if i % 2 == 0:
+            trader.openPosition(instrumentId, 'buy', openLimitPrice=1)
+        else:
+            trader.openPosition(instrumentId, 'sell', openLimitPrice=1e6)
+
+    # 头寸: 止损止盈价格远离报价,不会触发
+    for i in range(positionCount):
+        instrumentId = instrumentIdList[i % instrumentCount]
+        if i % 2 == 0:
+            trader.openPosition(instrumentId, 'buy', stopPrice=1, profitPrice=1e6)
+        else:
+            trader.openPosition(instrumentId, 'sell', stopPrice=1e6, profitPrice=1)
+    for instrumentId in instrumentIdList:
+        trader.onDataArrived(instrumentId, 3900.2, 3900)
+
+    ticks = generateTicks(instrumentIdList, tickCount, seed)
+    rss0 = getRss()
+    with CaptureQueriesContext(connection) as queries:
+        t0 = time.time()
+        for i, (instrumentId, ask, bid) in enumerate(ticks):
+            if churn and i % 100 < churn:
+                trader.openPosition(instrumentId, random_.choice(('buy', 'sell')))
+            trader.onDataArrived(instrumentId, ask, bid)
+        elapsed = time.time() - t0
+
+    return {
+        'instruments': instrumentCount,
+        'orders': orderCount,
+        'positions': positionCount,
+        'churn': churn,
+        'ticks': tickCount,
+        'ticksPerSecond': tickCount / elapsed,
+        'queriesPerTick': len(queries) / tickCount,
+        'rssMB': getRss(),
+        'rssDeltaMB': getRss() - rss0,
+    }
+
+
+def loadPrevious(path, commit):
+    """
+    读取其他提交最近一次的测试结果
+    返回: 场景 -> 测试结果
+    """
+    result = {}
+    if not os.path.exists(path):
+        return result
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record['commit'] == commit:
+                continue
+            key = (record['instruments'], record['orders'], record['positions'], record['churn'])
+            result[key] = record
+    return result
+
+
+def main():
+    """
+    SimulateTrader撮合路径的性能测试
+    在测试数据库中运行各个场景,结果追加到benchmarks/results/bench_simulate_trader.jsonl,
+    并与其他提交最近一次的结果比较
+    python benchmarks/bench_simulate_trader.py [--ticks 5000] [--seed 0] [--no-save]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ticks', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULT_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    commit = getCommit()
+    previous = loadPrevious(args.output, commit)
+    oldName = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        records = []
+        print '%-22s %12s %10s %8s %8s %16s' % ('scenario', 'ticks/s', 'queries', 'rss(MB)', 'delta', 'previous ticks/s')
+        for instrumentCount, orderCount, positionCount, churn in SCENARIOS:
+            record = runScenario(instrumentCount, orderCount, positionCount, churn, args.ticks, args.seed)
+            record['commit'] = commit
+            record['time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            records.append(record)
+            key = (instrumentCount, orderCount, positionCount, churn)
+            last = previous.get(key)
+            print '%-22s %12.0f %10.3f %8.1f %8.1f %16s' % (
+                '%d/%d/%d/%d' % key,
+                record['ticksPerSecond'],
+                record['queriesPerTick'],
+                record['rssMB'],
+                record['rssDeltaMB'],
+                '%.0f (%s)' % (last['ticksPerSecond'], last['commit']) if last else '-',
+            )
+    finally:
+        connection.creation.destroy_test_db(oldName, verbosity=0)
+
+    if not args.no_save:
+        directory = os.path.dirname(args.output)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(args.output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        print u'结果已保存到%s' % args.output
+
+
+if __name__ == '__main__':
+    main()
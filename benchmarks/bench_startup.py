@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import subprocess
+import argparse
+import time
+
+PROJECT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 测试场景: (名称, 子进程执行的代码, 是否检查启动时间上限)
+SCENARIOS = [
+    ('python', 'pass', False),
+    ('comhelper', 'import comhelper', True),
+    ('django-full', 'import comhelper; comhelper.setDjangoEnvironment(); import database.models', False),
+    ('django-runtime', 'import comhelper; comhelper.setDjangoEnvironment(runtime=True); import database.models', True),
+    ('simulate-worker', 'import comhelper; comhelper.setDjangoEnvironment(runtime=True); '
+                        'import executer, host, wireformat', True),
+    ('replay-worker', 'import comhelper; comhelper.setDjangoEnvironment(runtime=True); '
+                      'import replay, recorder, wireformat, bar, shmring', True),
+]
+
+
+def measure(code, repeat):
+    """
+    在新的python进程中执行代码,测量从启动到退出的时间
+    返回: 每次的耗时列表,单位:秒
+    """
+    env = dict(os.environ)
+    env.pop('DJANGO_SETTINGS_MODULE', None)
+    result = []
+    for i in range(repeat):
+        t0 = time.time()
+        process = subprocess.Popen([sys.executable, '-c', code], cwd=PROJECT_PATH, env=env)
+        if process.wait() != 0:
+            raise Exception(u'执行失败: %s' % code)
+        result.append(time.time() - t0)
+    return result
+
+
+def main():
+    """
+    数据生成器,策略执行器等进程的启动时间测试
+    每个场景在新的进程中执行若干次,显示最小值和中位数;
+    指定--limit时,需要检查的场景的中位数超过上限则以非0状态退出
+    python benchmarks/bench_startup.py [--repeat 5] [--limit 1.0]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--limit', type=float, help=u'启动时间上限,单位:秒')
+    args = parser.parse_args()
+
+    failed = []
+    print '%-18s %10s %10s' % ('scenario', 'min(s)', 'median(s)')
+    for name, code, check in SCENARIOS:
+        timeList = sorted(measure(code, args.repeat))
+        median = timeList[len(timeList) // 2]
+        print '%-18s %10.3f %10.3f' % (name, timeList[0], median)
+        if args.limit is not None and check and median > args.limit:
+            failed.append(name)
+
+    if failed:
+        print u'启动时间超过%.2f秒: %s' % (args.limit, ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,18 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+from __future__ import division
 import threading
+import atexit
+import Queue
+import time
 import uuid
 
+# 异步回调队列满时的处理方式
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'dropoldest'
+OVERFLOW_RAISE = 'raise'
+
 
 class CallbackManager(object):
     """
@@ -15,8 +24,10 @@ class CallbackManager(object):
         构造函数
         """
         # 初始化回调数据链
+        # NOTE: 每个回调名称对应一个(bindId, 回调函数)的元组,元组创建后不再修改,
+        # bind/unbind在锁内生成新的元组并替换,callback读取当前的元组后不需要加锁
         self.__callbackDict = {}
-        self.__callbackUuidDict = {}
+        self.__callbackNameDict = {}
         self.__callbackLock = threading.RLock()
 
     def bind(self, callbackName, funcToCall):
@@ -28,20 +39,12 @@ class CallbackManager(object):
         返回值:
         如果绑定成功方法返回一个bindId,这个id可以用于解除绑定(unbind)时使用
         """
-        self.__callbackLock.acquire()
-        try:
+        with self.__callbackLock:
             callbackUuid = uuid.uuid1()
-            self.__callbackUuidDict[callbackUuid] = {
-                'callbackName': callbackName,
-                'funcToCall': funcToCall
-            }
-            if callbackName in self.__callbackDict.keys():
-                self.__callbackDict[callbackName].append(callbackUuid)
-            else:
-                self.__callbackDict[callbackName] = [callbackUuid]
+            self.__callbackNameDict[callbackUuid] = callbackName
+            handlers = self.__callbackDict.get(callbackName, ())
+            self.__callbackDict[callbackName] = handlers + ((callbackUuid, funcToCall),)
             return callbackUuid
-        finally:
-            self.__callbackLock.release()
 
     def unbind(self, bindId):
         """
@@ -51,35 +54,202 @@ class CallbackManager(object):
         返回值:
         成功返回True，失败(或没有找到绑定项)返回False
         """
-        self.__callbackLock.acquire()
-        try:
-            if bindId not in self.__callbackUuidDict.keys():
+        with self.__callbackLock:
+            callbackName = self.__callbackNameDict.pop(bindId, None)
+            if callbackName is None:
                 return False
-            callbackName = self.__callbackUuidDict[bindId]['callbackName']
-            self.__callbackDict[callbackName].remove(bindId)
-            self.__callbackUuidDict.pop(bindId)
+            handlers = tuple(item for item in self.__callbackDict[callbackName] if item[0] != bindId)
+            if handlers:
+                self.__callbackDict[callbackName] = handlers
+            else:
+                del self.__callbackDict[callbackName]
             return True
-        finally:
-            self.__callbackLock.release()
 
     def callback(self, callbackName, args):
         """
         根据回调链调用已经绑定的所有回调函数
+        调用期间发生的bind/unbind从下一次调用开始生效
+        参数:
+        callbackName  回调函数名称
+        args 用于传递给回调函数的参数(字典结构)
+        返回值:
+        无
+        """
+        for callbackUuid, funcToCall in self.__callbackDict.get(callbackName, ()):
+            try:
+                funcToCall(**args)
+            except Exception as e:
+                print e
+
+
+def getCallbackKey(args):
+    """
+    获取回调事件的排序键
+    同一个头寸的事件使用头寸的id,没有头寸时使用报单的id,
+    排序键相同的事件由同一个工作线程按顺序处理
+    参数:
+    args 回调函数的参数(字典结构)
+    """
+    for name in ('position', 'toOrder', 'order'):
+        model = args.get(name)
+        if model is not None:
+            return (name == 'position', getattr(model, 'id', None) or id(model))
+    return None
+
+
+class AsyncCallbackManager(CallbackManager):
+    """
+    异步回调数据链管理
+    callback()只将事件放入有界队列后立即返回,由工作线程调用已经绑定的回调函数,
+    耗时的回调函数不会阻塞触发事件的线程(如CTP的回调线程).
+    NOTE:
+    1.每个工作线程有自己的队列,事件按排序键(见getCallbackKey)分配到工作线程,
+      同一个头寸(或报单)的事件按触发的顺序调用,不同头寸的事件之间不保证顺序.
+    2.队列满时按overflow处理: 'block' 等待队列有空位, 'dropoldest' 丢弃队列中最早的事件,
+      'raise' 抛出Queue.Full异常.
+    """
+
+    def __init__(self, workerCount=1, maxsize=1000, overflow=OVERFLOW_BLOCK, keyFunc=getCallbackKey):
+        """
+        构造函数
+        参数:
+        workerCount 工作线程数量
+        maxsize 每个工作线程的队列长度
+        overflow 队列满时的处理方式
+        keyFunc 根据回调参数计算排序键的函数
+        """
+        super(AsyncCallbackManager, self).__init__()
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_RAISE):
+            raise Exception(u'未知的队列溢出处理方式:%s' % overflow)
+        self.overflow = overflow
+        self.keyFunc = keyFunc
+        self.__queueList = [Queue.Queue(maxsize) for i in range(workerCount)]
+        self.__nextQueue = 0
+        # 统计数据
+        self.__metricsLock = threading.Lock()
+        self.__metrics = {}
+        self.__dropped = 0
+        self.__running = True
+        self.__threadList = []
+        for queue in self.__queueList:
+            thread = threading.Thread(target=self.__working, args=(queue,))
+            thread.daemon = True
+            thread.start()
+            self.__threadList.append(thread)
+        atexit.register(self.close)
+
+    def callback(self, callbackName, args):
+        """
+        将事件放入工作线程的队列
         参数:
         callbackName  回调函数名称
         args 用于传递给回调函数的参数(字典结构)
         返回值:
         无
         """
-        self.__callbackLock.acquire()
-        try:
-            if callbackName not in self.__callbackDict.keys():
-                return
-            for callbackUuid in self.__callbackDict[callbackName]:
-                funcToCall = self.__callbackUuidDict[callbackUuid]['funcToCall']
+        if not self.__running:
+            raise Exception(u'回调管理器已关闭')
+        key = self.keyFunc(args)
+        if key is None:
+            # 没有排序键的事件轮流分配
+            self.__nextQueue = (self.__nextQueue + 1) % len(self.__queueList)
+            queue = self.__queueList[self.__nextQueue]
+        else:
+            queue = self.__queueList[hash(key) % len(self.__queueList)]
+        item = (callbackName, args, time.time())
+
+        if self.overflow == OVERFLOW_BLOCK:
+            queue.put(item)
+        elif self.overflow == OVERFLOW_RAISE:
+            queue.put_nowait(item)
+        else:
+            while True:
                 try:
-                    funcToCall(**args)
-                except Exception as e:
-                    print e
-        finally:
-            self.__callbackLock.release()
+                    queue.put_nowait(item)
+                    break
+                except Queue.Full:
+                    try:
+                        queue.get_nowait()
+                    except Queue.Empty:
+                        continue
+                    queue.task_done()
+                    with self.__metricsLock:
+                        self.__dropped += 1
+
+    def __working(self, queue):
+        """
+        工作线程: 从队列中取出事件并调用回调函数
+        """
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    return
+                callbackName, args, enqueueTime = item
+                startTime = time.time()
+                super(AsyncCallbackManager, self).callback(callbackName, args)
+                endTime = time.time()
+                self.__record(callbackName, startTime - enqueueTime, endTime - startTime)
+            finally:
+                queue.task_done()
+
+    def __record(self, callbackName, waitTime, handlerTime):
+        """
+        记录一次事件处理的统计数据
+        """
+        with self.__metricsLock:
+            metrics = self.__metrics.get(callbackName)
+            if metrics is None:
+                metrics = self.__metrics[callbackName] = {
+                    'count': 0, 'waitTime': 0., 'maxWaitTime': 0., 'handlerTime': 0., 'maxHandlerTime': 0.}
+            metrics['count'] += 1
+            metrics['waitTime'] += waitTime
+            metrics['maxWaitTime'] = max(metrics['maxWaitTime'], waitTime)
+            metrics['handlerTime'] += handlerTime
+            metrics['maxHandlerTime'] = max(metrics['maxHandlerTime'], handlerTime)
+
+    def getMetrics(self):
+        """
+        获取统计数据
+        返回值:
+        字典结构:
+            queueDepth 各工作线程队列中等待处理的事件数量
+            dropped 因队列满被丢弃的事件数量
+            events 回调函数名称 -> 处理次数(count),平均/最大排队时间(meanWaitTime/maxWaitTime),
+                   平均/最大回调函数耗时(meanHandlerTime/maxHandlerTime),单位:秒
+        """
+        with self.__metricsLock:
+            events = {}
+            for callbackName, metrics in self.__metrics.items():
+                count = metrics['count']
+                events[callbackName] = {
+                    'count': count,
+                    'meanWaitTime': metrics['waitTime'] / count,
+                    'maxWaitTime': metrics['maxWaitTime'],
+                    'meanHandlerTime': metrics['handlerTime'] / count,
+                    'maxHandlerTime': metrics['maxHandlerTime'],
+                }
+            return {
+                'queueDepth': [queue.qsize() for queue in self.__queueList],
+                'dropped': self.__dropped,
+                'events': events,
+            }
+
+    def flush(self):
+        """
+        等待队列中的所有事件处理完成
+        """
+        for queue in self.__queueList:
+            queue.join()
+
+    def close(self):
+        """
+        停止工作线程,停止前会处理队列中所有的事件
+        """
+        if not self.__running:
+            return
+        self.__running = False
+        for queue in self.__queueList:
+            queue.put(None)
+        for thread in self.__threadList:
+            thread.join()
@@ -1,19 +1,30 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import django
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+import calendar
+from datetime import datetime, timedelta
 from time import sleep
-import pyctp
 
+# NOTE: django,pyctp和dateutil在使用时才导入,模拟交易,回放和回测进程不需要载入pyctp
 
+# CTP账号信息,只在连接CTP时检查,见checkCtpEnvironment
 frontAddress = os.environ.get('CTP_FRONT_ADDRESS')
 mdFrontAddress = os.environ.get('CTP_MD_FRONT_ADDRESS')
 brokerID = os.environ.get('CTP_BROKER_ID')
 userID = os.environ.get('CTP_USER_ID')
 password = os.environ.get('CTP_PASSWORD')
-assert frontAddress and mdFrontAddress and brokerID and userID and password
+
+# django的执行环境是否已经设置
+_djangoReady = False
+
+
+def checkCtpEnvironment():
+    """
+    检查CTP账号信息的环境变量是否都已设置,没有设置时抛出异常
+    """
+    if not (frontAddress and mdFrontAddress and brokerID and userID and password):
+        raise Exception(u'CTP账号信息的环境变量没有设置(CTP_FRONT_ADDRESS,CTP_MD_FRONT_ADDRESS,'
+                        u'CTP_BROKER_ID,CTP_USER_ID,CTP_PASSWORD)')
 
 
 def getProjectPath():
@@ -24,49 +35,108 @@ def getProjectPath():
     return os.path.split(fullpath)[0]
 
 
-def setDjangoEnvironment():
+def setDjangoEnvironment(runtime=False):
     '''
-    为非web程序设置django的执行环境
+    为非web程序设置django的执行环境,重复调用时不做任何处理
+    runtime 是否使用精简的运行时配置(CTPTrader.settings_runtime),只载入database应用,
+        用于数据生成器,策略执行器,回放和回测等进程;环境变量DJANGO_SETTINGS_MODULE已设置时以环境变量为准
     '''
-    version = float(django.get_version()[:3])
-
-    sys.path.append(getProjectPath())
-    os.chdir(getProjectPath())
-    settings = "CTPTrader.settings"
+    global _djangoReady
+    if _djangoReady:
+        return
+    import django
+
+    projectPath = getProjectPath()
+    if projectPath not in sys.path:
+        sys.path.append(projectPath)
+    os.chdir(projectPath)
+    settings = "CTPTrader.settings_runtime" if runtime else "CTPTrader.settings"
     os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings)
-    if version >= 1.7:
+    if django.VERSION >= (1, 7):
         django.setup()
+    _djangoReady = True
 
 
 def getDefaultInstrumentId(months=1):
     """
     获取一个可用的交易品种ID
     """
+    from dateutil.relativedelta import relativedelta
     return datetime.strftime(datetime.now() + relativedelta(months=months), "IF%y%m")
 
 
-def getInstrumentPrice(instrumentId):
+def getInstrumentPrice(instrumentId, timeout=5):
     """
     获取品种的价格信息
     instrumentId 要查询的品种代码
+    timeout 等待查询结果的最长时间,单位:秒
     返回: 品种的最新价格信息字典结构
     """
-    result = []
-    flag = []
+    from futures import RequestManager
+    import pyctp
+    checkCtpEnvironment()
+    requestManager = RequestManager()
 
     def OnRspQryDepthMarketData(**kwargs):
-        result.append(kwargs['Data'])
-        if kwargs['IsLast'] == True:
-            flag.append(1)
+        requestManager.onResponse(
+            'QryDepthMarketData', kwargs.get('Data'), kwargs.get('IsLast', True), getRspError(kwargs))
 
     global frontAddress, brokerID, userID, password
     trader = pyctp.Trader(frontAddress, brokerID, userID, password)
     trader.bind(pyctp.callback.OnRspQryDepthMarketData, OnRspQryDepthMarketData)
     data = pyctp.struct.CThostFtdcQryDepthMarketDataField()
     data.InstrumentID = getDefaultInstrumentId()
-    trader.ReqQryDepthMarketData(data)
-    wait(lambda: len(flag) > 0)
-    return result[0]
+    requestId, future = requestManager.newRequest('QryDepthMarketData')
+    try:
+        trader.ReqQryDepthMarketData(data)
+    except:
+        requestManager.discard(requestId)
+        raise
+    try:
+        return future.result(timeout)[0]
+    finally:
+        requestManager.cancel(requestId)
+
+
+def getRspError(kwargs):
+    """
+    获取CTP响应中的错误信息
+    kwargs CTP响应回调函数的参数
+    返回: 出错时返回异常对象,成功时返回None
+    """
+    rspInfo = kwargs.get('RspInfo')
+    if not rspInfo or rspInfo['ErrorID'] == 0:
+        return None
+    return Exception("%d:%s" % (rspInfo['ErrorID'], rspInfo['ErrorMsg']))
+
+
+def getTickTime(tradingDay, updateTime, updateMillisec, actionDay=''):
+    """
+    获取行情数据的时间
+    tradingDay 交易日,格式:YYYYMMDD
+    updateTime 最后修改时间,格式:HH:MM:SS
+    updateMillisec 最后修改毫秒
+    actionDay 业务日期(行情发生的自然日),格式:YYYYMMDD,为空时使用交易日
+    返回: datetime
+    NOTE: 夜盘行情的交易日是下一个交易日,必须使用业务日期才能得到正确的时间顺序
+    """
+    dt = datetime.strptime("%s %s" % (actionDay or tradingDay, updateTime), "%Y%m%d %H:%M:%S")
+    return dt.replace(microsecond=int(updateMillisec) * 1000)
+
+
+def datetime2ns(dt):
+    """
+    将datetime转化为纳秒时间戳
+    NOTE: datetime不含时区信息,时间戳按UTC计算,即保持交易所的本地时间不变
+    """
+    return (calendar.timegm(dt.timetuple()) * 1000000 + dt.microsecond) * 1000
+
+
+def ns2datetime(ns):
+    """
+    将纳秒时间戳转化为datetime,datetime2ns的逆运算
+    """
+    return datetime(1970, 1, 1) + timedelta(microseconds=int(ns) // 1000)
 
 
 def orderId2Ref(orderId):
@@ -75,12 +145,13 @@ def orderId2Ref(orderId):
     orderId
     返回 CTP接口要求的orderRef
     """
-    return ('%12d' % orderId).replace(' ', '0')
+    return '%012d' % orderId
 
 
 def wait(expr, second=5):
     """
     等待服务器响应
+    NOTE: 轮询方式,只用于测试;CTP请求的响应使用futures.RequestManager等待
     expr 一个lambda表达式，如果表达式执行返回True则退出循环
     second 等待的时间，单位:秒
     """
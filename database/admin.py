@@ -76,11 +76,28 @@ class DepthMarketDataAdmin(admin.ModelAdmin):
 admin.site.register(ModelDepthMarketData,DepthMarketDataAdmin)
 
 
+class BarDataAdmin(admin.ModelAdmin):
+    ''' '''
+
+    fields = ['dataCatalog','InstrumentID','period','beginTime','endTime',\
+        'OpenPrice','HighPrice','LowPrice','ClosePrice','Volume']
+
+    list_display = ['dataCatalog','InstrumentID','period','beginTime',\
+        'OpenPrice','HighPrice','LowPrice','ClosePrice','Volume']
+
+    list_filter = ['InstrumentID','period','dataCatalog']
+
+    date_hierarchy = 'beginTime'
+
+admin.site.register(ModelBarData,BarDataAdmin)
+
+
 class DataGeneratorAdmin(admin.ModelAdmin):
     ''' '''
 
     fields = ['name','account','dataCatalog','dataSource','datetimeBegin','datetimeEnd',\
-        'instrumentIdList','saveRawData','saveBarData','saveIndexData','broadcastAddress','interval']
+        'instrumentIdList','saveRawData','saveBarData','barPeriodList','saveIndexData','broadcastAddress','interval',\
+        'messageFormat','replayMode','replaySpeed']
 
     list_display = ['id','name','account','dataCatalog','dataSource','broadcastAddress']
 
@@ -58,6 +58,22 @@ ORDER_STATE = (
 )
 
 
+# 行情回放模式
+REPLAY_MODE = (
+    ('interval', u'固定间隔'),
+    ('max', u'最快速度'),
+    ('realtime', u'按记录时间'),
+    ('step', u'单步')
+)
+
+
+# 行情广播消息格式
+MESSAGE_FORMAT = (
+    ('binary', u'二进制'),
+    ('json', u'JSON(调试使用)')
+)
+
+
 def getBroadcastAddress():
     ''' 获取个随机的数据广播地址 '''
     return 'ipc:///tmp/%s' % uuid.uuid1()
@@ -169,6 +185,32 @@ class ModelDepthMarketData(models.Model):
         verbose_name_plural = u'[05].行情数据'
 
 
+class ModelBarData(models.Model):
+    '''
+    棒线数据(OHLCV),由数据生成器根据行情生成,见bar.py
+    '''
+    # 所属的目录(catalog)
+    dataCatalog = models.ForeignKey('ModelDataCatalog', verbose_name=u'所属数据目录', blank=True, null=True)
+    # 合约代码(InstrumentID)
+    InstrumentID = models.CharField(u'合约代码', max_length=31, default='')
+    # 棒线周期(period) 如1s,1m,v100
+    period = models.CharField(u'棒线周期', max_length=8)
+    # 起始时间(beginTime)
+    beginTime = models.DateTimeField(u'起始时间')
+    # 结束时间(endTime)
+    endTime = models.DateTimeField(u'结束时间')
+    OpenPrice = models.FloatField(u'开盘价', default=0)
+    HighPrice = models.FloatField(u'最高价', default=0)
+    LowPrice = models.FloatField(u'最低价', default=0)
+    ClosePrice = models.FloatField(u'收盘价', default=0)
+    Volume = models.IntegerField(u'成交量', default=0)
+
+    class Meta:
+        verbose_name = u'棒线数据'
+        verbose_name_plural = u'[05].棒线数据'
+        index_together = [['InstrumentID', 'period', 'beginTime']]
+
+
 class ModelDataGenerator(models.Model):
     '''
     数据生成器配置
@@ -193,12 +235,20 @@ class ModelDataGenerator(models.Model):
     saveRawData = models.BooleanField(u'是否保存原始数据流', default=False)
     # 是否保存棒线数据(saveBarData)
     saveBarData = models.BooleanField(u'是否保存棒线数据', default=False)
+    # 棒线周期列表(barPeriodList) json数据格式,如["1s","1m","5m","v100"],见bar.parsePeriod
+    barPeriodList = models.CharField(u'棒线周期列表', max_length=500, default='["1s", "1m", "5m"]')
     # 是否保存指标数据(saveIndexData)
     saveIndexData = models.BooleanField(u'是否保存指标数据', default=False)
     # 数据广播地址(broadcastAddress)
     broadcastAddress = models.CharField(u'数据广播地址', max_length=100, default=getBroadcastAddress)
     # 数据生成间隔时间(interval) 以秒为单位
     interval = models.FloatField(u'数据生成间隔时间', default=.5)
+    # 行情广播消息格式(messageFormat)
+    messageFormat = models.CharField(u'行情广播消息格式', max_length=30, choices=MESSAGE_FORMAT, default='binary')
+    # 回放模式(replayMode) 数据源为数据库时使用
+    replayMode = models.CharField(u'回放模式', max_length=30, choices=REPLAY_MODE, default='interval')
+    # 回放速度(replaySpeed) 按记录时间回放时的速度倍数
+    replaySpeed = models.FloatField(u'回放速度', default=1)
 
     class Meta:
         verbose_name = u'数据生成器'
@@ -329,6 +379,10 @@ class ModelOrder(models.Model):
     direction = models.CharField(u'交易方向代码', max_length=30, choices=TRADING_DIRECTION)
     # 交易数量(volume)
     volume = models.FloatField(u'交易数量')
+    # 成交数量(tradeVolume) 部分成交时为已成交的数量
+    tradeVolume = models.FloatField(u'成交数量', default=0)
+    # 成交编号列表(tradeIdList) 已计入成交数量的成交编号(JSON),重启后忽略重复的成交回报
+    tradeIdList = models.TextField(u'成交编号列表', blank=True, default='')
     # 开仓限价(openLimitPrice)
     openLimitPrice = models.FloatField(u'开仓限价', default=0)
     # 开仓价格(openPrice)
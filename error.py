@@ -2,3 +2,8 @@
 # encoding: utf-8
 
 OrderNoActive = [-1, u'取消单不存在或者不处于激活状态']
+OrderNotFilled = [-2, u'报单未成交']
+OrderPartiallyFilled = [-3, u'报单部分成交']
+RiskPositionLimit = [-4, u'超过头寸数量上限']
+RiskOrderRate = [-5, u'超过报单频率限制']
+RiskCancelRate = [-6, u'超过撤单频率限制']
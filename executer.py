@@ -2,7 +2,12 @@
 # encoding: utf-8
 
 from database.models import ModelStrategyExecuter
-from trader import Trader
+from trader import Trader, SimulateTrader, CTPTrader
+from risk import RiskGate
+from latency import monotonicNs, recorder as latencyRecorder
+import imp
+import json
+import os
 
 
 def bind(event):
@@ -50,3 +55,94 @@ class StrategyExecuter(object):
         NOTE: 目前还不知到这个方法是否有意义，或者是否能实现，暂时先放在这里，之后再考虑
         """
         pass
+
+
+def createTrader(modelStrategyExecuter):
+    """
+    根据执行器配置的交易接口类型创建交易接口
+    报单前按执行器的最大头寸数量和默认头寸大小检查头寸上限,见risk.RiskGate
+    """
+    traderClass = modelStrategyExecuter.traderClass
+    riskGate = RiskGate.fromExecuter(modelStrategyExecuter)
+    if traderClass == 'Trader':
+        return Trader(modelStrategyExecuter, riskGate=riskGate)
+    if traderClass == 'SimulateTrader':
+        return SimulateTrader(modelStrategyExecuter, riskGate=riskGate)
+    if traderClass == 'CTPTrader':
+        account = modelStrategyExecuter.account
+        return CTPTrader(
+            account.frontAddress,
+            account.brokerId,
+            account.userId,
+            account.password,
+            modelStrategyExecuter=modelStrategyExecuter,
+            riskGate=riskGate
+        )
+    raise Exception(u'未知的交易接口类型:%s' % traderClass)
+
+
+class Strategy(object):
+    """
+    已载入的交易策略
+    封装策略模块,配置文件和交易接口,负责按策略函数的参数调用策略
+    """
+
+    def __init__(self, modelStrategyExecuter, trader=None):
+        """
+        载入策略模块和配置文件,并调用策略的初始化方法
+        参数:
+            modelStrategyExecuter 策略执行器的数据实体
+            trader 交易接口,默认为None表示按执行器的配置创建
+        """
+        self.modelStrategyExecuter = modelStrategyExecuter
+        self.instrumentIdList = json.loads(modelStrategyExecuter.instrumentIdList)
+
+        # 导入交易策略模块文件
+        # NOTE: 模块名称使用执行器的id,多个执行器使用同一个策略文件时互不影响
+        sourceFile = os.path.join(modelStrategyExecuter.strategyDir, modelStrategyExecuter.strategyProgram)
+        moduleName = 'strategy_%d' % modelStrategyExecuter.id
+        self.module = imp.load_source(moduleName, sourceFile)
+        if not hasattr(self.module, 'onDataArrived'):
+            raise Exception(u'交易策略必须实现onDataArrived方法')
+        self.__varNames = self.module.onDataArrived.func_code.co_varnames
+
+        # 导入交易策略的配置文件
+        configFile = os.path.join(modelStrategyExecuter.strategyDir, modelStrategyExecuter.strategyConfig)
+        with open(configFile) as f:
+            self.config = json.load(f)
+
+        # 初始化交易对象
+        self.trader = trader or createTrader(modelStrategyExecuter)
+
+        # 调用策略模块的初始化方法
+        if hasattr(self.module, 'onInit'):
+            self.module.onInit(self.config)
+
+    def onDataArrived(self, data):
+        """
+        将行情数据传给策略
+        模拟交易接口先用最新报价撮合挂单,再调用策略
+        """
+        if 'arriveTime' not in data:
+            data['arriveTime'] = monotonicNs()
+        if isinstance(self.trader, SimulateTrader):
+            self.trader.onDataArrived(data['instrumentID'], data['ask'], data['bid'])
+        kwargs = {}
+        if 'data' in self.__varNames:
+            kwargs['data'] = data
+        if 'trader' in self.__varNames:
+            kwargs['trader'] = self.trader
+        # 策略中发出的报单记录行情到报单的延迟
+        latencyRecorder.setCurrentTick(data)
+        try:
+            self.module.onDataArrived(**kwargs)
+        finally:
+            latencyRecorder.setCurrentTick(None)
+            latencyRecorder.record('strategy', data['arriveTime'])
+
+    def onExit(self):
+        """
+        通知策略执行器即将退出
+        """
+        if hasattr(self.module, 'onExit'):
+            self.module.onExit(self.trader)
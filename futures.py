@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from collections import deque
+import itertools
+import threading
+import time
+
+
+class Future(object):
+    """
+    异步操作的结果
+    结果到达时等待的线程立即被唤醒,不需要轮询
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition()
+        self.__done = False
+        self.__cancelled = False
+        self.__result = None
+        self.__exception = None
+        self.__callbackList = []
+
+    def __finish(self, result=None, exception=None, cancelled=False):
+        """
+        设置结果并唤醒等待的线程
+        返回: 是否设置成功,已经完成的Future不能再次设置
+        """
+        with self.__condition:
+            if self.__done:
+                return False
+            self.__done = True
+            self.__result = result
+            self.__exception = exception
+            self.__cancelled = cancelled
+            self.__condition.notify_all()
+            callbackList, self.__callbackList = self.__callbackList, []
+        for callback in callbackList:
+            callback(self)
+        return True
+
+    def setResult(self, result):
+        """
+        设置操作结果
+        """
+        return self.__finish(result=result)
+
+    def setException(self, exception):
+        """
+        设置操作失败的异常
+        """
+        return self.__finish(exception=exception)
+
+    def cancel(self):
+        """
+        取消操作,已经完成的操作不能取消
+        返回: 是否取消成功
+        """
+        return self.__finish(cancelled=True)
+
+    def cancelled(self):
+        """
+        操作是否已取消
+        """
+        return self.__cancelled
+
+    def done(self):
+        """
+        操作是否已完成(包括成功,失败和取消)
+        """
+        return self.__done
+
+    def wait(self, timeout=None):
+        """
+        等待操作完成
+        参数:
+            timeout 最长等待时间,单位:秒,默认为None表示一直等待
+        返回: 操作是否已完成
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.__condition:
+            while not self.__done:
+                if deadline is None:
+                    # NOTE: 带超时的wait在python2中才能响应KeyboardInterrupt
+                    self.__condition.wait(1)
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+            return self.__done
+
+    def result(self, timeout=None):
+        """
+        获取操作结果,操作未完成时等待
+        参数:
+            timeout 最长等待时间,单位:秒,默认为None表示一直等待
+        返回: 操作结果,操作失败时抛出对应的异常
+        """
+        if not self.wait(timeout):
+            raise Exception(u'等待超时')
+        if self.__cancelled:
+            raise Exception(u'操作已取消')
+        if self.__exception is not None:
+            raise self.__exception
+        return self.__result
+
+    def exception(self, timeout=None):
+        """
+        获取操作失败的异常,操作成功时返回None
+        """
+        if not self.wait(timeout):
+            raise Exception(u'等待超时')
+        return self.__exception
+
+    def addDoneCallback(self, callback):
+        """
+        添加操作完成时调用的函数,函数的参数为Future本身
+        操作已经完成时立即调用
+        """
+        with self.__condition:
+            if not self.__done:
+                self.__callbackList.append(callback)
+                return
+        callback(self)
+
+
+def gather(futureList, timeout=None):
+    """
+    等待多个操作全部完成
+    参数:
+        futureList Future列表
+        timeout 等待所有操作的最长时间,单位:秒,默认为None表示一直等待
+    返回:
+        按futureList顺序排列的结果列表,任何一个操作失败时抛出对应的异常
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    result = []
+    for future in futureList:
+        if deadline is None:
+            result.append(future.result())
+        else:
+            result.append(future.result(max(deadline - time.time(), 0)))
+    return result
+
+
+class RequestManager(object):
+    """
+    按请求类型关联CTP的请求和响应
+    pyctp的请求方法只有数据一个参数,RequestID无法传给CTP,响应中的RequestID不能用于关联;
+    CTP按发送顺序处理同一个会话的请求,所以每种请求按先进先出的顺序与响应对应
+    用法:
+        requestId, future = requestManager.newRequest('QryDepthMarketData')
+        try:
+            ctp.ReqQryDepthMarketData(data)
+        except:
+            requestManager.discard(requestId)
+            raise
+        # 在CTP的响应回调函数中:
+        requestManager.onResponse('QryDepthMarketData', kwargs['Data'], kwargs['IsLast'], error)
+        # 等待响应
+        dataList = future.result(timeout)
+    NOTE:
+    1.一个请求可能有多条响应(如查询),所有响应的数据在IsLast时作为列表返回
+    2.取消(如等待超时)的请求已经发送给CTP,仍然保留在队列中接收之后到达的响应,
+      避免同类型的下一个请求收到它的响应;没有发送出去的请求使用discard移除
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counter = itertools.count(1)
+        # 请求类型 -> 等待响应的请求队列,队列中每一项为(RequestID, Future, 已收到的数据列表)
+        self.__queueDict = {}
+
+    def __len__(self):
+        with self.__lock:
+            return sum(len(queue) for queue in self.__queueDict.values())
+
+    def newRequest(self, requestType):
+        """
+        创建一个新的请求,加入该类型请求队列的末尾
+        参数:
+            requestType 请求类型,同类型的请求按发送顺序与响应对应
+        返回: (RequestID, Future)
+        """
+        future = Future()
+        with self.__lock:
+            requestId = next(self.__counter)
+            self.__queueDict.setdefault(requestType, deque()).append((requestId, future, []))
+        return requestId, future
+
+    def onResponse(self, requestType, data=None, isLast=True, error=None):
+        """
+        收到请求的响应,对应该类型队列中最早的请求
+        参数:
+            requestType 请求类型
+            data 响应的数据
+            isLast 是否为最后一条响应
+            error 请求失败时的异常,默认为None表示成功
+        返回: 是否有等待这条响应的请求,已取消的请求返回False
+        """
+        with self.__lock:
+            queue = self.__queueDict.get(requestType)
+            if not queue:
+                return False
+            requestId, future, dataList = queue[0]
+            if isLast or error is not None:
+                queue.popleft()
+            if data is not None:
+                dataList.append(data)
+        if future.cancelled():
+            return False
+        if error is not None:
+            future.setException(error)
+        elif isLast:
+            future.setResult(dataList)
+        return True
+
+    def __find(self, requestId):
+        """
+        查找请求所在的队列和队列中的项,没有找到时返回(None, None)
+        NOTE: 调用时需要持有锁
+        """
+        for queue in self.__queueDict.values():
+            for item in queue:
+                if item[0] == requestId:
+                    return queue, item
+        return None, None
+
+    def cancel(self, requestId):
+        """
+        取消请求,请求仍然在队列中等待响应,响应到达时被忽略
+        返回: 是否取消成功
+        """
+        with self.__lock:
+            queue, item = self.__find(requestId)
+        if item is None:
+            return False
+        return item[1].cancel()
+
+    def discard(self, requestId):
+        """
+        移除没有发送出去的请求
+        """
+        with self.__lock:
+            queue, item = self.__find(requestId)
+            if item is None:
+                return
+            queue.remove(item)
+        item[1].cancel()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+多策略执行器宿主
+一个宿主进程载入多个策略执行器,按CPU核数分配到若干工作进程中运行,
+每个工作进程对每个数据生成器只建立一个订阅,每个品种只订阅一次,
+收到行情后在进程内分发给所有需要该品种的策略
+用法:
+    python host.py [执行器编号 ...] [--workers 工作进程数量]
+数据生成器的广播地址为shm://<文件路径>时,从共享内存环形缓冲区读取行情(见shmring.py)
+"""
+from collections import defaultdict
+import multiprocessing
+import traceback
+import signal
+import json
+import time
+import os
+
+
+def shardExecuters(executerList, workerCount):
+    """
+    将策略执行器分配到工作进程
+    数据生成器和品种列表都相同的执行器分在同一组,同一组的执行器总是分配到同一个工作进程,
+    以减少重复的订阅和解码;各组按执行器数量从多到少依次分配给当前执行器最少的工作进程
+    参数:
+        executerList 策略执行器列表(ModelStrategyExecuter)
+        workerCount 工作进程数量
+    返回:
+        每个工作进程的执行器编号列表,不包含空列表
+    """
+    groups = defaultdict(list)
+    for executer in executerList:
+        instrumentIdList = tuple(sorted(json.loads(executer.instrumentIdList)))
+        groups[(executer.dataGenerator_id, instrumentIdList)].append(executer.id)
+
+    shards = [[] for _ in range(max(min(workerCount, len(groups)), 1))]
+    for key in sorted(groups, key=lambda key: (-len(groups[key]), key)):
+        min(shards, key=len).extend(groups[key])
+    return [shard for shard in shards if shard]
+
+
+class StrategyHost(object):
+    """
+    在一个进程中运行多个策略执行器
+    """
+
+    def __init__(self, executerIdList):
+        """
+        载入策略执行器
+        参数:
+            executerIdList 策略执行器编号列表
+        """
+        from database.models import ModelStrategyExecuter
+        from executer import Strategy
+
+        self.strategyList = []
+        # 广播地址 -> 品种 -> 策略列表
+        self.__routes = defaultdict(lambda: defaultdict(list))
+        self.__stopped = False
+
+        querySet = ModelStrategyExecuter.objects.filter(id__in=executerIdList)
+        querySet = querySet.select_related('dataGenerator', 'account').order_by('id')
+        for modelStrategyExecuter in querySet:
+            strategy = Strategy(modelStrategyExecuter)
+            self.strategyList.append(strategy)
+            routes = self.__routes[modelStrategyExecuter.dataGenerator.broadcastAddress]
+            for instrumentId in strategy.instrumentIdList:
+                routes[instrumentId].append(strategy)
+
+    def getSubscriptions(self):
+        """
+        获取需要订阅的广播地址和品种
+        返回:
+            字典,广播地址 -> 品种列表
+        """
+        return {address: sorted(routes) for address, routes in self.__routes.items()}
+
+    def dispatch(self, address, messages):
+        """
+        将收到的行情消息分发给需要的策略
+        行情只解码一次,每个策略得到一份独立的数据字典
+        某个策略出现异常时不影响其他策略
+        参数:
+            address 收到消息的广播地址
+            messages 消息列表
+        返回:
+            收到该行情的策略数量
+        """
+        from wireformat import decodeMarketData
+        from latency import monotonicNs, recorder as latencyRecorder
+
+        arriveTime = monotonicNs()
+        strategyList = self.__routes[address].get(messages[0])
+        if not strategyList:
+            return 0
+        data = decodeMarketData(messages)
+        data['arriveTime'] = arriveTime
+        latencyRecorder.record('broadcast', data.get('sendTime'), arriveTime)
+        for strategy in strategyList:
+            try:
+                strategy.onDataArrived(dict(data))
+            except Exception:
+                print u'策略执行器%d出现异常' % strategy.modelStrategyExecuter.id
+                traceback.print_exc()
+        return len(strategyList)
+
+    def run(self):
+        """
+        订阅行情并分发,直到调用stop()
+        广播地址为shm://时从共享内存读取(见shmring.py),其他地址使用zmq订阅
+        """
+        import zmq
+        from shmring import isShmAddress, getShmPath, ShmRingReader, POLL_INTERVAL
+
+        context = zmq.Context.instance()
+        poller = zmq.Poller()
+        addressDict = {}
+        # 共享内存广播地址 -> 读取方,数据生成器还没有创建缓冲区时为None
+        shmReaders = {}
+        for address, instrumentIdList in self.getSubscriptions().items():
+            if isShmAddress(address):
+                shmReaders[address] = None
+                continue
+            socket = context.socket(zmq.SUB)
+            socket.connect(address)
+            for instrumentId in instrumentIdList:
+                socket.setsockopt(zmq.SUBSCRIBE, instrumentId.encode('utf-8'))
+            poller.register(socket, zmq.POLLIN)
+            addressDict[socket] = address
+
+        try:
+            while not self.__stopped:
+                received = 0
+                # NOTE: 有共享内存订阅时zmq不等待,没有任何消息时短暂休眠
+                for socket, _ in poller.poll(0 if shmReaders else 1000):
+                    self.dispatch(addressDict[socket], socket.recv_multipart())
+                    received += 1
+                for address, reader in shmReaders.items():
+                    if reader is None:
+                        if not os.path.exists(getShmPath(address)):
+                            continue
+                        reader = shmReaders[address] = ShmRingReader(getShmPath(address))
+                    messages = reader.recv_multipart()
+                    while messages is not None:
+                        self.dispatch(address, messages)
+                        received += 1
+                        messages = reader.recv_multipart()
+                if shmReaders and not received:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            for socket in addressDict:
+                socket.close()
+            for address, reader in shmReaders.items():
+                if reader is not None:
+                    if reader.gapCount:
+                        print u'共享内存%s丢失%d条行情' % (address, reader.gapCount)
+                    reader.close()
+            self.close()
+
+    def stop(self):
+        """
+        停止运行
+        """
+        self.__stopped = True
+
+    def close(self):
+        """
+        通知所有策略即将退出
+        """
+        for strategy in self.strategyList:
+            try:
+                strategy.onExit()
+            except Exception:
+                traceback.print_exc()
+
+
+def runWorker(executerIdList):
+    """
+    工作进程入口
+    """
+    from django.db import connection
+    # NOTE: 不使用从父进程继承的数据库连接
+    connection.close()
+
+    host = StrategyHost(executerIdList)
+    signal.signal(signal.SIGTERM, lambda signum, frame: host.stop())
+    try:
+        host.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # NOTE: 工作进程退出时不会调用atexit,在这里保存延迟统计
+        from latency import recorder as latencyRecorder
+        latencyRecorder.save()
+
+
+def main():
+    """
+    命令行入口
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('executerId', type=int, nargs='*', help=u'策略执行器编号,默认为所有执行器')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help=u'工作进程数量')
+    args = parser.parse_args()
+
+    from comhelper import setDjangoEnvironment
+    setDjangoEnvironment(runtime=True)
+    from database.models import ModelStrategyExecuter
+    from django.db import connection
+
+    querySet = ModelStrategyExecuter.objects.all()
+    if args.executerId:
+        querySet = querySet.filter(id__in=args.executerId)
+    shards = shardExecuters(list(querySet), args.workers)
+    connection.close()
+    if not shards:
+        print u'没有需要运行的策略执行器'
+        return
+
+    processList = []
+    for shard in shards:
+        process = multiprocessing.Process(target=runWorker, args=(shard,))
+        process.start()
+        processList.append(process)
+        print u'工作进程%d: 执行器%s' % (process.pid, ','.join(str(i) for i in shard))
+
+    try:
+        for process in processList:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processList:
+            process.terminate()
+        for process in processList:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
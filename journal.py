@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from django.db import connection, transaction
+from datetime import datetime
+import threading
+import time
+import atexit
+import Queue
+
+# 写入一批数据失败时的重试次数和间隔(如SQLite数据库被其他进程锁定)
+WRITE_RETRY = 3
+WRITE_RETRY_INTERVAL = .1
+
+# 要求后台线程重新写入失败数据的队列标记
+_RETRY = object()
+
+
+class WriteBehindJournal(object):
+    """
+    数据实体的后台批量写入(write-behind)
+    使用场景:
+    交易回调事件中只修改内存中的数据实体并登记到日志,由后台线程在一个事务中批量写入数据库,
+    从而把数据库的写入(以及SQLite的fsync)移出回调线程.
+    NOTE:
+    1.只能登记已经保存过(有id)的数据实体,新记录需要同步保存以获得id.
+    2.同一条记录在写入前被多次登记时只写入最后一次的数据.
+    3.队列长度有上限,队列满时登记操作会阻塞,直到后台线程写入一批数据.
+    4.close()会等待所有已登记的数据写入完成,进程退出时会自动调用.
+    5.写入失败的数据不会丢弃,之后的批次重新写入(已有更新的数据时以更新的为准),
+      flush()和close()时仍有数据未能写入则抛出异常.
+    """
+
+    def __init__(self, maxsize=10000, batchSize=500, flushInterval=.05):
+        """
+        初始化
+        参数:
+            maxsize 待写入记录的最大数量
+            batchSize 每个事务最多写入的记录数量
+            flushInterval 收集一批数据的最长等待时间,单位:秒
+        """
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.__queue = Queue.Queue(maxsize)
+        # (数据模型, id) -> 待写入的字段数据
+        self.__pending = {}
+        # 写入失败,等待重新写入的数据: (数据模型, id) -> 字段数据
+        self.__failed = {}
+        self.__error = None
+        self.__lock = threading.Lock()
+        # 登记数据和关闭日志互斥,保证关闭后队列中停止标记之后不会再有数据
+        self.__putLock = threading.Lock()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__working)
+        self.__thread.daemon = True
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def put(self, model):
+        """
+        登记一个需要写入的数据实体
+        参数:
+            model 已修改的数据实体
+        """
+        if model.pk is None:
+            raise Exception(u'只能登记已保存的数据实体')
+        if hasattr(model, 'modifyTime'):
+            model.modifyTime = datetime.now()
+        # 在调用线程中复制字段数据,避免后台写入时数据实体被修改
+        values = dict((f.name, getattr(model, f.attname)) for f in model._meta.fields if not f.primary_key)
+        key = (model.__class__, model.pk)
+        with self.__putLock:
+            if not self.__running:
+                raise Exception(u'写入日志已关闭')
+            with self.__lock:
+                isNew = key not in self.__pending
+                self.__pending[key] = values
+            if isNew:
+                self.__queue.put(key)
+
+    def flush(self):
+        """
+        等待所有已登记的数据写入数据库
+        异常:
+            有数据重试后仍未能写入时抛出异常,数据保留在日志中
+        """
+        self.__queue.join()
+        if not self.__failed:
+            return
+        # 让后台线程重新写入失败的数据
+        with self.__putLock:
+            if self.__running:
+                self.__queue.put(_RETRY)
+        self.__queue.join()
+        self.__raiseFailed()
+
+    def close(self):
+        """
+        停止后台线程,停止前会写入所有已登记的数据
+        异常:
+            有数据未能写入时抛出异常
+        """
+        with self.__putLock:
+            if not self.__running:
+                return
+            self.__running = False
+        self.__queue.put(None)
+        self.__thread.join()
+        if self.__failed:
+            # 后台线程已经停止,在当前线程中重新写入
+            self.__write([])
+        self.__raiseFailed()
+
+    def __raiseFailed(self):
+        """
+        有未能写入的数据时抛出最后一次的写入异常
+        """
+        with self.__lock:
+            if self.__failed:
+                raise Exception(u'写入日志有%d条数据未能写入数据库:%s' % (len(self.__failed), self.__error))
+
+    def __write(self, keys):
+        """
+        在一个事务中写入一批数据,之前写入失败的数据合并到本批重新写入
+        """
+        with self.__lock:
+            rows, self.__failed = self.__failed, {}
+            for key in keys:
+                if key is not _RETRY:
+                    rows[key] = self.__pending.pop(key)
+        try:
+            for i in range(WRITE_RETRY):
+                try:
+                    with transaction.atomic():
+                        for (modelClass, pk), values in rows.items():
+                            modelClass.objects.filter(pk=pk).update(**values)
+                    break
+                except Exception as e:
+                    error = e
+                    if i < WRITE_RETRY - 1:
+                        time.sleep(WRITE_RETRY_INTERVAL)
+            else:
+                print error
+                # 逐条写入,只保留写入失败的数据,避免个别数据导致之后的批次全部失败
+                failed = {}
+                for key, values in rows.items():
+                    modelClass, pk = key
+                    try:
+                        with transaction.atomic():
+                            modelClass.objects.filter(pk=pk).update(**values)
+                    except Exception as e:
+                        error = e
+                        failed[key] = values
+                with self.__lock:
+                    for key, values in failed.items():
+                        # 已经登记了更新的数据时不再保留失败的数据
+                        if key not in self.__pending:
+                            self.__failed[key] = values
+                    self.__error = error
+        finally:
+            for key in keys:
+                self.__queue.task_done()
+
+    def __working(self):
+        """
+        后台写入线程
+        """
+        try:
+            stopping = False
+            while not stopping:
+                key = self.__queue.get()
+                if key is None:
+                    self.__queue.task_done()
+                    break
+                # 收集一批数据,最多等待flushInterval
+                keys = [key]
+                deadline = time.time() + self.flushInterval
+                while len(keys) < self.batchSize:
+                    try:
+                        key = self.__queue.get(timeout=max(deadline - time.time(), 0))
+                    except Queue.Empty:
+                        break
+                    if key is None:
+                        self.__queue.task_done()
+                        stopping = True
+                        break
+                    keys.append(key)
+                self.__write(keys)
+        finally:
+            connection.close()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+行情到报单(tick-to-trade)的延迟统计
+行情经过的各个环节记录单调时钟的时间戳(纳秒),时间戳随行情消息(见wireformat)和报单传递,
+各环节的耗时按阶段记录到对数-线性分桶的直方图(HDR风格)中
+阶段:
+    generator   数据生成器收到行情 -> 广播发送
+    broadcast   广播发送 -> 执行器收到消息
+    strategy    执行器收到消息 -> 策略的onDataArrived返回
+    order       执行器收到消息 -> ReqOrderInsert返回
+    tickToTrade 数据生成器收到行情 -> ReqOrderInsert返回
+NOTE: CLOCK_MONOTONIC是系统范围的时钟,同一台机器上不同进程的时间戳可以直接相减
+用法:
+    python latency.py dump <目录或文件 ...>
+"""
+from __future__ import division
+import threading
+import ctypes
+import ctypes.util
+import json
+import math
+import time
+import os
+
+CLOCK_MONOTONIC = 1
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _loadClockGettime():
+    """
+    载入libc的clock_gettime,不可用时返回None
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        return libc.clock_gettime
+    except (OSError, AttributeError):
+        return None
+
+_clock_gettime = _loadClockGettime()
+
+
+def monotonicNs():
+    """
+    获取单调时钟的时间,单位:纳秒
+    NOTE: 没有clock_gettime的平台使用time.time(),不保证单调
+    """
+    if _clock_gettime is None:
+        return int(time.time() * 1e9)
+    ts = _timespec()
+    _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts))
+    return ts.tv_sec * 1000000000 + ts.tv_nsec
+
+
+class LatencyHistogram(object):
+    """
+    对数-线性分桶的延迟直方图
+    小于2**subBucketBits的值每个值一个桶,更大的值每个2的幂区间分为2**(subBucketBits-1)个桶,
+    相对误差不超过1/2**(subBucketBits-1),记录和合并都是O(1)
+    """
+
+    def __init__(self, subBucketBits=7):
+        """
+        subBucketBits 分桶精度,默认7,相对误差小于1.6%
+        """
+        self.subBucketBits = subBucketBits
+        self.__subBucketCount = 1 << subBucketBits
+        self.__halfCount = self.__subBucketCount >> 1
+        # 桶编号 -> 数量
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def __getIndex(self, value):
+        """
+        计算值所在的桶编号
+        """
+        if value < self.__subBucketCount:
+            return value
+        shift = value.bit_length() - self.subBucketBits
+        return self.__subBucketCount + (shift - 1) * self.__halfCount + (value >> shift) - self.__halfCount
+
+    def __getValue(self, index):
+        """
+        计算桶的最大值
+        """
+        if index < self.__subBucketCount:
+            return index
+        shift, m = divmod(index - self.__subBucketCount, self.__halfCount)
+        shift += 1
+        return ((m + self.__halfCount + 1) << shift) - 1
+
+    def record(self, value):
+        """
+        记录一个值(非负整数)
+        """
+        value = max(int(value), 0)
+        index = self.__getIndex(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        合并另一个直方图的数据
+        """
+        if other.subBucketBits != self.subBucketBits:
+            raise Exception(u'直方图的分桶精度不一致')
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, p):
+        """
+        计算百分位数
+        参数:
+            p 百分比,如99.9
+        返回:
+            不小于p%的记录值的最小桶上限,不超过最大值;没有数据时返回None
+        """
+        if self.count == 0:
+            return None
+        # NOTE: 减去很小的值避免浮点误差,如99.9 / 100 * 10000 > 9990
+        target = max(int(math.ceil(p / 100 * self.count - 1e-9)), 1)
+        accumulated = 0
+        for index in sorted(self.counts):
+            accumulated += self.counts[index]
+            if accumulated >= target:
+                return min(self.__getValue(index), self.max)
+        return self.max
+
+    def mean(self):
+        """
+        平均值
+        """
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def toDict(self):
+        """
+        转化为可以保存为JSON的字典
+        """
+        return {
+            'subBucketBits': self.subBucketBits,
+            'counts': [[index, count] for index, count in sorted(self.counts.items())],
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def fromDict(cls, data):
+        """
+        从toDict的结果恢复直方图
+        """
+        histogram = cls(data['subBucketBits'])
+        histogram.counts = dict((index, count) for index, count in data['counts'])
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class LatencyRecorder(object):
+    """
+    按阶段记录延迟
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # 阶段名称 -> LatencyHistogram
+        self.histograms = {}
+        # 当前线程正在处理的行情的时间戳
+        self.__local = threading.local()
+
+    def record(self, stage, startTime, endTime=None):
+        """
+        记录一个阶段的耗时
+        参数:
+            stage 阶段名称
+            startTime 阶段开始的时间戳(纳秒),为0或None时表示没有记录,忽略
+            endTime 阶段结束的时间戳,默认为当前时间
+        """
+        if not startTime:
+            return
+        if endTime is None:
+            endTime = monotonicNs()
+        with self.__lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(endTime - startTime)
+
+    def setCurrentTick(self, data):
+        """
+        设置当前线程正在处理的行情,报单时用于计算tick-to-trade延迟
+        参数:
+            data 行情数据字典,包含recvTime和arriveTime,为None时清除
+        """
+        self.__local.tick = data
+
+    def getCurrentTick(self):
+        """
+        获取当前线程正在处理的行情
+        """
+        return getattr(self.__local, 'tick', None)
+
+    def recordOrder(self, order):
+        """
+        报单已发出,记录order和tickToTrade阶段的耗时
+        行情的时间戳保存到报单的tickStamps属性中
+        """
+        tick = self.getCurrentTick()
+        if tick is None:
+            return
+        now = monotonicNs()
+        order.tickStamps = {
+            'recvTime': tick.get('recvTime', 0),
+            'sendTime': tick.get('sendTime', 0),
+            'arriveTime': tick.get('arriveTime', 0),
+            'orderTime': now,
+        }
+        self.record('order', tick.get('arriveTime'), now)
+        self.record('tickToTrade', tick.get('recvTime'), now)
+
+    def toDict(self):
+        with self.__lock:
+            return dict((stage, histogram.toDict()) for stage, histogram in self.histograms.items())
+
+    def merge(self, data):
+        """
+        合并toDict的结果
+        """
+        with self.__lock:
+            for stage, histogramData in data.items():
+                histogram = LatencyHistogram.fromDict(histogramData)
+                if stage in self.histograms:
+                    self.histograms[stage].merge(histogram)
+                else:
+                    self.histograms[stage] = histogram
+
+    def save(self, directory=None):
+        """
+        保存统计数据到 <目录>/latency-<进程号>.json
+        参数:
+            directory 保存目录,默认使用环境变量CTP_LATENCY_DIR,都没有时不保存
+        返回: 保存的文件路径
+        """
+        directory = directory or os.environ.get('CTP_LATENCY_DIR')
+        if not directory:
+            return None
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, 'latency-%d.json' % os.getpid())
+        with open(path, 'w') as f:
+            json.dump(self.toDict(), f)
+        return path
+
+    def report(self):
+        """
+        生成统计报告,单位:微秒
+        """
+        lines = ['%-12s %10s %10s %10s %10s %10s' % ('stage', 'count', 'p50', 'p99', 'p999', 'max')]
+        order = ['generator', 'broadcast', 'strategy', 'order', 'tickToTrade']
+        stages = sorted(self.histograms, key=lambda stage: (order.index(stage) if stage in order else len(order), stage))
+        for stage in stages:
+            histogram = self.histograms[stage]
+            lines.append('%-12s %10d %10.1f %10.1f %10.1f %10.1f' % (
+                stage,
+                histogram.count,
+                histogram.percentile(50) / 1000,
+                histogram.percentile(99) / 1000,
+                histogram.percentile(99.9) / 1000,
+                histogram.max / 1000,
+            ))
+        return '\n'.join(lines)
+
+
+# 进程内的延迟记录器
+recorder = LatencyRecorder()
+
+
+def main():
+    """
+    命令行入口
+    python latency.py dump <目录或文件 ...>
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='cmd')
+    dumpParser = subparsers.add_parser('dump', help=u'合并并显示延迟统计')
+    dumpParser.add_argument('path', nargs='+')
+    args = parser.parse_args()
+
+    if args.cmd == 'dump':
+        result = LatencyRecorder()
+        for path in args.path:
+            if os.path.isdir(path):
+                pathList = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.json')]
+            else:
+                pathList = [path]
+            for filePath in pathList:
+                with open(filePath) as f:
+                    result.merge(json.load(f))
+        print result.report()
+
+
+if __name__ == '__main__':
+    main()
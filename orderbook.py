@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from bisect import bisect_right, insort
+import itertools
+
+
+def getOrderSide(action, direction):
+    """
+    获取报单撮合时使用的报价方向
+    参数:
+        action 报单类型,'open' 或 'close'
+        direction 交易方向,'buy' 或 'sell'
+    返回:
+        'bid' 使用买价撮合(开多单,平空单), 'ask' 使用卖价撮合(开空单,平多单)
+    """
+    if (action, direction) in (('open', 'buy'), ('close', 'sell')):
+        return 'bid'
+    return 'ask'
+
+
+def getPositionSide(direction):
+    """
+    获取头寸止损止盈触发时使用的报价方向(与平仓撮合方向一致)
+    """
+    return getOrderSide('close', direction)
+
+
+def getFillPrice(quote, limitPrice):
+    """
+    计算报单的成交价格
+    参数:
+        quote 当前撮合使用的报价
+        limitPrice 报单限价,0表示不限价
+    返回:
+        不限价时按报价成交,限价时按报价和限价的中间价成交
+    """
+    if limitPrice == 0:
+        return quote
+    return (quote + limitPrice) / 2
+
+
+class PriceQueue(object):
+    """
+    按价格排序的队列
+    升序队列中价格小于等于给定价格的元素视为可成交,降序队列则相反.
+    同一价格按加入顺序排列(价格优先,时间优先)
+    """
+
+    def __init__(self, descending=False):
+        """
+        初始化
+        descending 是否按价格降序排列
+        """
+        self.__sign = -1 if descending else 1
+        # 有序列表,元素为(价格键, 序号, 标识)
+        self.__keys = []
+        # 标识 -> (排序键, 元素)
+        self.__entries = {}
+        self.__counter = itertools.count()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, itemId):
+        return itemId in self.__entries
+
+    def push(self, itemId, price, item):
+        """
+        加入一个元素,如果标识已经存在则替换原有元素
+        """
+        if itemId in self.__entries:
+            self.remove(itemId)
+        key = (self.__sign * price, next(self.__counter), itemId)
+        insort(self.__keys, key)
+        self.__entries[itemId] = (key, item)
+
+    def remove(self, itemId):
+        """
+        删除一个元素
+        返回: 被删除的元素,元素不存在时返回None
+        """
+        if itemId not in self.__entries:
+            return None
+        key, item = self.__entries.pop(itemId)
+        self.__keys.remove(key)
+        return item
+
+    def popCrossed(self, price):
+        """
+        取出所有在给定价格上可以成交的元素
+        返回: 元素列表,按价格优先时间优先排列
+        """
+        i = bisect_right(self.__keys, (self.__sign * price, float('inf')))
+        if i == 0:
+            return []
+        crossed = self.__keys[:i]
+        del self.__keys[:i]
+        return [self.__entries.pop(itemId)[1] for _, _, itemId in crossed]
+
+
+class OrderBook(object):
+    """
+    模拟撮合使用的内存报单簿
+    1.开仓和平仓挂单按品种和撮合方向保存,并按限价排序,不限价的报单排在最前
+    2.打开的头寸按品种保存止损和止盈的触发价格
+    每次报价到达时只需要取出可以成交(或触发)的部分,不需要扫描全部挂单
+    """
+
+    # 各队列的排序方向,True表示降序
+    QUEUE_ORDERING = {
+        ('open', 'bid'): True,     # 限价 >= bid 可成交
+        ('open', 'ask'): False,    # 限价 <= ask 可成交
+        ('close', 'bid'): True,
+        ('close', 'ask'): False,
+        ('stop', 'ask'): True,     # 多头止损: ask <= 止损价
+        ('stop', 'bid'): False,    # 空头止损: bid >= 止损价
+        ('profit', 'ask'): False,  # 多头止盈: ask >= 止盈价
+        ('profit', 'bid'): True,   # 空头止盈: bid <= 止盈价
+    }
+
+    def __init__(self):
+        """
+        初始化
+        """
+        # 品种 -> {(类型, 方向): PriceQueue}
+        self.__books = {}
+        # 挂单标识 -> (品种, 类型, 方向)
+        self.__orders = {}
+        # 已打开的头寸: 头寸标识 -> 头寸
+        self.__positions = {}
+
+    def __getQueue(self, instrumentId, kind, side):
+        """
+        获取品种对应的队列,不存在则创建
+        """
+        book = self.__books.get(instrumentId)
+        if book is None:
+            book = {}
+            for key, descending in self.QUEUE_ORDERING.items():
+                book[key] = PriceQueue(descending)
+            self.__books[instrumentId] = book
+        return book[(kind, side)]
+
+    def addOrder(self, order):
+        """
+        加入一个开仓或平仓挂单
+        """
+        action = order.action
+        side = getOrderSide(action, order.direction)
+        limitPrice = {'open': order.openLimitPrice, 'close': order.closeLimitPrice}[action]
+        if limitPrice == 0:
+            # 不限价的报单总是可以成交
+            limitPrice = {'bid': float('inf'), 'ask': float('-inf')}[side]
+        queue = self.__getQueue(order.instrumentId, action, side)
+        queue.push(order.id, limitPrice, order)
+        self.__orders[order.id] = (order.instrumentId, action, side)
+
+    def removeOrder(self, orderId):
+        """
+        删除一个挂单
+        返回: 被删除的挂单,挂单不存在时返回None
+        """
+        if orderId not in self.__orders:
+            return None
+        instrumentId, action, side = self.__orders.pop(orderId)
+        return self.__getQueue(instrumentId, action, side).remove(orderId)
+
+    def hasOrder(self, orderId):
+        """
+        挂单是否仍处于激活状态
+        """
+        return orderId in self.__orders
+
+    def matchOrders(self, instrumentId, action, ask, bid):
+        """
+        撮合指定品种的挂单
+        参数:
+            instrumentId 品种
+            action 报单类型,'open' 或 'close'
+            ask 卖价
+            bid 买价
+        返回:
+            [(order, price), ...] 已成交的挂单及成交价格,成交的挂单将从报单簿中删除
+        """
+        if instrumentId not in self.__books:
+            return []
+        result = []
+        for side, quote in (('bid', bid), ('ask', ask)):
+            queue = self.__getQueue(instrumentId, action, side)
+            for order in queue.popCrossed(quote):
+                self.__orders.pop(order.id, None)
+                limitPrice = {'open': order.openLimitPrice, 'close': order.closeLimitPrice}[action]
+                result.append((order, getFillPrice(quote, limitPrice)))
+        return result
+
+    def addPosition(self, position):
+        """
+        加入(或更新)一个已打开的头寸,并登记其止损止盈价格
+        """
+        self.removePosition(position.id)
+        self.__positions[position.id] = position
+        side = getPositionSide(position.direction)
+        if position.stopPrice != 0:
+            self.__getQueue(position.instrumentId, 'stop', side).push(position.id, position.stopPrice, position)
+        if position.profitPrice != 0:
+            self.__getQueue(position.instrumentId, 'profit', side).push(position.id, position.profitPrice, position)
+
+    def updatePosition(self, position):
+        """
+        头寸的止损止盈价格发生变化时更新,头寸不在报单簿中(已不是打开状态)时忽略
+        """
+        if position.id in self.__positions:
+            self.addPosition(position)
+
+    def removePosition(self, positionId):
+        """
+        删除一个头寸
+        返回: 被删除的头寸,头寸不存在时返回None
+        """
+        position = self.__positions.pop(positionId, None)
+        if position is not None:
+            side = getPositionSide(position.direction)
+            for kind in ('stop', 'profit'):
+                self.__getQueue(position.instrumentId, kind, side).remove(positionId)
+        return position
+
+    def hasPosition(self, positionId):
+        """
+        头寸是否在报单簿中
+        """
+        return positionId in self.__positions
+
+    def matchTriggers(self, instrumentId, kind, ask, bid):
+        """
+        检查指定品种的止损或止盈触发情况
+        参数:
+            instrumentId 品种
+            kind 'stop' 止损, 'profit' 止盈
+            ask 卖价
+            bid 买价
+        返回:
+            被触发的头寸列表,被触发的头寸将从报单簿中删除
+        """
+        if instrumentId not in self.__books:
+            return []
+        result = []
+        for side, quote in (('ask', ask), ('bid', bid)):
+            queue = self.__getQueue(instrumentId, kind, side)
+            for position in queue.popCrossed(quote):
+                self.removePosition(position.id)
+                result.append(position)
+        return result
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+CTP报单数据(CThostFtdcInputOrderField)的模板池
+报单数据的大部分字段是常量,每个线程按(品种, 开平)缓存已经设置好常量字段的报单数据,
+报单时只写入报单引用,方向和数量
+NOTE: ReqOrderInsert返回时CTP接口已经复制了报单数据,报单数据发送后即可放回池中重复使用
+"""
+from comhelper import orderId2Ref
+import threading
+
+# 报单模板中的常量字段
+INPUT_ORDER_CONSTANTS = (
+    ('OrderPriceType', '1'),  # 任意价
+    ('CombHedgeFlag', '1'),  # 投机
+    ('LimitPrice', 0),  # 限价 0表不限制
+    ('TimeCondition', '1'),  # 立即完成否则撤消
+    ('GTDDate', ''),
+    ('VolumeCondition', '1'),  # 成交类型  '1' 任何数量  '2' 最小数量 '3'全部数量
+    ('ContingentCondition', '1'),  # 触发类型 '1' 立即否则撤消
+    ('StopPrice', 0),  # 止损价
+    ('ForceCloseReason', '0'),  # 强平标识 '0'非强平
+    ('IsAutoSuspend', 0),  # 自动挂起标识
+    ('BusinessUnit', ''),  # 业务单元
+    ('RequestID', 1),
+    ('UserForceClose', 0),  # 用户强平标识
+    ('IsSwapOrder', 0),  # 互换单标识
+)
+
+# 开平标识
+OFFSET_FLAG = {'open': '0', 'close': '1'}
+
+# (开平, 头寸方向) -> 买卖方向,平仓时与头寸方向相反
+ORDER_DIRECTION = {
+    ('open', 'buy'): '0',
+    ('open', 'sell'): '1',
+    ('close', 'buy'): '1',
+    ('close', 'sell'): '0',
+}
+
+# 每个模板最多缓存的空闲报单数据数量
+MAX_FREE_FIELDS = 16
+
+
+class InputOrderFieldPool(object):
+    """
+    报单数据模板池
+    acquire获取一个报单数据并写入报单的可变字段,发送后调用release放回池中;
+    批量报单时同一个品种的多个报单同时在使用,每个报单获取各自的报单数据
+    """
+
+    def __init__(self, fieldClass, brokerID, userID):
+        """
+        fieldClass 报单数据类型,即pyctp.struct.CThostFtdcInputOrderField
+        brokerID 经纪公司代码
+        userID 用户代码,同时作为投资者代码
+        """
+        self.fieldClass = fieldClass
+        self.brokerID = brokerID
+        self.userID = userID
+        self.__local = threading.local()
+
+    def __getFreeDict(self):
+        """
+        当前线程的空闲报单数据: (品种, 开平标识) -> 报单数据列表
+        """
+        try:
+            return self.__local.freeDict
+        except AttributeError:
+            freeDict = self.__local.freeDict = {}
+            return freeDict
+
+    def newField(self, instrumentId, offsetFlag):
+        """
+        创建一个报单数据并设置常量字段
+        """
+        field = self.fieldClass()
+        field.BrokerID = self.brokerID
+        field.InvestorID = self.userID
+        field.UserID = self.userID
+        field.InstrumentID = instrumentId
+        field.CombOffsetFlag = offsetFlag
+        for name, value in INPUT_ORDER_CONSTANTS:
+            setattr(field, name, value)
+        return field
+
+    def acquire(self, order):
+        """
+        获取报单对应的CTP报单数据
+        参数:
+            order 报单数据实体
+        返回:
+            报单数据,已写入报单引用,方向和数量
+        """
+        offsetFlag = OFFSET_FLAG.get(order.action)
+        if offsetFlag is None:
+            raise Exception(u'未知的操作方向')
+        fieldList = self.__getFreeDict().get((order.instrumentId, offsetFlag))
+        if fieldList:
+            field = fieldList.pop()
+        else:
+            field = self.newField(order.instrumentId, offsetFlag)
+        field.OrderRef = orderId2Ref(order.id)  # 将orderId转化为CTP接口的orderRef
+        field.Direction = ORDER_DIRECTION[(order.action, order.direction)]
+        field.VolumeTotalOriginal = order.volume  # 手数
+        field.MinVolume = order.volume  # 最小数量
+        return field
+
+    def release(self, field):
+        """
+        报单数据发送后放回当前线程的池中
+        """
+        freeDict = self.__getFreeDict()
+        key = (field.InstrumentID, field.CombOffsetFlag)
+        fieldList = freeDict.get(key)
+        if fieldList is None:
+            freeDict[key] = [field]
+        elif len(fieldList) < MAX_FREE_FIELDS:
+            fieldList.append(field)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# encoding: utf-8
+import threading
+
+
+class PositionBook(object):
+    """
+    交易接口内存中的头寸簿
+    保存已打开(包括正在平仓)的头寸,并按品种累计多头和空头的数量,
+    查询各品种及全部品种的多头,空头和净头寸数量不需要访问数据库,复杂度为O(1)
+    头寸簿由交易接口的onPositionOpened/onPositionClosed事件维护,启动时从数据库载入(reset)
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # 头寸id -> 头寸
+        self.__positions = {}
+        # 品种 -> 数量
+        self.__longVolume = {}
+        self.__shortVolume = {}
+        # 全部品种的数量
+        self.__totalLongVolume = 0
+        self.__totalShortVolume = 0
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __contains__(self, positionId):
+        return positionId in self.__positions
+
+    def reset(self, positionList):
+        """
+        清空头寸簿并载入头寸列表,用于启动时与数据库核对
+        """
+        with self.__lock:
+            self.__positions = {}
+            self.__longVolume = {}
+            self.__shortVolume = {}
+            self.__totalLongVolume = 0
+            self.__totalShortVolume = 0
+        for position in positionList:
+            self.add(position)
+
+    def add(self, position):
+        """
+        加入一个已打开的头寸,头寸已存在时更新为新的数据实体(数量按新的数据计算)
+        """
+        with self.__lock:
+            self.__remove(position.id)
+            self.__positions[position.id] = position
+            self.__addVolume(position, position.volume)
+
+    def update(self, position):
+        """
+        头寸的数据实体发生变化(如开始平仓,修改止损)时更新,头寸不在头寸簿中时忽略
+        """
+        with self.__lock:
+            if self.__remove(position.id) is not None:
+                self.__positions[position.id] = position
+                self.__addVolume(position, position.volume)
+
+    def remove(self, positionId):
+        """
+        删除一个头寸
+        返回: 被删除的头寸,不存在时返回None
+        """
+        with self.__lock:
+            return self.__remove(positionId)
+
+    def __remove(self, positionId):
+        """
+        删除头寸,调用时需要持有锁
+        """
+        position = self.__positions.pop(positionId, None)
+        if position is not None:
+            self.__addVolume(position, -position.volume)
+        return position
+
+    def __addVolume(self, position, volume):
+        """
+        累加头寸数量,调用时需要持有锁
+        """
+        instrumentId = position.instrumentId
+        if position.direction == 'buy':
+            self.__longVolume[instrumentId] = self.__longVolume.get(instrumentId, 0) + volume
+            self.__totalLongVolume += volume
+        else:
+            self.__shortVolume[instrumentId] = self.__shortVolume.get(instrumentId, 0) + volume
+            self.__totalShortVolume += volume
+
+    def get(self, positionId):
+        """
+        获取头寸,不存在时返回None
+        """
+        return self.__positions.get(positionId)
+
+    def getLongVolume(self, instrumentId=None):
+        """
+        多头数量
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        if instrumentId is None:
+            return self.__totalLongVolume
+        return self.__longVolume.get(instrumentId, 0)
+
+    def getShortVolume(self, instrumentId=None):
+        """
+        空头数量
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        if instrumentId is None:
+            return self.__totalShortVolume
+        return self.__shortVolume.get(instrumentId, 0)
+
+    def getNetVolume(self, instrumentId=None):
+        """
+        净头寸数量,多头为正,空头为负
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        return self.getLongVolume(instrumentId) - self.getShortVolume(instrumentId)
+
+    def getPositionList(self, instrumentId=None, direction=None):
+        """
+        获取头寸列表,按头寸id排序
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+            direction 头寸方向,默认为None表示全部方向
+        """
+        with self.__lock:
+            positionList = self.__positions.values()
+        return sorted([
+            position for position in positionList
+            if (instrumentId is None or position.instrumentId == instrumentId) and
+               (direction is None or position.direction == direction)
+        ], key=lambda position: position.id)
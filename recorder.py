@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from django.db import connection, transaction
+import threading
+import time
+
+
+def enableSQLiteFastWrite(conn=None):
+    """
+    为记录数据的连接设置SQLite的写入模式
+    journal_mode=WAL 写入不阻塞读取,synchronous=NORMAL 提交事务时不再每次fsync
+    NOTE: 非SQLite数据库时不做任何处理
+    参数:
+        conn 数据库连接,默认为django的默认连接
+    """
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        return False
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    return True
+
+
+class BulkRecorder(object):
+    """
+    数据实体的批量记录器
+    数据实体先缓存在内存中,缓存数量达到batchSize或距离上次写入超过flushInterval秒时,
+    在一个事务中使用bulk_create写入数据库
+    NOTE: 只在append时检查时间间隔,行情停止后缓存的数据不会写入;
+    autoFlush为True时由后台线程定时检查,没有新数据时也在flushInterval秒内写入
+    """
+
+    def __init__(self, modelClass, batchSize=1000, flushInterval=1, fastWrite=True, autoFlush=False):
+        """
+        初始化
+        参数:
+            modelClass 要记录的数据模型
+            batchSize 缓存的最大数量
+            flushInterval 两次写入的最大时间间隔,单位:秒
+            fastWrite 是否设置SQLite的快速写入模式
+            autoFlush 是否启动后台线程定时写入
+        """
+        self.modelClass = modelClass
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.fastWrite = fastWrite
+        self.__buffer = []
+        self.__lastFlushTime = time.time()
+        # append和后台线程的写入互斥
+        self.__lock = threading.RLock()
+        # 写入统计
+        self.rowCount = 0
+        self.flushCount = 0
+        self.__startTime = None
+        if fastWrite:
+            enableSQLiteFastWrite()
+        # 定时写入线程
+        self.__stopEvent = threading.Event()
+        self.__flushThread = None
+        if autoFlush:
+            self.__flushThread = threading.Thread(target=self.__flushLoop)
+            self.__flushThread.daemon = True
+            self.__flushThread.start()
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def __flushLoop(self):
+        """
+        后台线程定时写入超过时间间隔的缓存数据
+        """
+        # 后台线程使用自己的数据库连接
+        if self.fastWrite:
+            enableSQLiteFastWrite()
+        try:
+            while not self.__stopEvent.wait(self.flushInterval):
+                try:
+                    self.flushIfDue()
+                except Exception as e:
+                    # 写入失败的数据仍在缓存中,下次重试
+                    print u'数据写入失败:%s' % e
+        finally:
+            connection.close()
+
+    def append(self, model):
+        """
+        记录一个数据实体
+        """
+        with self.__lock:
+            if self.__startTime is None:
+                self.__startTime = time.time()
+            self.__buffer.append(model)
+            if len(self.__buffer) >= self.batchSize:
+                self.flush()
+            else:
+                self.flushIfDue()
+
+    def flushIfDue(self):
+        """
+        距离上次写入超过flushInterval秒时写入缓存的数据
+        """
+        with self.__lock:
+            if self.__buffer and time.time() - self.__lastFlushTime >= self.flushInterval:
+                self.flush()
+
+    def flush(self):
+        """
+        将缓存的数据写入数据库
+        """
+        with self.__lock:
+            self.__lastFlushTime = time.time()
+            if not self.__buffer:
+                return
+            with transaction.atomic():
+                self.modelClass.objects.bulk_create(self.__buffer)
+            self.rowCount += len(self.__buffer)
+            self.flushCount += 1
+            self.__buffer = []
+
+    def close(self):
+        """
+        停止定时写入线程并写入所有缓存的数据
+        """
+        if self.__flushThread is not None:
+            self.__stopEvent.set()
+            self.__flushThread.join()
+            self.__flushThread = None
+        self.flush()
+
+    def getRate(self):
+        """
+        获取持续写入速度
+        返回: 从第一条记录开始到目前为止平均每秒写入的记录数
+        """
+        if self.__startTime is None:
+            return 0
+        elapsed = time.time() - self.__startTime
+        if elapsed <= 0:
+            return 0
+        return self.rowCount / elapsed
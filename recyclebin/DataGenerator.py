@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import division
 from comhelper import setDjangoEnvironment
-setDjangoEnvironment()
+setDjangoEnvironment(runtime=True)
 from database.models import *
+from recorder import BulkRecorder
+from replay import createReplayClock, iterateQuerySet, getStepAddress, serveStepClock
+from comhelper import getTickTime, datetime2ns
+from wireformat import encodeMarketData, encodeBars
+from bar import BarAggregator
+from shmring import isShmAddress, getShmPath, ShmRingWriter
+from latency import monotonicNs, recorder as latencyRecorder
 
 import sys
 import json
 import zmq
 import time
-from pyctp.CTPChannel import MdChannel
 
 
 class DataGenerator(object):
@@ -27,16 +33,36 @@ class DataGenerator(object):
         self.dataCatalog = modelDataGenerator.dataCatalog
         self.instrumentIDList = json.loads(modelDataGenerator.instrumentIDList)
         self.account = modelDataGenerator.account
-
-        # 创建zmq行情发布管道
-        context = zmq.Context()
-        socket = context.socket(zmq.PUB)
-        socket.bind(self.broadcastAddress)
+        self.messageFormat = modelDataGenerator.messageFormat
+
+        # 创建行情发布管道,shm://地址使用共享内存环形缓冲区,其他地址使用zmq
+        if isShmAddress(self.broadcastAddress):
+            socket = ShmRingWriter(getShmPath(self.broadcastAddress))
+        else:
+            context = zmq.Context()
+            socket = context.socket(zmq.PUB)
+            socket.bind(self.broadcastAddress)
         self.socket = socket
 
         #
         self.sendMessageCount = 0
 
+        # 原始行情数据批量记录器,行情停止时由后台线程按时间间隔写入缓存的数据
+        self.recorder = None
+        if self.saveRawData == True:
+            self.recorder = BulkRecorder(ModelDepthMarketData, autoFlush=True)
+
+        # 棒线生成器,周期列表为空时不生成棒线
+        self.barAggregator = None
+        barPeriodList = json.loads(modelDataGenerator.barPeriodList or '[]')
+        if barPeriodList:
+            self.barAggregator = BarAggregator(barPeriodList)
+
+        # 棒线数据批量记录器
+        self.barRecorder = None
+        if modelDataGenerator.saveBarData == True and self.barAggregator is not None:
+            self.barRecorder = BulkRecorder(ModelBarData, autoFlush=True)
+
 
     def dataIterator(self):
         '''
@@ -58,37 +84,34 @@ class DataGenerator(object):
         '''
         处理一帧数据
         '''
-        # 读取交易品种标识
-        instrumentID = rawMarketData['InstrumentID']
-
-        # 读取关键信息报价
-        marketData = {}
-        marketData['ask'] = rawMarketData['AskPrice1']
-        marketData['bid'] = rawMarketData['BidPrice1']
-        marketData['askVolume'] = rawMarketData['AskVolume1']
-        marketData['bidVolume'] = rawMarketData['BidVolume1']
-
-        # 处理交易时间
-        tradingDay = rawMarketData['TradingDay']
-        updateTime = rawMarketData['UpdateTime']
-        updateMillisec = rawMarketData['UpdateMillisec']
-        timeString = "%s %s %6d" % (tradingDay,updateTime,int(updateMillisec)*1000)
-        timeFormat = u'%Y%m%d %H:%M:%S %f'
-        marketData['timeString'] = timeString
-        marketData['timeFormat'] = timeFormat
-
         # 发送行情广播消息
         # 消息格式:[品种编号(InstrumentID),报价数据(MarketData),棒线数据(BarData),指标数据(IndexData)]
-        marketDataJson = json.dumps(marketData)
-        message = [instrumentID,marketDataJson,'','']
+        recvTime = monotonicNs()
+        message = encodeMarketData(rawMarketData,self.messageFormat,recvTime)
+
+        # 生成棒线,已完成的棒线随本条行情一起发送
+        barList = []
+        if self.barAggregator is not None:
+            timestamp = datetime2ns(getTickTime(
+                rawMarketData['TradingDay'],rawMarketData['UpdateTime'],rawMarketData['UpdateMillisec'],
+                rawMarketData.get('ActionDay')))
+            barList = self.barAggregator.update(
+                rawMarketData['InstrumentID'],timestamp,rawMarketData['LastPrice'],rawMarketData['Volume'])
+            message[2] = encodeBars(barList,self.messageFormat)
+
         self.sendMessage(message)
+        latencyRecorder.record('generator',recvTime)
 
         # 保存原始行情数据到数据库
         if self.saveRawData == True:
             depthMarketData = ModelDepthMarketData(**rawMarketData)
             depthMarketData.dataCatalog = self.dataCatalog
-            depthMarketData.dataTime = datetime.strptime(timeString,timeFormat)
-            depthMarketData.save()
+            self.recorder.append(depthMarketData)
+
+        # 保存已完成的棒线
+        if self.barRecorder is not None:
+            for bar in barList:
+                self.barRecorder.append(bar.toModel(self.dataCatalog))
 
 
     def generate(self):
@@ -98,16 +121,30 @@ class DataGenerator(object):
         print u'开始生成交易信号...'
         lastSendMessageCount = 0
         t0 = datetime.now()
-        for rawMarketData in self.dataIterator():
-            self.frameProcess(rawMarketData)
-            t1 = datetime.now()
-            dt = t1 - t0
-            dts = dt.total_seconds()
-            if dts >= 1:
-                thisSendMessageCount = self.sendMessageCount - lastSendMessageCount
-                print u'发送%d条交易信号.' % thisSendMessageCount
-                t0 = t1
-                lastSendMessageCount = self.sendMessageCount
+        try:
+            for rawMarketData in self.dataIterator():
+                self.frameProcess(rawMarketData)
+                t1 = datetime.now()
+                dt = t1 - t0
+                dts = dt.total_seconds()
+                if dts >= 1:
+                    thisSendMessageCount = self.sendMessageCount - lastSendMessageCount
+                    print u'发送%d条交易信号.' % thisSendMessageCount
+                    if self.recorder is not None:
+                        print u'保存行情数据%d条,平均每秒%.1f条.' % (self.recorder.rowCount, self.recorder.getRate())
+                    t0 = t1
+                    lastSendMessageCount = self.sendMessageCount
+        finally:
+            # 写入剩余的行情数据
+            if self.recorder is not None:
+                self.recorder.close()
+            # 写入剩余的棒线数据,包括未完成的棒线
+            if self.barRecorder is not None:
+                for bar in self.barAggregator.flush():
+                    self.barRecorder.append(bar.toModel(self.dataCatalog))
+                self.barRecorder.close()
+            # 保存延迟统计(设置了CTP_LATENCY_DIR时)
+            latencyRecorder.save()
 
 
 
@@ -120,6 +157,9 @@ class CTPChannelGenerator(DataGenerator):
         '''
         从CTP接口读取数据
         '''
+        # NOTE: pyctp只在从CTP接口读取行情时导入,回放不依赖pyctp
+        from pyctp.CTPChannel import MdChannel
+
         # 创建一个CTP MD通道
         mdChannel = MdChannel(
             frontAddress = self.account.mdFrontAddress,
@@ -151,12 +191,16 @@ class DatabaseGenerator(DataGenerator):
         self.datetimeEnd = modelDataGenerator.datetimeEnd
         self.interval = modelDataGenerator.interval
 
-    def waitInterval(self):
-        '''
-        等待时间间隔
-        '''
-        interval = (self.interval or .5) / len(self.instrumentIDList)
-        time.sleep(interval)
+        # 创建回放时钟
+        # NOTE: 固定间隔模式下间隔时间按品种数量平分
+        self.replayMode = modelDataGenerator.replayMode
+        self.clock = createReplayClock(
+            self.replayMode,
+            interval = (self.interval or .5) / len(self.instrumentIDList),
+            speed = modelDataGenerator.replaySpeed
+        )
+        if self.replayMode == 'step':
+            serveStepClock(self.clock, getStepAddress(self.broadcastAddress))
 
 
     def dataIterator(self):
@@ -167,14 +211,22 @@ class DatabaseGenerator(DataGenerator):
         querySet = ModelDepthMarketData.objects.filter(dataCatalog=self.dataCatalog)
         querySet = querySet.filter(InstrumentID__in=self.instrumentIDList)
         if self.datetimeBegin :
-            querySet = querySet.filter(dataTime__gte=self.datetimeBegin)
+            querySet = querySet.filter(TradingDay__gte=self.datetimeBegin.strftime('%Y%m%d'))
         if self.datetimeEnd :
-            querySet = querySet.filter(dataTime__lt=self.datetimeEnd)
-        querySet = querySet.order_by('dataTime')
-
-        for rawMarketData in querySet:
-            yield rawMarketData.__dict__
-            self.waitInterval()
+            querySet = querySet.filter(TradingDay__lte=self.datetimeEnd.strftime('%Y%m%d'))
+
+        # 按记录顺序分段读取,不读取id和数据目录
+        fields = [f.attname for f in ModelDepthMarketData._meta.fields if f.name not in ('id','dataCatalog')]
+        for rawMarketData in iterateQuerySet(querySet, fields):
+            tickTime = getTickTime(rawMarketData['TradingDay'],rawMarketData['UpdateTime'],rawMarketData['UpdateMillisec'],
+                rawMarketData.get('ActionDay'))
+            if self.datetimeBegin and tickTime < self.datetimeBegin:
+                continue
+            if self.datetimeEnd and tickTime >= self.datetimeEnd:
+                break
+            if not self.clock.wait(tickTime):
+                break
+            yield rawMarketData
 
 
 
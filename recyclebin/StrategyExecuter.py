@@ -8,6 +8,7 @@ import zmq
 from datetime import datetime
 
 from trader import Trader
+from wireformat import decodeMarketData
 from database.models import *
 
 def main():
@@ -80,9 +81,7 @@ def main():
         messages = socket.recv_multipart()
 
         # 对接收的数据做简单的格式转化
-        data = json.loads(messages[1])
-        data['instrumentID'] = messages[0]
-        data['dataTime'] = datetime.strptime(data['timeString'],data['timeFormat'])
+        data = decodeMarketData(messages)
 
         # 生成调用函数的参数
         onDataArrivedArgs = {}
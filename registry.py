@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from database.models import ModelOrder
+import threading
+import json
+
+
+class OrderFill(object):
+    """
+    报单的成交汇总
+    每收到一笔成交回报累加成交数量和成交金额,计算成交均价(VWAP)和剩余数量
+    """
+
+    def __init__(self, targetVolume, tradeVolume=0, averagePrice=None, tradeIdList=()):
+        """
+        targetVolume 需要成交的数量,即报单数量
+        tradeVolume 已成交的数量,从数据库恢复时使用
+        averagePrice 已成交部分的均价,从数据库恢复时使用
+        tradeIdList 已计入的成交编号,从数据库恢复时使用,CTP重新推送这些成交时忽略
+        """
+        self.targetVolume = targetVolume
+        self.tradeVolume = tradeVolume
+        self.turnover = tradeVolume * averagePrice if tradeVolume else 0.
+        self.__tradeIdSet = set(tradeIdList)
+
+    def add(self, tradeId, price, volume):
+        """
+        加入一笔成交
+        参数:
+            tradeId 成交编号,重复的成交回报会被忽略
+            price 成交价格
+            volume 成交数量
+        返回: 是否为新的成交
+        """
+        if tradeId is not None:
+            if tradeId in self.__tradeIdSet:
+                return False
+            self.__tradeIdSet.add(tradeId)
+        self.tradeVolume += volume
+        self.turnover += price * volume
+        return True
+
+    def getTradeIdList(self):
+        """
+        已计入的成交编号列表,用于保存到报单
+        """
+        return sorted(self.__tradeIdSet)
+
+    def averagePrice(self):
+        """
+        成交均价,没有成交时返回None
+        """
+        if self.tradeVolume == 0:
+            return None
+        return self.turnover / self.tradeVolume
+
+    def remainingVolume(self):
+        """
+        剩余未成交的数量
+        """
+        return max(self.targetVolume - self.tradeVolume, 0)
+
+    def isFilled(self):
+        """
+        是否已全部成交
+        """
+        return self.tradeVolume >= self.targetVolume
+
+
+class OrderRegistry(object):
+    """
+    CTP报单的内存索引
+    报单在发送到CTP时登记,CTP回报时按OrderRef或(FrontID, SessionID, OrderRef)找到报单和头寸,
+    不需要查询数据库;进程重启后之前的报单不在索引中,第一次回报时从数据库读取并登记
+    NOTE: OrderRef即报单的id,见comhelper.orderId2Ref
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # 报单id -> 报单
+        self.__orderDict = {}
+        # (FrontID, SessionID, 报单id) -> 报单
+        self.__sessionDict = {}
+        # 报单id -> 报单在__sessionDict中的键
+        self.__sessionKeyDict = {}
+        # 报单id -> 成交汇总
+        self.__fillDict = {}
+        # 统计数据
+        self.hitCount = 0
+        self.missCount = 0
+
+    def __len__(self):
+        return len(self.__orderDict)
+
+    def register(self, order):
+        """
+        登记报单
+        NOTE: 报单的position应该已经载入,回报处理时不再查询数据库
+        """
+        with self.__lock:
+            self.__orderDict[order.id] = order
+
+    def getFill(self, order):
+        """
+        获取报单的成交汇总,第一次获取时按报单已保存的成交数量,价格和成交编号创建
+        """
+        with self.__lock:
+            fill = self.__fillDict.get(order.id)
+            if fill is None:
+                price = order.openPrice if order.action == 'open' else order.closePrice
+                fill = self.__fillDict[order.id] = OrderFill(
+                    order.volume, order.tradeVolume or 0, price, json.loads(order.tradeIdList or '[]'))
+            return fill
+
+    def get(self, data):
+        """
+        根据CTP的回报数据查找报单
+        参数:
+            data CTP回报数据(字典结构),至少包含OrderRef,可以包含FrontID和SessionID
+        返回:
+            报单数据实体,数据库中也没有时抛出ModelOrder.DoesNotExist
+        """
+        orderId = int(data['OrderRef'])
+        frontId = data.get('FrontID')
+        sessionId = data.get('SessionID')
+        key = (frontId, sessionId, orderId)
+        with self.__lock:
+            order = self.__sessionDict.get(key)
+            if order is None:
+                order = self.__orderDict.get(orderId)
+                if order is not None and frontId is not None:
+                    self.__addSessionKey(key, order)
+        if order is not None:
+            self.hitCount += 1
+            return order
+
+        # 索引中没有时从数据库读取,已完成的报单不再登记
+        self.missCount += 1
+        order = ModelOrder.objects.select_related('position').get(id=orderId)
+        if order.state != 'insert':
+            return order
+        with self.__lock:
+            order = self.__orderDict.setdefault(orderId, order)
+            if frontId is not None:
+                self.__addSessionKey(key, order)
+        return order
+
+    def __addSessionKey(self, key, order):
+        """
+        登记报单的(FrontID, SessionID, OrderRef),调用时需要持有锁
+        """
+        self.__sessionDict[key] = order
+        self.__sessionKeyDict.setdefault(order.id, []).append(key)
+
+    def remove(self, order):
+        """
+        报单完成后从索引中删除
+        """
+        with self.__lock:
+            self.__orderDict.pop(order.id, None)
+            self.__fillDict.pop(order.id, None)
+            for key in self.__sessionKeyDict.pop(order.id, []):
+                self.__sessionDict.pop(key, None)
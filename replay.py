@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+import threading
+import time
+
+
+class ReplayClock(object):
+    """
+    行情回放时钟的基类
+    回放时每发送一条行情数据之前调用wait(),由时钟决定需要等待多久
+    """
+
+    def wait(self, tickTime):
+        """
+        等待直到可以发送下一条数据
+        参数:
+            tickTime 行情数据的记录时间(datetime)
+        返回:
+            True 可以发送, False 回放已停止
+        """
+        raise Exception(u'方法未实现')
+
+    def close(self):
+        """
+        停止回放,释放正在等待的线程
+        """
+        pass
+
+
+class IntervalClock(ReplayClock):
+    """
+    固定间隔时钟: 每条数据之间等待固定的时间,不考虑记录时间
+    """
+
+    def __init__(self, interval):
+        """
+        interval 每条数据之间的等待时间,单位:秒
+        """
+        self.interval = interval
+
+    def wait(self, tickTime):
+        time.sleep(self.interval)
+        return True
+
+
+class MaxSpeedClock(ReplayClock):
+    """
+    最快速度时钟: 不做任何等待
+    """
+
+    def wait(self, tickTime):
+        return True
+
+
+class ScaledClock(ReplayClock):
+    """
+    按记录时间回放的时钟
+    以第一条数据为起点,数据之间的间隔按记录时间的间隔除以speed计算,
+    等待的目标时间都从起点计算,等待误差不会累积
+    """
+
+    def __init__(self, speed=1):
+        """
+        speed 回放速度倍数,1为实际速度
+        """
+        if speed <= 0:
+            raise Exception(u'无效的回放速度')
+        self.speed = speed
+        self.__origin = None
+
+    def wait(self, tickTime):
+        if self.__origin is None:
+            self.__origin = (tickTime, time.time())
+            return True
+        tickTime0, wallTime0 = self.__origin
+        target = wallTime0 + (tickTime - tickTime0).total_seconds() / self.speed
+        delay = target - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+
+class StepClock(ReplayClock):
+    """
+    单步时钟: 由数据的使用者调用step()决定发送多少条数据
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition()
+        self.__credit = 0
+        self.__closed = False
+
+    def step(self, count=1):
+        """
+        允许再发送count条数据
+        """
+        with self.__condition:
+            self.__credit += count
+            self.__condition.notify_all()
+
+    def wait(self, tickTime):
+        with self.__condition:
+            while self.__credit <= 0 and not self.__closed:
+                # NOTE: 带超时的wait在python2中才能响应KeyboardInterrupt
+                self.__condition.wait(1)
+            if self.__closed:
+                return False
+            self.__credit -= 1
+            return True
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+
+def createReplayClock(replayMode, interval=.5, speed=1):
+    """
+    根据回放模式创建回放时钟
+    参数:
+        replayMode 回放模式,取值见database.models.REPLAY_MODE
+        interval 固定间隔模式的时间间隔,单位:秒
+        speed 按记录时间回放的速度倍数
+    """
+    if replayMode == 'interval':
+        return IntervalClock(interval)
+    if replayMode == 'max':
+        return MaxSpeedClock()
+    if replayMode == 'realtime':
+        return ScaledClock(speed)
+    if replayMode == 'step':
+        return StepClock()
+    raise Exception(u'未知的回放模式:%s' % replayMode)
+
+
+def iterateQuerySet(querySet, fields, chunkSize=2000):
+    """
+    按id分段读取查询结果
+    每次只读取chunkSize条记录,避免将整个查询结果载入内存
+    参数:
+        querySet 查询条件
+        fields 要读取的字段列表
+        chunkSize 每次读取的记录数量
+    返回:
+        生成器,每条记录为一个字段字典(不含id),按id顺序排列
+    """
+    lastId = None
+    while True:
+        chunk = querySet
+        if lastId is not None:
+            chunk = chunk.filter(id__gt=lastId)
+        chunk = chunk.order_by('id').values('id', *fields)[:chunkSize]
+        count = 0
+        for row in chunk.iterator():
+            count += 1
+            lastId = row.pop('id')
+            yield row
+        if count < chunkSize:
+            break
+
+
+def getStepAddress(broadcastAddress):
+    """
+    获取单步回放的控制地址
+    NOTE: 共享内存广播地址(shm://)的控制请求仍使用zmq,改为同一路径的ipc地址
+    """
+    if broadcastAddress.startswith('shm://'):
+        broadcastAddress = 'ipc://' + broadcastAddress[len('shm://'):]
+    return '%s-step' % broadcastAddress
+
+
+def serveStepClock(clock, address):
+    """
+    在后台线程中接收单步回放的控制请求
+    请求消息为允许发送的数据数量(字符串),应答消息为'ok'
+    参数:
+        clock StepClock
+        address 控制地址,见getStepAddress
+    返回:
+        后台线程
+    """
+    import zmq
+
+    def working():
+        socket = zmq.Context.instance().socket(zmq.REP)
+        socket.bind(address)
+        while True:
+            count = int(socket.recv())
+            clock.step(count)
+            socket.send('ok')
+
+    thread = threading.Thread(target=working)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def requestStep(address, count=1):
+    """
+    请求单步回放的数据生成器再发送count条数据
+    参数:
+        address 控制地址,见getStepAddress
+        count 允许发送的数据数量
+    """
+    import zmq
+    socket = zmq.Context.instance().socket(zmq.REQ)
+    socket.connect(address)
+    try:
+        socket.send(str(count))
+        socket.recv()
+    finally:
+        socket.close()
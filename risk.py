@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+报单前的风险控制
+所有计数都保存在内存中,检查时不访问数据库:
+1.头寸上限: 各品种每个方向的已打开数量加上未成交的开仓数量不能超过上限
+2.报单频率: 开仓报单使用令牌桶限制每秒的报单数量
+3.撤单频率: 撤单使用令牌桶限制每秒的撤单数量
+计数由交易接口的成交,撤单和出错事件维护,见Trader
+"""
+from __future__ import division
+from latency import monotonicNs
+import threading
+import error
+
+
+def riskError(errorInfo, detail=''):
+    """
+    生成风险控制拒绝报单的异常,格式与报单出错时Future的异常相同: "出错代码:提示信息"
+    参数:
+        errorInfo error.py中的出错代码和提示信息
+        detail 补充信息
+    """
+    errorId, errorMsg = errorInfo
+    if detail:
+        errorMsg = u'%s:%s' % (errorMsg, detail)
+    return Exception(u'%d:%s' % (errorId, errorMsg))
+
+
+class TokenBucket(object):
+    """
+    令牌桶
+    令牌按rate(个/秒)的速度增加,最多积累burst个,每次操作消耗一个令牌
+    NOTE: 不是线程安全的,由RiskGate加锁调用
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        rate 每秒增加的令牌数量
+        burst 最多积累的令牌数量,默认与rate相同
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.__lastTime = monotonicNs()
+
+    def consume(self, count=1, now=None):
+        """
+        消耗令牌
+        参数:
+            count 消耗的令牌数量
+            now 当前时间(单调时钟纳秒),默认为当前时间
+        返回:
+            令牌是否足够,不足时不消耗令牌
+        """
+        if now is None:
+            now = monotonicNs()
+        elapsed = max(now - self.__lastTime, 0) / 1e9
+        self.__lastTime = now
+        self.tokens = min(self.tokens + elapsed * self.rate, self.burst)
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+
+class RiskGate(object):
+    """
+    报单前的风险控制
+    """
+
+    def __init__(self, maxBuyVolume=None, maxSellVolume=None, orderRate=None, orderBurst=None, cancelRate=None,
+                 clip=False):
+        """
+        参数:
+            maxBuyVolume 每个品种多头的数量上限,None表示不限制
+            maxSellVolume 每个品种空头的数量上限,None表示不限制
+            orderRate 每秒最多的开仓报单数量,None表示不限制
+            orderBurst 开仓报单最多可以连续发出的数量,默认与orderRate相同
+            cancelRate 每秒最多的撤单数量,None表示不限制
+            clip 超过头寸上限时是否减少报单数量,默认为False表示拒绝报单
+        """
+        self.maxVolume = {'buy': maxBuyVolume, 'sell': maxSellVolume}
+        self.clip = clip
+        self.orderBucket = TokenBucket(orderRate, orderBurst) if orderRate else None
+        self.cancelBucket = TokenBucket(cancelRate) if cancelRate else None
+        self.__lock = threading.Lock()
+        # (方向, 品种) -> 数量
+        self.__openVolume = {}
+        self.__pendingVolume = {}
+        # 统计数据
+        self.rejectCount = 0
+
+    @classmethod
+    def fromExecuter(cls, modelStrategyExecuter, **kwargs):
+        """
+        按策略执行器的配置创建,头寸上限 = 最大头寸数量 * 默认头寸大小
+        """
+        volume = modelStrategyExecuter.volume
+        return cls(modelStrategyExecuter.maxBuyPosition * volume, modelStrategyExecuter.maxSellPosition * volume,
+                   **kwargs)
+
+    def reset(self, positionList, pendingOrderList=()):
+        """
+        清空计数并重新计算,用于启动时与数据库核对
+        参数:
+            positionList 已打开的头寸列表
+            pendingOrderList 未成交的开仓报单列表
+        """
+        with self.__lock:
+            self.__openVolume = {}
+            self.__pendingVolume = {}
+            for position in positionList:
+                key = (position.direction, position.instrumentId)
+                self.__openVolume[key] = self.__openVolume.get(key, 0) + position.volume
+            for order in pendingOrderList:
+                key = (order.direction, order.instrumentId)
+                self.__pendingVolume[key] = self.__pendingVolume.get(key, 0) + order.volume
+
+    def getOpenVolume(self, instrumentId, direction):
+        """
+        已打开的数量
+        """
+        return self.__openVolume.get((direction, instrumentId), 0)
+
+    def getPendingVolume(self, instrumentId, direction):
+        """
+        未成交的开仓数量
+        """
+        return self.__pendingVolume.get((direction, instrumentId), 0)
+
+    def checkOpen(self, instrumentId, direction, volume):
+        """
+        检查开仓报单,通过时计入未成交的开仓数量
+        参数:
+            instrumentId 品种
+            direction 方向
+            volume 报单数量
+        返回:
+            允许的报单数量,clip为True时可能小于volume
+        异常:
+            Exception 超过头寸上限或报单频率
+        """
+        key = (direction, instrumentId)
+        with self.__lock:
+            maxVolume = self.maxVolume.get(direction)
+            if maxVolume is not None:
+                available = maxVolume - self.__openVolume.get(key, 0) - self.__pendingVolume.get(key, 0)
+                if volume > available:
+                    if not self.clip or available <= 0:
+                        self.rejectCount += 1
+                        raise riskError(error.RiskPositionLimit, u'%s %s 可开数量%s' % (
+                            instrumentId, direction, max(available, 0)))
+                    volume = available
+            if self.orderBucket is not None and not self.orderBucket.consume():
+                self.rejectCount += 1
+                raise riskError(error.RiskOrderRate)
+            self.__pendingVolume[key] = self.__pendingVolume.get(key, 0) + volume
+        return volume
+
+    def checkCancel(self):
+        """
+        检查撤单频率
+        异常:
+            Exception 超过每秒的撤单数量
+        """
+        if self.cancelBucket is None:
+            return
+        with self.__lock:
+            if not self.cancelBucket.consume():
+                self.rejectCount += 1
+                raise riskError(error.RiskCancelRate)
+
+    def onOpened(self, order, position):
+        """
+        开仓报单成交,未成交数量转为已打开数量
+        """
+        key = (position.direction, position.instrumentId)
+        with self.__lock:
+            self.__pendingVolume[key] = max(self.__pendingVolume.get(key, 0) - order.volume, 0)
+            self.__openVolume[key] = self.__openVolume.get(key, 0) + position.volume
+
+    def onOpenFailed(self, order):
+        """
+        开仓报单撤销或出错,释放未成交数量
+        """
+        key = (order.direction, order.instrumentId)
+        with self.__lock:
+            self.__pendingVolume[key] = max(self.__pendingVolume.get(key, 0) - order.volume, 0)
+
+    def onClosed(self, position):
+        """
+        头寸已平仓,释放已打开数量
+        """
+        key = (position.direction, position.instrumentId)
+        with self.__lock:
+            self.__openVolume[key] = max(self.__openVolume.get(key, 0) - position.volume, 0)
+
+    def onPartiallyClosed(self, position, volume):
+        """
+        平仓报单部分成交,释放已平仓部分的已打开数量,头寸剩余的数量仍然计入
+        参数:
+            position 部分平仓的头寸
+            volume 已平仓的数量
+        """
+        key = (position.direction, position.instrumentId)
+        with self.__lock:
+            self.__openVolume[key] = max(self.__openVolume.get(key, 0) - volume, 0)
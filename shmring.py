@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+同一台机器上的共享内存行情广播
+数据生成器(唯一的写入方)将广播消息写入内存映射文件中的环形缓冲区,策略执行器(任意多个读取方)各自按序号读取,
+写入的开销与读取方的数量无关,读取时不需要系统调用和反序列化
+广播地址为 shm://<文件路径>,如 shm:///dev/shm/ctp-IF
+文件格式:
+    头部(64字节): 8字节标识 'CTPRING\\0',版本号,槽位数量,槽位大小(4字节无符号整数,小端)
+    写入序号(8字节),单独占用一个缓存行(64字节)
+    槽位数组: 每个槽位为固定长度的记录
+        槽位序号(8字节),消息各部分的长度(4个2字节无符号整数),消息占用的槽位数量(2字节无符号整数),消息数据
+超过一个槽位的消息(如带有多根棒线或JSON格式的行情)按顺序写入连续的多个槽位,
+第一个槽位记录各部分的长度和占用的槽位数量,后续槽位的长度和槽位数量均为0,只保存剩余的数据
+每个槽位使用序号锁(seqlock): 写入第n个槽位时槽位序号先设为2n-1,写完后设为2n,
+读取方在复制数据前后各读取一次消息所有槽位的序号,不等于2n说明数据已被覆盖(读取方落后超过一圈),
+此时跳到最新的位置并累计丢失的槽位数量
+NOTE: 依赖x86的写入顺序(TSO)保证读取方看到2n时数据已经写完
+"""
+import struct
+import mmap
+import time
+import os
+
+MAGIC = 'CTPRING\0'
+VERSION = 2
+
+# 地址前缀
+SHM_ADDRESS_PREFIX = 'shm://'
+
+HEADER_STRUCT = struct.Struct('<8sIII')
+HEADER_SIZE = 64
+# 写入序号的位置
+WRITE_SEQ_OFFSET = 64
+WRITE_SEQ_STRUCT = struct.Struct('<q')
+# 槽位数组的起始位置
+SLOTS_OFFSET = 128
+# 槽位头部: 槽位序号,消息4个部分的长度,消息占用的槽位数量
+SLOT_STRUCT = struct.Struct('<qHHHHH')
+# 消息每个部分的最大长度
+MAX_PART_SIZE = 0xffff
+
+# 默认的槽位数量和大小
+DEFAULT_SLOT_COUNT = 65536
+DEFAULT_SLOT_SIZE = 256
+
+# 读取方没有新消息时的等待时间,单位:秒
+POLL_INTERVAL = .0002
+
+
+def isShmAddress(address):
+    """
+    是否为共享内存广播地址
+    """
+    return address.startswith(SHM_ADDRESS_PREFIX)
+
+
+def getShmPath(address):
+    """
+    获取共享内存广播地址对应的文件路径
+    """
+    if not isShmAddress(address):
+        raise Exception(u'无效的共享内存广播地址:%s' % address)
+    return address[len(SHM_ADDRESS_PREFIX):]
+
+
+class ShmRingWriter(object):
+    """
+    环形缓冲区的写入方
+    接口与zmq的PUB socket相同(send_multipart),可以直接替换数据生成器的广播socket
+    """
+
+    def __init__(self, path, slotCount=DEFAULT_SLOT_COUNT, slotSize=DEFAULT_SLOT_SIZE):
+        """
+        创建(或重建)缓冲区文件
+        参数:
+            path 文件路径,建议放在/dev/shm下
+            slotCount 槽位数量,即读取方最多可以落后的消息数量
+            slotSize 槽位大小,超过一个槽位的消息写入连续的多个槽位
+        """
+        self.path = path
+        self.slotCount = slotCount
+        self.slotSize = slotSize
+        self.dataSize = slotSize - SLOT_STRUCT.size
+        size = SLOTS_OFFSET + slotCount * slotSize
+
+        # 先写入临时文件再改名,读取方不会打开未初始化的文件;已打开旧文件的读取方不受影响
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            f.truncate(size)
+            f.write(HEADER_STRUCT.pack(MAGIC, VERSION, slotCount, slotSize))
+        os.rename(tmpPath, path)
+        self.__file = open(path, 'r+b')
+        self.__mmap = mmap.mmap(self.__file.fileno(), size)
+        self.sequence = 0
+
+    def send_multipart(self, messages):
+        """
+        写入一条广播消息
+        参数:
+            messages 消息列表,最多4个部分,见wireformat.encodeMarketData
+        """
+        messages = [p.encode('utf-8') if type(p) == unicode else p for p in messages]
+        lengths = [len(p) for p in messages] + [0] * (4 - len(messages))
+        data = ''.join(messages)
+        dataSize = self.dataSize
+        slots = max((len(data) + dataSize - 1) // dataSize, 1)
+        if len(messages) > 4 or max(lengths) > MAX_PART_SIZE or slots >= self.slotCount:
+            raise Exception(u'消息超过共享内存缓冲区的大小:%d' % len(data))
+
+        buf = self.__mmap
+        first = self.sequence + 1
+        for i in range(slots):
+            sequence = first + i
+            offset = SLOTS_OFFSET + (sequence % self.slotCount) * self.slotSize
+            if i == 0:
+                SLOT_STRUCT.pack_into(buf, offset, sequence * 2 - 1, lengths[0], lengths[1], lengths[2], lengths[3],
+                                      slots)
+            else:
+                SLOT_STRUCT.pack_into(buf, offset, sequence * 2 - 1, 0, 0, 0, 0, 0)
+            start = offset + SLOT_STRUCT.size
+            chunk = data[i * dataSize:(i + 1) * dataSize]
+            buf[start:start + len(chunk)] = chunk
+            WRITE_SEQ_STRUCT.pack_into(buf, offset, sequence * 2)
+        self.sequence = first + slots - 1
+        WRITE_SEQ_STRUCT.pack_into(buf, WRITE_SEQ_OFFSET, self.sequence)
+
+    def close(self):
+        """
+        关闭缓冲区,文件保留,读取方可以读完剩余的消息
+        """
+        self.__mmap.close()
+        self.__file.close()
+
+
+class ShmRingReader(object):
+    """
+    环形缓冲区的读取方
+    每个读取方独立维护读取序号,互不影响
+    """
+
+    def __init__(self, path, fromStart=False):
+        """
+        打开缓冲区文件
+        参数:
+            path 文件路径
+            fromStart 是否从缓冲区中最早的消息开始读取,默认只读取打开之后写入的消息
+        """
+        self.path = path
+        self.__file = open(path, 'rb')
+        header = self.__file.read(HEADER_SIZE)
+        magic, version, self.slotCount, self.slotSize = HEADER_STRUCT.unpack_from(header)
+        if magic != MAGIC:
+            raise Exception(u'无效的共享内存缓冲区文件:%s' % path)
+        if version != VERSION:
+            raise Exception(u'不支持的共享内存缓冲区版本:%d' % version)
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        writeSequence = self.getWriteSequence()
+        if fromStart:
+            self.sequence = max(writeSequence - self.slotCount + 1, 1)
+        else:
+            self.sequence = writeSequence + 1
+        # 因落后过多被覆盖而丢失(或从消息中间开始读取而跳过)的槽位数量
+        self.gapCount = 0
+
+    def getWriteSequence(self):
+        """
+        写入方最后写完的消息序号
+        """
+        return WRITE_SEQ_STRUCT.unpack_from(self.__mmap, WRITE_SEQ_OFFSET)[0]
+
+    def __getSlotOffset(self, sequence):
+        return SLOTS_OFFSET + (sequence % self.slotCount) * self.slotSize
+
+    def recv_multipart(self):
+        """
+        读取下一条消息,不等待
+        返回:
+            消息列表,没有新消息时返回None
+        """
+        buf = self.__mmap
+        dataSize = self.slotSize - SLOT_STRUCT.size
+        while True:
+            sequence = self.sequence
+            offset = self.__getSlotOffset(sequence)
+            slotSequence, l0, l1, l2, l3, slots = SLOT_STRUCT.unpack_from(buf, offset)
+            if slotSequence < sequence * 2:
+                # 还没有写入(或正在写入)
+                return None
+            if slotSequence == sequence * 2 and slots == 0:
+                # 从消息的中间开始读取(打开缓冲区或跳过被覆盖的消息后),跳过消息的后续槽位
+                self.gapCount += 1
+                self.sequence = sequence + 1
+                continue
+            if slotSequence == sequence * 2:
+                size = l0 + l1 + l2 + l3
+                chunks = []
+                for i in range(slots):
+                    start = self.__getSlotOffset(sequence + i)
+                    if WRITE_SEQ_STRUCT.unpack_from(buf, start)[0] < (sequence + i) * 2:
+                        # 消息的后续槽位还没有写完
+                        return None
+                    start += SLOT_STRUCT.size
+                    chunks.append(buf[start:start + min(dataSize, size - i * dataSize)])
+                if all(WRITE_SEQ_STRUCT.unpack_from(buf, self.__getSlotOffset(sequence + i))[0] == (sequence + i) * 2
+                       for i in range(slots)):
+                    self.sequence = sequence + slots
+                    data = ''.join(chunks)
+                    messages = [data[:l0], data[l0:l0 + l1], data[l0 + l1:l0 + l1 + l2], data[l0 + l1 + l2:]]
+                    return messages
+            # 槽位已被之后的消息覆盖,跳到缓冲区中最早的消息
+            oldest = max(self.getWriteSequence() - self.slotCount + 2, sequence + 1)
+            self.gapCount += oldest - sequence
+            self.sequence = oldest
+
+    def recv(self, timeout=None):
+        """
+        读取下一条消息,没有新消息时等待
+        参数:
+            timeout 最长等待时间,单位:秒,默认一直等待
+        返回:
+            消息列表,超时返回None
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            messages = self.recv_multipart()
+            if messages is not None:
+                return messages
+            if deadline is not None and time.time() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def close(self):
+        self.__mmap.close()
+        self.__file.close()
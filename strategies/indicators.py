@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from collections import deque
+import math
+
+
+class RingBuffer(object):
+    """
+    定长环形缓冲区
+    缓冲区满后再加入数据会覆盖最早的数据,索引0为最早的数据
+    """
+
+    def __init__(self, size):
+        """
+        size 缓冲区大小
+        """
+        if size <= 0:
+            raise Exception(u'无效的缓冲区大小')
+        self.size = size
+        self.__data = [None] * size
+        self.__start = 0
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.__count
+        if i < 0 or i >= self.__count:
+            raise IndexError(i)
+        return self.__data[(self.__start + i) % self.size]
+
+    def __iter__(self):
+        for i in range(self.__count):
+            yield self.__data[(self.__start + i) % self.size]
+
+    def full(self):
+        """
+        缓冲区是否已满
+        """
+        return self.__count == self.size
+
+    def append(self, value):
+        """
+        加入数据
+        返回: 被覆盖的数据,缓冲区未满时返回None
+        """
+        if self.__count < self.size:
+            self.__data[(self.__start + self.__count) % self.size] = value
+            self.__count += 1
+            return None
+        evicted = self.__data[self.__start]
+        self.__data[self.__start] = value
+        self.__start = (self.__start + 1) % self.size
+        return evicted
+
+
+class RollingStats(object):
+    """
+    滑动窗口的均值,方差,标准差和z-score
+    每次加入数据的计算量为O(1),每加入window个数据重新精确计算一次以消除累积误差
+    NOTE: 方差和标准差为样本方差(ddof=1),与pandas.Series.var()/std()一致
+    """
+
+    def __init__(self, window):
+        """
+        window 窗口大小
+        """
+        self.window = window
+        self.__buffer = RingBuffer(window)
+        self.__mean = 0.
+        self.__m2 = 0.
+        self.__updates = 0
+
+    def __len__(self):
+        return len(self.__buffer)
+
+    def append(self, value):
+        """
+        加入数据
+        """
+        evicted = self.__buffer.append(value)
+        n = len(self.__buffer)
+        if evicted is None:
+            delta = value - self.__mean
+            self.__mean += delta / n
+            self.__m2 += delta * (value - self.__mean)
+        else:
+            mean = self.__mean
+            self.__mean += (value - evicted) / n
+            self.__m2 += (value - evicted) * (value - self.__mean + evicted - mean)
+        self.__updates += 1
+        if self.__updates >= self.window:
+            self.__recompute()
+
+    def __recompute(self):
+        """
+        根据缓冲区中的数据重新计算均值和方差
+        """
+        n = len(self.__buffer)
+        self.__mean = math.fsum(self.__buffer) / n
+        self.__m2 = math.fsum((x - self.__mean) ** 2 for x in self.__buffer)
+        self.__updates = 0
+
+    def mean(self):
+        """
+        均值,没有数据时返回nan
+        """
+        if len(self.__buffer) == 0:
+            return float('nan')
+        return self.__mean
+
+    def var(self):
+        """
+        样本方差,数据少于2个时返回nan
+        """
+        n = len(self.__buffer)
+        if n < 2:
+            return float('nan')
+        return max(self.__m2, 0.) / (n - 1)
+
+    def std(self):
+        """
+        样本标准差
+        """
+        return math.sqrt(self.var())
+
+    def zscore(self, value):
+        """
+        计算value相对于窗口数据的z-score,标准差为0时返回nan
+        """
+        std = self.std()
+        if not std > 0:
+            return float('nan')
+        return (value - self.__mean) / std
+
+
+class EMA(object):
+    """
+    指数移动平均
+    """
+
+    def __init__(self, span=None, alpha=None):
+        """
+        span 跨度,alpha = 2 / (span + 1)
+        alpha 平滑系数,与span二选一
+        """
+        if alpha is None:
+            if span is None:
+                raise Exception(u'必须指定span或alpha')
+            alpha = 2 / (span + 1)
+        self.alpha = alpha
+        self.value = None
+
+    def append(self, value):
+        """
+        加入数据
+        返回: 当前的指数移动平均值
+        """
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class RollingMax(object):
+    """
+    滑动窗口的最大值(单调队列实现,均摊O(1))
+    """
+
+    def __init__(self, window):
+        """
+        window 窗口大小
+        """
+        self.window = window
+        self.__deque = deque()
+        self.__count = 0
+
+    def _better(self, a, b):
+        """
+        a是否优于(或等于)b,RollingMin重载此方法
+        """
+        return a >= b
+
+    def append(self, value):
+        """
+        加入数据
+        返回: 当前窗口的最大值
+        """
+        while self.__deque and self._better(value, self.__deque[-1][1]):
+            self.__deque.pop()
+        self.__deque.append((self.__count, value))
+        self.__count += 1
+        if self.__deque[0][0] <= self.__count - 1 - self.window:
+            self.__deque.popleft()
+        return self.__deque[0][1]
+
+    def value(self):
+        """
+        当前窗口的最大值,没有数据时返回None
+        """
+        if not self.__deque:
+            return None
+        return self.__deque[0][1]
+
+
+class RollingMin(RollingMax):
+    """
+    滑动窗口的最小值
+    """
+
+    def _better(self, a, b):
+        return a <= b
+
+
+class SpreadTracker(object):
+    """
+    两个品种的价差跟踪
+    价差 = 品种1的价格 - 品种0的价格,两个品种都有价格后每次更新都计入滑动窗口统计
+    """
+
+    def __init__(self, instrumentID0, instrumentID1, window):
+        """
+        instrumentID0 品种0
+        instrumentID1 品种1
+        window 统计窗口大小
+        """
+        self.instrumentID0 = instrumentID0
+        self.instrumentID1 = instrumentID1
+        self.price0 = 0
+        self.price1 = 0
+        self.spread = None
+        self.stats = RollingStats(window)
+
+    def update(self, instrumentID, price):
+        """
+        更新品种价格
+        返回: 最新的价差,两个品种还没有都收到价格时返回None
+        """
+        if instrumentID == self.instrumentID0:
+            self.price0 = price
+        elif instrumentID == self.instrumentID1:
+            self.price1 = price
+        else:
+            return None
+        if self.price0 == 0 or self.price1 == 0:
+            return None
+        self.spread = self.price1 - self.price0
+        self.stats.append(self.spread)
+        return self.spread
+
+    def deviation(self):
+        """
+        最新价差相对于窗口均值的偏离
+        """
+        if self.spread is None:
+            return float('nan')
+        return self.spread - self.stats.mean()
+
+    def zscore(self):
+        """
+        最新价差的z-score
+        """
+        if self.spread is None:
+            return float('nan')
+        return self.stats.zscore(self.spread)
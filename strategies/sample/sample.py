@@ -1,13 +1,22 @@
 # -*- coding: utf-8 -*-
 
-from collections import deque
-from pandas import Series
+from strategies.indicators import RollingStats
 
 def onInit(config):
     '''
     执行器初始化时调用
+    config 策略配置:
+        threshold 开仓的偏离值阈值,默认2.5
+        window 计算平均点差的窗口大小,默认400
+        instrumentID0, instrumentID1 对冲的两个品种
     '''
+    global diffs,threshold,instrumentID0,instrumentID1,pendingPair
     print config
+    pendingPair = None
+    threshold = config.get('threshold', threshold)
+    diffs = RollingStats(config.get('window', diffs.window))
+    instrumentID0 = config.get('instrumentID0', instrumentID0)
+    instrumentID1 = config.get('instrumentID1', instrumentID1)
 
 
 count = 0
@@ -15,64 +24,74 @@ bid0 = 0
 bid1 = 0
 ask0 = 0
 ask1 = 0
-diffs = deque(maxlen=400)
+diffs = RollingStats(400)
+threshold = 2.5
 lastDirection = 0
 instrumentID0 = 'IF1508'
 instrumentID1 = 'IF1509'
+# 等待成交的对冲头寸: (两条腿的Future列表, 开仓时的报价和平均点差)
+pendingPair = None
 
 
 def openPair(trader,instrumentID0,instrumentID1,direction,volume=1):
     '''
     创建对冲头寸
+    两条腿的报单一起发出,不等待成交
+    NOTE: 模拟交易在下一个报价到达时(同一个线程)才撮合,在onDataArrived中等待成交会一直超时
+    返回: 两条腿的Future列表
     '''
     if direction not in (1,-1):
         raise Exception(u'无效头寸方向')
 
     if direction == 1:
+        direction0, direction1 = 'buy', 'sell'
+    else:
+        direction0, direction1 = 'sell', 'buy'
 
-        errorId,errorMsg,data = trader.open(instrumentID=instrumentID0,directionCode = 'buy',volume=volume)
-        if errorId != 0 :
-            print errorId,errorMsg
-            raise Exception(u'头寸创建失败')
+    return trader.openPositionsAsync([(instrumentID0, direction0, volume), (instrumentID1, direction1, volume)])
 
-        price0 = data.openPrice
-        print 'i0:做多:openPrice =',data.openPrice
 
-        errorId,errorMsg,data = trader.open(instrumentID=instrumentID1,directionCode = 'sell',volume=volume)
-        if errorId != 0 :
-            print errorId,errorMsg
-            raise Exception(u'头寸创建失败')
-        print 'i1:做空:openPrice =',data.openPrice
-        price1 = data.openPrice
-
-        return price0,price1
-
-    if direction == -1:
-
-        errorId,errorMsg,data = trader.open(instrumentID=instrumentID1,directionCode = 'buy',volume=volume)
-        if errorId != 0 :
-            print errorId,errorMsg
-            raise Exception(u'头寸创建失败')
-        print 'i1:做多:openPrice =',data.openPrice
-        price1 = data.openPrice
-
-        errorId,errorMsg,data = trader.open(instrumentID=instrumentID0,directionCode = 'sell',volume=volume)
-        if errorId != 0 :
-            print errorId,errorMsg
-            raise Exception(u'头寸创建失败')
-        print 'i0:做空:openPrice =',data.openPrice
-        price0 = data.openPrice
-
-        return price0,price1
+def checkPair():
+    '''
+    检查等待成交的对冲头寸,两条腿都完成后显示开仓价格和滑点
+    '''
+    global pendingPair
+    if pendingPair is None:
+        return
+    futureList, direction, mean, bid0, bid1, ask0, ask1 = pendingPair
+    if not all(future.done() for future in futureList):
+        return
+    pendingPair = None
+
+    try:
+        order0, order1 = [future.result() for future in futureList]
+    except Exception as e:
+        print e
+        print u'头寸创建失败'
+        return
+
+    price0 = order0.position.openPrice
+    price1 = order1.position.openPrice
+    print 'i0:%s:openPrice =' % order0.direction, price0
+    print 'i1:%s:openPrice =' % order1.direction, price1
+    if direction == 1:
+        print '实际价差 =', price1 - price0 - mean
+        print '买盘滑点 =', price0 - bid0
+        print '卖盘滑点 =', ask1 - price1
+    else:
+        print '实际价差 =',mean - (price1 - price0)
+        print '买盘滑点 =', price1 - bid1
+        print '卖盘滑点 =', ask0 - price0
 
 
 def onDataArrived(data,trader):
     '''
     执行数据每次接收到数据
     '''
-    global count,bid0,bid1,ask0,ask1,diffs,lastDirection
+    global count,bid0,bid1,ask0,ask1,diffs,lastDirection,pendingPair
 
     count += 1
+    checkPair()
     #print 'instrumentID =',data['instrumentID'],'count=',count
     #if count == 10:
     #    print 'bid =',data['bid'],'ask =',data['ask']
@@ -98,32 +117,33 @@ def onDataArrived(data,trader):
         diff = bid1 - bid0
         diffs.append(diff)
         if len(diffs) > 50:
-            s = Series(diffs)
-            pts = diff - s.mean()
-            if abs(pts) > 2.5:
+            mean = diffs.mean()
+            pts = diff - mean
+            if pendingPair is not None:
+                # 上一个对冲头寸还在等待成交
+                pass
+            elif abs(pts) > threshold:
                 if pts > 0 and lastDirection <= 0:
                     lastDirection = 1
                     print '开仓条件触发,头寸方向:', lastDirection
                     print 'bid0 =', bid0, 'bid1 =', bid1, 'ask0 =', ask0, 'ask1 =', ask1
                     print 'diff =', diff, '偏离值 =', pts
                     trader.closeAll()
-                    price0, price1 = openPair(trader, instrumentID0, instrumentID1, lastDirection)
-                    print '实际价差 =', price1 - price0 - s.mean()
-                    print '买盘滑点 =', price0 - bid0
-                    print '卖盘滑点 =', ask1 - price1
+                    futureList = openPair(trader, instrumentID0, instrumentID1, lastDirection)
+                    pendingPair = (futureList, lastDirection, mean, bid0, bid1, ask0, ask1)
+                    checkPair()
                 if pts < 0 and lastDirection >= 0:
                     lastDirection = -1
                     print '开仓条件触发,头寸方向:', lastDirection
                     print 'bid0 =', bid0, 'bid1 =', bid1, 'ask0 =', ask0, 'ask1 =', ask1
                     print 'diff =', diff, '偏离值 =', pts
                     trader.closeAll()
-                    price0, price1 = openPair(trader, instrumentID0, instrumentID1, lastDirection)
-                    print '实际价差 =',s.mean() - (price1 - price0)
-                    print '买盘滑点 =', price1 - bid1
-                    print '卖盘滑点 =', ask0 - price0
+                    futureList = openPair(trader, instrumentID0, instrumentID1, lastDirection)
+                    pendingPair = (futureList, lastDirection, mean, bid0, bid1, ask0, ask1)
+                    checkPair()
             else:
                 if count % 30 == 0:
-                    print '平均点差 =', s.mean(), 'diff =', diff, '偏离值 =', pts
+                    print '平均点差 =', mean, 'diff =', diff, '偏离值 =', pts
 
 def onExit(trader):
     '''
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+策略参数扫描
+按参数网格生成多组策略配置,使用进程池并行回测(见backtest.py),汇总每组参数的盈亏,最大回撤和成交次数
+行情数据只载入一次,保存为临时的.npy文件,各工作进程以只读的memmap打开,共享操作系统的页缓存
+用法:
+    python sweep.py <策略文件> <配置文件> <参数网格文件> --instrument IF1508 IF1509 --day 20150801 \\
+        [--store 行情目录] [--processes 进程数量] [--output 结果文件(csv)]
+参数网格文件(json): 参数名 -> 取值列表,如 {"threshold": [2, 2.5, 3], "window": [200, 400]}
+"""
+from __future__ import division
+from backtest import loadTicks, runBacktest, BACKTEST_COLUMNS
+import multiprocessing
+import itertools
+import traceback
+import tempfile
+import shutil
+import numpy
+import json
+import os
+
+# 结果表中的统计列
+RESULT_COLUMNS = ['pnl', 'maxDrawdown', 'tradeCount', 'winRate']
+
+# 工作进程中的回测数据,由_initWorker设置
+_worker = {}
+
+
+def expandGrid(grid):
+    """
+    展开参数网格
+    参数:
+        grid 参数名 -> 取值列表
+    返回:
+        参数字典列表,按参数名排序后的笛卡尔积
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def saveSharedTicks(ticks, directory):
+    """
+    将loadTicks的结果按列保存为.npy文件,供工作进程以memmap方式读取
+    """
+    for name, column in ticks.items():
+        numpy.save(os.path.join(directory, '%s.npy' % name), column)
+
+
+def loadSharedTicks(directory):
+    """
+    以只读memmap方式打开saveSharedTicks保存的数据
+    """
+    ticks = {}
+    for name in BACKTEST_COLUMNS + ['instrument']:
+        ticks[name] = numpy.load(os.path.join(directory, '%s.npy' % name), mmap_mode='r')
+    return ticks
+
+
+def _initWorker(strategyFile, instrumentIdList, tickDir, multiplier):
+    """
+    工作进程初始化
+    """
+    _worker['strategyFile'] = strategyFile
+    _worker['instrumentIdList'] = instrumentIdList
+    _worker['ticks'] = loadSharedTicks(tickDir)
+    _worker['multiplier'] = multiplier
+
+
+def _runOne(config):
+    """
+    在工作进程中运行一组参数的回测
+    返回: 统计数据字典,回测出错时包含error
+    """
+    try:
+        result = runBacktest(
+            _worker['strategyFile'], config, _worker['instrumentIdList'], _worker['ticks'], _worker['multiplier'])
+        return result.getSummary()
+    except Exception:
+        return {'error': traceback.format_exc()}
+
+
+def runSweep(strategyFile, baseConfig, grid, instrumentIdList, ticks, processes=None, multiplier=1):
+    """
+    并行运行参数扫描
+    参数:
+        strategyFile 策略文件
+        baseConfig 基础配置,每组参数在其基础上覆盖
+        grid 参数网格,参数名 -> 取值列表
+        instrumentIdList 品种列表
+        ticks loadTicks的返回值
+        processes 进程数量,默认为CPU核数
+        multiplier 合约乘数
+    返回:
+        [(参数字典, 统计数据字典), ...],与expandGrid的顺序一致
+    """
+    paramsList = expandGrid(grid)
+    configList = []
+    for params in paramsList:
+        config = dict(baseConfig)
+        config.update(params)
+        configList.append(config)
+
+    tickDir = tempfile.mkdtemp(prefix='sweep-')
+    try:
+        saveSharedTicks(ticks, tickDir)
+        pool = multiprocessing.Pool(
+            processes or multiprocessing.cpu_count(), _initWorker,
+            (os.path.abspath(strategyFile), instrumentIdList, tickDir, multiplier))
+        try:
+            # NOTE: 每次只分配一组参数,各组回测耗时不同时负载更均衡
+            summaryList = pool.map(_runOne, configList, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(tickDir)
+    return zip(paramsList, summaryList)
+
+
+def formatTable(results):
+    """
+    将扫描结果格式化为文本表格,每组参数一行,按盈亏从高到低排序
+    """
+    if not results:
+        return ''
+    names = sorted(results[0][0])
+    header = names + RESULT_COLUMNS
+    rows = []
+    for params, summary in sorted(results, key=lambda item: -item[1].get('pnl', float('-inf'))):
+        row = [str(params[name]) for name in names]
+        if 'error' in summary:
+            row += ['error'] + [''] * (len(RESULT_COLUMNS) - 1)
+        else:
+            row += ['%.2f' % summary['pnl'], '%.2f' % summary['maxDrawdown'],
+                    '%d' % summary['tradeCount'], '%.2f' % summary['winRate']]
+        rows.append(row)
+    widths = [max(len(row[i]) for row in [header] + rows) for i in range(len(header))]
+    lines = []
+    for row in [header] + rows:
+        lines.append('  '.join(value.rjust(width) for value, width in zip(row, widths)))
+    return '\n'.join(lines)
+
+
+def main():
+    """
+    命令行入口
+    """
+    import argparse
+    import csv
+    parser = argparse.ArgumentParser()
+    parser.add_argument('strategy', help=u'策略文件')
+    parser.add_argument('config', help=u'策略配置文件')
+    parser.add_argument('grid', help=u'参数网格文件')
+    parser.add_argument('--instrument', nargs='+', required=True)
+    parser.add_argument('--day', nargs='+', required=True)
+    parser.add_argument('--store', help=u'行情文件目录,见tickstore.py')
+    parser.add_argument('--catalog', type=int)
+    parser.add_argument('--multiplier', type=float, default=1)
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output', help=u'结果输出文件(csv)')
+    args = parser.parse_args()
+
+    from comhelper import setDjangoEnvironment
+    from tickstore import TickStore
+    setDjangoEnvironment(runtime=True)
+    from django.db import connection
+
+    with open(args.config) as f:
+        baseConfig = json.load(f)
+    with open(args.grid) as f:
+        grid = json.load(f)
+    store = TickStore(args.store) if args.store else None
+    ticks = loadTicks(args.instrument, args.day, store, args.catalog)
+    # NOTE: 工作进程不访问数据库,不继承父进程的数据库连接
+    connection.close()
+
+    results = runSweep(args.strategy, baseConfig, grid, args.instrument, ticks, args.processes, args.multiplier)
+    print formatTable(results)
+    for params, summary in results:
+        if 'error' in summary:
+            print u'参数%s回测出错:' % json.dumps(params)
+            print summary['error']
+
+    if args.output:
+        names = sorted(grid)
+        with open(args.output, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(names + RESULT_COLUMNS + ['error'])
+            for params, summary in results:
+                writer.writerow([params[name] for name in names] +
+                                [summary.get(name, '') for name in RESULT_COLUMNS] + [summary.get('error', '')])
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,7 @@
 
 # 初始化django运行环境
 from comhelper import setDjangoEnvironment
-setDjangoEnvironment()
+setDjangoEnvironment(runtime=True)
 from database.models import ModelDepthMarketData
 import argparse
 
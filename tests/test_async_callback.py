@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from callback import AsyncCallbackManager
+import threading
+import Queue
+import time
+
+
+class FakeModel(object):
+    def __init__(self, id):
+        self.id = id
+
+
+def test_async_callback_keep_order_per_position():
+    """
+    测试同一个头寸的事件按触发顺序调用
+    """
+    manager = AsyncCallbackManager(workerCount=4)
+    result = {}
+
+    def handler(order, position):
+        result.setdefault(position.id, []).append(order.id)
+
+    manager.bind('onPositionOpened', handler)
+    for i in range(100):
+        manager.callback('onPositionOpened', {'order': FakeModel(i), 'position': FakeModel(i % 5)})
+    manager.flush()
+    for positionId in range(5):
+        assert result[positionId] == range(positionId, 100, 5)
+    metrics = manager.getMetrics()
+    assert metrics['events']['onPositionOpened']['count'] == 100
+    assert metrics['queueDepth'] == [0, 0, 0, 0]
+    manager.close()
+
+
+def test_async_callback_not_block_caller():
+    """
+    测试耗时的回调函数不阻塞触发事件的线程
+    """
+    manager = AsyncCallbackManager()
+    finish = threading.Event()
+    manager.bind('onSlow', lambda order: finish.wait(5))
+    t0 = time.time()
+    manager.callback('onSlow', {'order': FakeModel(1)})
+    assert time.time() - t0 < 1
+    finish.set()
+    manager.close()
+
+
+def test_async_callback_overflow():
+    """
+    测试队列满时的处理方式
+    """
+    for overflow in ('dropoldest', 'raise'):
+        manager = AsyncCallbackManager(maxsize=2, overflow=overflow)
+        started = threading.Event()
+        finish = threading.Event()
+        result = []
+
+        def handler(order):
+            started.set()
+            finish.wait(5)
+            result.append(order.id)
+
+        manager.bind('onTest', handler)
+        manager.callback('onTest', {'order': FakeModel(0)})
+        assert started.wait(5)
+        manager.callback('onTest', {'order': FakeModel(1)})
+        manager.callback('onTest', {'order': FakeModel(2)})
+        if overflow == 'raise':
+            try:
+                manager.callback('onTest', {'order': FakeModel(3)})
+                assert False
+            except Queue.Full:
+                pass
+        else:
+            manager.callback('onTest', {'order': FakeModel(3)})
+            assert manager.getMetrics()['dropped'] == 1
+        finish.set()
+        manager.close()
+        if overflow == 'raise':
+            assert result == [0, 1, 2]
+        else:
+            assert result == [0, 2, 3]
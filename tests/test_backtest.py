@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from backtest import BacktestTrader, loadTicks, runBacktest, loadStrategy
+from tickstore import TickStore, TICK_COLUMNS
+from comhelper import datetime2ns
+from datetime import datetime, timedelta
+import numpy
+import tempfile
+import shutil
+import os
+
+
+def test_backtest_trader_fill():
+    """
+    测试回测交易接口的撮合规则与SimulateTrader一致
+    """
+    trader = BacktestTrader(matchOnSubmit=False)
+    # 买单限价大于等于bid时成交,成交价为bid和限价的中间价
+    order = trader.openPosition('IF1508', 'buy', openLimitPrice=3901, stopPrice=3890)
+    trader.onDataArrived('IF1508', 3903, 3902)
+    assert order.state == 'insert'
+    trader.onDataArrived('IF1508', 3901, 3900)
+    assert order.state == 'finish'
+    assert order.position.state == 'open'
+    assert order.position.openPrice == 3900.5
+    # 止损触发后平仓单在同一个报价成交,多头平仓使用ask撮合
+    trader.onDataArrived('IF1508', 3890, 3889)
+    assert order.position.state == 'close'
+    assert order.position.closePrice == 3890
+    assert trader.realizedPnl == 3890 - 3900.5
+    assert len(trader.trades) == 1
+
+
+def test_backtest_trader_basket():
+    """
+    测试批量开仓和批量平仓,所有报单提交后再撮合
+    """
+    trader = BacktestTrader()
+    trader.onDataArrived('IF1508', 3901, 3900)
+    trader.onDataArrived('IF1509', 3911, 3910)
+    orderList = trader.openPositions([('IF1508', 'buy'), {'instrumentId': 'IF1509', 'direction': 'sell'}])
+    assert [order.state for order in orderList] == ['finish', 'finish']
+    assert [order.position.openPrice for order in orderList] == [3900, 3911]
+    assert trader.getNetVolume() == 0
+
+    orderList = trader.closePositions([order.position.id for order in orderList])
+    assert [order.position.state for order in orderList] == ['close', 'close']
+    assert trader.realizedPnl == (3901 - 3900) + (3911 - 3910)
+    assert trader.closeAll() == []
+
+    futureList = trader.openPositionsAsync([('IF1508', 'buy'), ('IF1509', 'buy')])
+    assert [future.result(0).state for future in futureList] == ['finish', 'finish']
+
+
+def test_backtest_trader_async():
+    """
+    测试提交时立即撮合,异步开仓可以同步等待结果
+    """
+    trader = BacktestTrader(multiplier=300)
+    trader.onDataArrived('IF1508', 3901, 3900)
+    future = trader.openPositionAsync('IF1508', 'sell')
+    assert future.done()
+    position = future.result().position
+    assert position.openPrice == 3901
+    trader.onDataArrived('IF1508', 3899, 3898)
+    assert trader.getEquity() == (3901 - 3898.5) * 300
+    trader.closeAll()
+    assert position.state == 'close'
+    assert trader.realizedPnl == (3901 - 3898) * 300
+    assert trader.getPositionList(state='open') == []
+
+    # 未成交的挂单取消后future被取消
+    future = trader.openPositionAsync('IF1508', 'buy', openLimitPrice=3000)
+    assert not future.done()
+    order = trader.getOrderList(state='insert')[0]
+    trader.cancelOrder(order.id)
+    assert order.state == 'cancel'
+    assert order.position.state == 'cancel'
+    assert future.cancelled()
+
+
+def test_load_ticks_and_run():
+    """
+    测试从行情文件载入数据并运行策略
+    """
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        t0 = datetime(2015, 8, 3, 9, 15)
+        rows = 20
+        for offset, instrumentId in enumerate(('IF1508', 'IF1509')):
+            columns = dict((name, numpy.zeros(rows)) for name, _ in TICK_COLUMNS)
+            columns['timestamp'] = numpy.array(
+                [datetime2ns(t0 + timedelta(seconds=i * 2 + offset)) for i in range(rows)])
+            columns['BidPrice1'] = 3900. + numpy.arange(rows)
+            columns['AskPrice1'] = columns['BidPrice1'] + 1
+            store.save(instrumentId, '20150803', columns)
+
+        ticks = loadTicks(['IF1508', 'IF1509'], ['20150803'], store)
+        assert len(ticks['timestamp']) == rows * 2
+        assert (numpy.diff(ticks['timestamp']) > 0).all()
+        assert list(ticks['instrument'][:4]) == [0, 1, 0, 1]
+
+        strategyFile = os.path.join(root, 'strategy.py')
+        with open(strategyFile, 'w') as f:
+            f.write(
+                'count = 0\n'
+                'def onInit(config):\n'
+                '    global instrumentId\n'
+                '    instrumentId = config["instrumentId"]\n'
+                'def onDataArrived(data, trader):\n'
+                '    global count\n'
+                '    if data["instrumentID"] != instrumentId:\n'
+                '        return\n'
+                '    count += 1\n'
+                '    if count == 1:\n'
+                '        trader.openPosition(instrumentId, "buy")\n'
+                '    if count == 11:\n'
+                '        trader.closeAll()\n'
+            )
+        result = runBacktest(strategyFile, {'instrumentId': 'IF1509'}, ['IF1508', 'IF1509'], ticks)
+        summary = result.getSummary()
+        assert summary['tradeCount'] == 1
+        assert summary['winRate'] == 1
+        # 多头开仓使用bid撮合,平仓使用ask撮合
+        assert result.trades[0]['openPrice'] == 3900
+        assert result.trades[0]['closePrice'] == 3911
+        assert summary['pnl'] == 11
+        assert len(result.equity) == rows * 2
+        assert summary['maxDrawdown'] == 0
+
+        # 每次载入的策略模块互不影响
+        assert loadStrategy(strategyFile).count == 0
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from bar import BarBuilder, BarAggregator, parsePeriod
+from comhelper import datetime2ns
+from datetime import datetime, timedelta
+
+T0 = datetime(2015, 8, 3, 9, 15)
+
+
+def ns(seconds):
+    return datetime2ns(T0 + timedelta(seconds=seconds))
+
+
+def test_parse_period():
+    """
+    测试解析棒线周期
+    """
+    assert parsePeriod('1s') == ('time', 1000000000)
+    assert parsePeriod('5m') == ('time', 300 * 1000000000)
+    assert parsePeriod('v100') == ('volume', 100)
+    for period in ('', '1x', 'v', '0s', 'm'):
+        try:
+            parsePeriod(period)
+            assert False
+        except Exception as e:
+            assert u'无效的棒线周期' in unicode(e)
+
+
+def test_time_bar():
+    """
+    测试时间棒线在下一个周期的第一条行情到达时完成
+    """
+    builder = BarBuilder('IF1508', '1m')
+    assert builder.update(ns(1), 3900, 1) is None
+    assert builder.update(ns(20), 3905, 2) is None
+    assert builder.update(ns(40), 3898, 3) is None
+    assert builder.update(ns(59.5), 3901, 4) is None
+    bar = builder.update(ns(61), 3902, 5)
+    assert bar.beginTime == ns(0)
+    assert bar.endTime == ns(60)
+    assert (bar.open, bar.high, bar.low, bar.close, bar.volume) == (3900, 3905, 3898, 3901, 10)
+    # 跳过没有行情的周期
+    bar = builder.update(ns(200), 3903, 1)
+    assert bar.beginTime == ns(60)
+    assert (bar.open, bar.close, bar.volume) == (3902, 3902, 5)
+    bar = builder.flush()
+    assert bar.beginTime == ns(180)
+    assert builder.flush() is None
+
+
+def test_volume_bar():
+    """
+    测试成交量棒线在累计成交量达到设定值时完成
+    """
+    builder = BarBuilder('IF1508', 'v10')
+    assert builder.update(ns(1), 3900, 4) is None
+    assert builder.update(ns(2), 3899, 4) is None
+    bar = builder.update(ns(3), 3901, 4)
+    assert (bar.beginTime, bar.endTime) == (ns(1), ns(3))
+    assert (bar.open, bar.high, bar.low, bar.close, bar.volume) == (3900, 3901, 3899, 3901, 12)
+    assert builder.bar is None
+
+
+def test_aggregator():
+    """
+    测试按累计成交量的差值生成多个品种多个周期的棒线
+    """
+    aggregator = BarAggregator(['1s', 'v5'])
+    assert aggregator.update('IF1508', ns(0), 3900, 1000) == []
+    # 没有成交价的行情不计入棒线
+    assert aggregator.update('IF1509', ns(0), 0, 0) == []
+    assert aggregator.update('IF1508', ns(0.5), 3901, 1003) == []
+    barList = aggregator.update('IF1508', ns(1.2), 3902, 1006)
+    assert [bar.period for bar in barList] == ['1s', 'v5']
+    assert barList[0].volume == 3
+    assert barList[1].volume == 6
+    # 累计成交量变小时按新的交易日处理
+    barList = aggregator.update('IF1508', ns(2.1), 3903, 2)
+    assert [(bar.period, bar.volume) for bar in barList] == [('1s', 3)]
+    barList = aggregator.flush()
+    assert [(bar.period, bar.volume) for bar in barList] == [('1s', 2), ('v5', 2)]
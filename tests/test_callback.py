@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from callback import CallbackManager
+import threading
+import time
+
+
+def test_bind_unbind_callback():
+    """
+    测试回调函数的绑定,调用和解除绑定
+    """
+    manager = CallbackManager()
+    result = []
+    bindId1 = manager.bind('onTest', lambda value: result.append(('a', value)))
+    bindId2 = manager.bind('onTest', lambda value: result.append(('b', value)))
+    manager.callback('onTest', {'value': 1})
+    assert result == [('a', 1), ('b', 1)]
+
+    assert manager.unbind(bindId1)
+    assert not manager.unbind(bindId1)
+    manager.callback('onTest', {'value': 2})
+    assert result[2:] == [('b', 2)]
+
+    assert manager.unbind(bindId2)
+    manager.callback('onTest', {'value': 3})
+    manager.callback('onOther', {'value': 3})
+    assert len(result) == 3
+
+
+def test_unbind_during_callback():
+    """
+    测试在回调函数中解除绑定,本次调用仍使用调用开始时的回调链
+    """
+    manager = CallbackManager()
+    result = []
+    bindIdList = []
+
+    def first():
+        result.append('first')
+        manager.unbind(bindIdList[1])
+
+    bindIdList.append(manager.bind('onTest', first))
+    bindIdList.append(manager.bind('onTest', lambda: result.append('second')))
+    manager.callback('onTest', {})
+    assert result == ['first', 'second']
+    manager.callback('onTest', {})
+    assert result == ['first', 'second', 'first']
+
+
+def test_slow_callback_not_block_bind():
+    """
+    测试耗时的回调函数不阻塞其他线程绑定回调函数
+    """
+    manager = CallbackManager()
+    started = threading.Event()
+    finish = threading.Event()
+
+    def slow():
+        started.set()
+        finish.wait(5)
+
+    manager.bind('onSlow', slow)
+    thread = threading.Thread(target=manager.callback, args=('onSlow', {}))
+    thread.start()
+    assert started.wait(5)
+    t0 = time.time()
+    bindId = manager.bind('onSlow', lambda: None)
+    assert manager.unbind(bindId)
+    assert time.time() - t0 < 1
+    finish.set()
+    thread.join()
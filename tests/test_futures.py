@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from futures import Future, RequestManager, gather
+import threading
+import time
+
+
+def test_future_wake_up_on_result():
+    """
+    测试结果到达时等待的线程立即被唤醒
+    """
+    future = Future()
+    threading.Timer(.05, future.setResult, args=(1,)).start()
+    t0 = time.time()
+    assert future.result(5) == 1
+    assert time.time() - t0 < 1
+    assert future.done()
+    assert not future.setResult(2)
+    assert future.result() == 1
+
+
+def test_future_timeout_and_cancel():
+    """
+    测试等待超时和取消
+    """
+    future = Future()
+    try:
+        future.result(.01)
+        assert False
+    except Exception as e:
+        assert e.message == u'等待超时'
+    assert future.cancel()
+    assert future.cancelled()
+    try:
+        future.result()
+        assert False
+    except Exception as e:
+        assert e.message == u'操作已取消'
+
+
+def test_gather():
+    """
+    测试等待多个操作
+    """
+    futureList = [Future() for i in range(3)]
+    for i, future in enumerate(futureList):
+        threading.Timer(.01 * (3 - i), future.setResult, args=(i,)).start()
+    assert gather(futureList, 5) == [0, 1, 2]
+
+    futureList = [Future(), Future()]
+    futureList[0].setResult(0)
+    futureList[1].setException(Exception('failed'))
+    try:
+        gather(futureList)
+        assert False
+    except Exception as e:
+        assert e.message == 'failed'
+
+
+def test_request_manager():
+    """
+    测试按请求类型先进先出关联请求和响应
+    """
+    requestManager = RequestManager()
+    requestId1, future1 = requestManager.newRequest('QryA')
+    requestId2, future2 = requestManager.newRequest('QryB')
+    requestId3, future3 = requestManager.newRequest('QryB')
+    assert len(set([requestId1, requestId2, requestId3])) == 3
+    assert len(requestManager) == 3
+
+    # 多条响应
+    assert requestManager.onResponse('QryB', 'a', False)
+    assert requestManager.onResponse('QryB', 'b', True)
+    assert future2.result(0) == ['a', 'b']
+    assert not future1.done()
+    assert not future3.done()
+
+    # 出错的响应
+    requestManager.onResponse('QryA', None, True, Exception('error'))
+    assert future1.exception(0).message == 'error'
+    assert not requestManager.onResponse('QryA', 'x')
+
+    # 取消的请求仍然接收之后到达的响应,下一个同类型的请求不会收到
+    assert requestManager.cancel(requestId3)
+    requestId4, future4 = requestManager.newRequest('QryB')
+    assert not requestManager.onResponse('QryB', 'c')
+    assert requestManager.onResponse('QryB', 'd')
+    assert future4.result(0) == ['d']
+    assert len(requestManager) == 0
+
+    # 没有发送出去的请求直接移除
+    requestId5, future5 = requestManager.newRequest('QryB')
+    requestManager.discard(requestId5)
+    assert future5.cancelled()
+    assert len(requestManager) == 0
+
+
+class FakeCtp(object):
+    """
+    响应不带RequestID的CTP接口,在另一个线程中按请求顺序调用响应回调函数
+    """
+
+    def __init__(self):
+        self.callback = None
+        self.delay = 0
+
+    def bind(self, callbackName, funcToCall):
+        self.callback = funcToCall
+
+    def ReqSettlementInfoConfirm(self, data):
+        kwargs = {'Data': data, 'IsLast': True, 'RspInfo': {'ErrorID': 0, 'ErrorMsg': ''}}
+        self.delay += .01
+        threading.Timer(self.delay, self.callback, kwargs=kwargs).start()
+
+
+def test_concurrent_requests_without_request_id():
+    """
+    测试多个未完成的请求在响应不带RequestID时按顺序收到各自的响应
+    """
+    requestManager = RequestManager()
+    ctp = FakeCtp()
+    ctp.bind('OnRspSettlementInfoConfirm', lambda **kwargs: requestManager.onResponse(
+        'SettlementInfoConfirm', kwargs.get('Data'), kwargs.get('IsLast', True)))
+    futureList = []
+    for data in ('confirm1', 'confirm2', 'confirm3'):
+        requestId, future = requestManager.newRequest('SettlementInfoConfirm')
+        ctp.ReqSettlementInfoConfirm(data)
+        futureList.append(future)
+    assert gather(futureList, 1) == [['confirm1'], ['confirm2'], ['confirm3']]
+    assert len(requestManager) == 0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from host import shardExecuters
+import json
+
+
+class FakeExecuter(object):
+    """
+    只包含分配时用到的字段的策略执行器
+    """
+
+    def __init__(self, id, dataGenerator_id, instrumentIdList):
+        self.id = id
+        self.dataGenerator_id = dataGenerator_id
+        self.instrumentIdList = json.dumps(instrumentIdList)
+
+
+def test_shard_executers_keep_same_subscription_together():
+    """
+    测试订阅相同的执行器分配到同一个工作进程
+    """
+    executerList = [
+        FakeExecuter(1, 1, ['IF1508', 'IF1509']),
+        FakeExecuter(2, 1, ['IF1509', 'IF1508']),
+        FakeExecuter(3, 1, ['IF1508']),
+        FakeExecuter(4, 2, ['IF1508']),
+        FakeExecuter(5, 1, ['IF1508', 'IF1509']),
+    ]
+    shards = shardExecuters(executerList, 4)
+    assert len(shards) == 3
+    assert sorted(sum(shards, [])) == [1, 2, 3, 4, 5]
+    assert [1, 2, 5] in shards
+
+
+def test_shard_executers_balance():
+    """
+    测试执行器平均分配到工作进程
+    """
+    executerList = [FakeExecuter(i, 1, ['IF%d' % i]) for i in range(10)]
+    shards = shardExecuters(executerList, 4)
+    assert len(shards) == 4
+    assert sorted(len(shard) for shard in shards) == [2, 2, 3, 3]
+    assert shardExecuters([], 4) == []
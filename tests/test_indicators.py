@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from strategies.indicators import RingBuffer, RollingStats, EMA, RollingMax, RollingMin, SpreadTracker
+from collections import deque
+from pandas import Series
+import random
+
+
+def test_ring_buffer():
+    """
+    测试环形缓冲区
+    """
+    buffer = RingBuffer(3)
+    assert buffer.append(1) is None
+    assert buffer.append(2) is None
+    assert not buffer.full()
+    assert buffer.append(3) is None
+    assert buffer.full()
+    assert buffer.append(4) == 1
+    assert list(buffer) == [2, 3, 4]
+    assert buffer[0] == 2
+    assert buffer[-1] == 4
+
+
+def test_rolling_stats_match_pandas():
+    """
+    测试滑动窗口统计与pandas计算结果一致
+    """
+    random.seed(0)
+    stats = RollingStats(50)
+    values = deque(maxlen=50)
+    for i in range(1000):
+        value = random.gauss(3900, 20)
+        stats.append(value)
+        values.append(value)
+        s = Series(values)
+        assert abs(stats.mean() - s.mean()) < 1e-8
+        if len(values) > 1:
+            assert abs(stats.std() - s.std()) < 1e-6
+            assert abs(stats.zscore(value) - (value - s.mean()) / s.std()) < 1e-6
+
+
+def test_rolling_min_max():
+    """
+    测试滑动窗口最大值和最小值
+    """
+    random.seed(0)
+    rollingMax = RollingMax(10)
+    rollingMin = RollingMin(10)
+    values = deque(maxlen=10)
+    for i in range(500):
+        value = random.randint(0, 100)
+        values.append(value)
+        assert rollingMax.append(value) == max(values)
+        assert rollingMin.append(value) == min(values)
+
+
+def test_ema():
+    """
+    测试指数移动平均
+    """
+    ema = EMA(span=3)
+    assert ema.append(10) == 10
+    assert ema.append(20) == 15
+    assert ema.append(20) == 17.5
+
+
+def test_spread_tracker():
+    """
+    测试价差跟踪
+    """
+    tracker = SpreadTracker('IF1508', 'IF1509', 10)
+    assert tracker.update('IF1508', 100) is None
+    assert tracker.update('IF1510', 100) is None
+    assert tracker.update('IF1509', 105) == 5
+    assert tracker.update('IF1508', 101) == 4
+    assert tracker.deviation() == -.5
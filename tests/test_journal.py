@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from journal import WriteBehindJournal
+from trader import Trader
+from comhelper import getDefaultInstrumentId
+from database.models import ModelTest, ModelOrder, ModelPosition
+
+
+def test_journal_write_and_flush():
+    """
+    测试写入日志可以批量写入数据,并且只写入最后一次修改
+    """
+    journal = WriteBehindJournal(batchSize=10)
+    try:
+        rows = []
+        for i in range(25):
+            row = ModelTest(a=0)
+            row.save()
+            rows.append(row)
+        for i, row in enumerate(rows):
+            row.a = i
+            journal.put(row)
+            row.a = i + 100
+            journal.put(row)
+        journal.flush()
+        for i, row in enumerate(rows):
+            assert ModelTest.objects.get(id=row.id).a == i + 100
+    finally:
+        journal.close()
+
+
+def test_journal_close_flush_pending():
+    """
+    测试关闭写入日志时会写入所有已登记的数据
+    """
+    journal = WriteBehindJournal(flushInterval=10)
+    row = ModelTest(a=0)
+    row.save()
+    row.a = 1
+    journal.put(row)
+    journal.close()
+    assert ModelTest.objects.get(id=row.id).a == 1
+
+    # 关闭后不能再登记数据
+    try:
+        journal.put(row)
+    except Exception:
+        pass
+    else:
+        assert False
+
+
+def test_journal_keep_failed_rows():
+    """
+    测试写入失败的数据不会丢弃,flush时抛出异常,登记新的数据后可以写入
+    """
+    journal = WriteBehindJournal()
+    try:
+        good = ModelTest(a=0)
+        good.save()
+        bad = ModelTest(a=0)
+        bad.save()
+        good.a = 1
+        journal.put(good)
+        bad.a = 'x'
+        journal.put(bad)
+        try:
+            journal.flush()
+        except Exception as e:
+            assert u'1条数据未能写入' in unicode(e)
+        else:
+            assert False
+        # 其他数据不受影响
+        assert ModelTest.objects.get(id=good.id).a == 1
+        assert ModelTest.objects.get(id=bad.id).a == 0
+
+        bad.a = 2
+        journal.put(bad)
+        journal.flush()
+        assert ModelTest.objects.get(id=bad.id).a == 2
+    finally:
+        journal.close()
+
+
+def test_trader_with_journal():
+    """
+    测试使用写入日志的Trader
+    """
+    journal = WriteBehindJournal()
+    try:
+        trader = Trader(journal=journal)
+        order = trader.openPosition(getDefaultInstrumentId(), 'buy', 1)
+        position = order.position
+        trader.onPositionOpened(order, position)
+        assert position.state == 'open'
+
+        # 从数据库读取前会等待日志写入完成
+        assert position.id in [p.id for p in trader.getPositionList(state='open')]
+        closeOrder = trader.closePosition(position.id)
+        trader.onPositionClosed(closeOrder, closeOrder.position)
+        trader.flush()
+        assert ModelOrder.objects.get(id=closeOrder.id).state == 'finish'
+        assert ModelPosition.objects.get(id=position.id).state == 'close'
+    finally:
+        journal.close()
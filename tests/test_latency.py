@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from latency import LatencyHistogram, LatencyRecorder, monotonicNs
+import random
+
+
+class FakeOrder(object):
+    pass
+
+
+def test_monotonic_clock():
+    """
+    测试单调时钟
+    """
+    t0 = monotonicNs()
+    t1 = monotonicNs()
+    assert 0 <= t1 - t0 < 1000000000
+
+
+def test_histogram_percentile():
+    """
+    测试直方图的百分位数误差
+    """
+    random.seed(0)
+    values = [int(random.expovariate(1 / 50000.)) for i in range(10000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for p in (50, 99, 99.9):
+        exact = values[int(round(len(values) * p / 100)) - 1]
+        assert abs(histogram.percentile(p) - exact) <= exact / 64 + 1
+    assert histogram.max == values[-1]
+    assert histogram.min == values[0]
+    assert histogram.percentile(100) == values[-1]
+
+
+def test_histogram_small_values_exact():
+    """
+    测试较小的值没有误差
+    """
+    histogram = LatencyHistogram()
+    for value in range(100):
+        histogram.record(value)
+    assert histogram.percentile(50) == 49
+    assert histogram.percentile(1) == 0
+
+
+def test_recorder_merge_and_order():
+    """
+    测试记录器的合并和报单延迟
+    """
+    recorder1 = LatencyRecorder()
+    recorder2 = LatencyRecorder()
+    recorder1.record('strategy', 100, 200)
+    recorder1.record('strategy', 0, 200)
+    recorder2.record('strategy', 100, 400)
+    merged = LatencyRecorder()
+    merged.merge(recorder1.toDict())
+    merged.merge(recorder2.toDict())
+    histogram = merged.histograms['strategy']
+    assert histogram.count == 2
+    assert histogram.max == 300
+    assert 'strategy' in merged.report()
+
+    now = monotonicNs()
+    order = FakeOrder()
+    recorder1.recordOrder(order)
+    assert not hasattr(order, 'tickStamps')
+    recorder1.setCurrentTick({'recvTime': now - 1000, 'sendTime': now - 500, 'arriveTime': now - 100})
+    recorder1.recordOrder(order)
+    recorder1.setCurrentTick(None)
+    assert order.tickStamps['recvTime'] == now - 1000
+    assert recorder1.histograms['tickToTrade'].min >= 1000
+    assert recorder1.histograms['order'].count == 1
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from orderbook import OrderBook, PriceQueue
+from database.models import ModelOrder, ModelPosition
+
+
+def test_price_queue_pop_crossed():
+    """
+    测试价格队列按价格优先时间优先取出可成交元素
+    """
+    queue = PriceQueue(descending=True)
+    queue.push(1, 100, 'a')
+    queue.push(2, 110, 'b')
+    queue.push(3, 100, 'c')
+    queue.push(4, 90, 'd')
+    assert len(queue) == 4
+    assert queue.popCrossed(120) == []
+    assert queue.popCrossed(100) == ['b', 'a', 'c']
+    assert len(queue) == 1
+    assert queue.remove(4) == 'd'
+    assert queue.remove(4) is None
+    assert len(queue) == 0
+
+
+def test_order_book_match_orders():
+    """
+    测试报单簿只撮合可以成交的挂单
+    """
+    book = OrderBook()
+    buy = ModelOrder(id=1, instrumentId='IF1', action='open', direction='buy', volume=1, openLimitPrice=100)
+    sell = ModelOrder(id=2, instrumentId='IF1', action='open', direction='sell', volume=1, openLimitPrice=0)
+    book.addOrder(buy)
+    book.addOrder(sell)
+
+    # 其他品种的报价不影响挂单
+    assert book.matchOrders('IF2', 'open', 90, 95) == []
+
+    result = book.matchOrders('IF1', 'open', ask=90, bid=105)
+    assert result == [(sell, 90)]
+    assert book.hasOrder(1)
+    assert not book.hasOrder(2)
+
+    result = book.matchOrders('IF1', 'open', ask=90, bid=98)
+    assert result == [(buy, (98 + 100) / 2)]
+    assert book.removeOrder(1) is None
+
+
+def test_order_book_match_triggers():
+    """
+    测试头寸止损止盈的触发
+    """
+    book = OrderBook()
+    position = ModelPosition(id=1, instrumentId='IF1', direction='buy', volume=1, stopPrice=90, profitPrice=110)
+    book.addPosition(position)
+
+    assert book.matchTriggers('IF1', 'stop', ask=100, bid=99) == []
+    assert book.matchTriggers('IF1', 'profit', ask=100, bid=99) == []
+
+    # 修改止损后按新的价格触发
+    position.stopPrice = 95
+    book.updatePosition(position)
+    assert book.matchTriggers('IF1', 'stop', ask=95, bid=94) == [position]
+    assert not book.hasPosition(1)
+    # 触发后止盈也不再检查
+    assert book.matchTriggers('IF1', 'profit', ask=120, bid=119) == []
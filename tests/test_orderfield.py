@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from orderfield import InputOrderFieldPool, INPUT_ORDER_CONSTANTS
+import threading
+
+
+class Field(object):
+    """
+    报单数据,与pyctp.struct.CThostFtdcInputOrderField一样可以设置任意字段
+    """
+    pass
+
+
+class Record(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def test_acquire_field():
+    """
+    测试报单数据的常量字段和可变字段
+    """
+    pool = InputOrderFieldPool(Field, '9999', '000001')
+    field = pool.acquire(Record(id=12, instrumentId='IF1508', action='open', direction='sell', volume=3))
+    assert field.BrokerID == '9999'
+    assert field.InvestorID == field.UserID == '000001'
+    assert field.InstrumentID == 'IF1508'
+    assert field.OrderRef == '000000000012'
+    assert field.CombOffsetFlag == '0'
+    assert field.Direction == '1'
+    assert field.VolumeTotalOriginal == field.MinVolume == 3
+    for name, value in INPUT_ORDER_CONSTANTS:
+        assert getattr(field, name) == value
+
+    # 平仓时买卖方向与头寸方向相反
+    field = pool.acquire(Record(id=13, instrumentId='IF1508', action='close', direction='sell', volume=1))
+    assert field.CombOffsetFlag == '1'
+    assert field.Direction == '0'
+
+    try:
+        pool.acquire(Record(id=14, instrumentId='IF1508', action='cancel', direction='sell', volume=1))
+        assert False
+    except Exception:
+        pass
+
+
+def test_reuse_field():
+    """
+    测试报单数据放回池中后重复使用
+    """
+    pool = InputOrderFieldPool(Field, '9999', '000001')
+    order0 = Record(id=1, instrumentId='IF1508', action='open', direction='buy', volume=1)
+    order1 = Record(id=2, instrumentId='IF1508', action='open', direction='sell', volume=2)
+
+    # 同时使用的报单数据各不相同
+    field0 = pool.acquire(order0)
+    field1 = pool.acquire(order1)
+    assert field0 is not field1
+    assert field0.OrderRef == '000000000001'
+    pool.release(field0)
+    pool.release(field1)
+
+    field = pool.acquire(order0)
+    assert field is field1
+    assert field.OrderRef == '000000000001'
+    assert field.Direction == '0'
+    assert field.VolumeTotalOriginal == 1
+    pool.release(field)
+
+    # 不同品种和开平使用不同的模板
+    assert pool.acquire(Record(id=3, instrumentId='IF1509', action='open', direction='buy', volume=1)) \
+        not in (field0, field1)
+    assert pool.acquire(Record(id=4, instrumentId='IF1508', action='close', direction='buy', volume=1)) \
+        not in (field0, field1)
+
+    # 每个线程使用各自的池
+    result = []
+    thread = threading.Thread(target=lambda: result.append(pool.acquire(order0)))
+    thread.start()
+    thread.join()
+    assert result[0] not in (field0, field1)
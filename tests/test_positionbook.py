@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from positionbook import PositionBook
+
+
+class Position(object):
+
+    def __init__(self, id, instrumentId, direction, volume, state='open'):
+        self.id = id
+        self.instrumentId = instrumentId
+        self.direction = direction
+        self.volume = volume
+        self.state = state
+
+
+def test_position_volume():
+    """
+    测试按品种和全部品种查询多头,空头和净头寸数量
+    """
+    book = PositionBook()
+    book.add(Position(1, 'IF1508', 'buy', 2))
+    book.add(Position(2, 'IF1508', 'sell', 1))
+    book.add(Position(3, 'IF1509', 'sell', 3))
+    assert len(book) == 3
+    assert book.getLongVolume('IF1508') == 2
+    assert book.getShortVolume('IF1508') == 1
+    assert book.getNetVolume('IF1508') == 1
+    assert book.getNetVolume('IF1509') == -3
+    assert book.getNetVolume('IF1510') == 0
+    assert book.getNetVolume() == -2
+    assert [p.id for p in book.getPositionList('IF1508')] == [1, 2]
+    assert [p.id for p in book.getPositionList(direction='sell')] == [2, 3]
+
+    # 重复加入按新的数据计算
+    book.add(Position(1, 'IF1508', 'buy', 1))
+    assert book.getLongVolume() == 1
+    # 更新只对头寸簿中的头寸有效
+    book.update(Position(2, 'IF1508', 'sell', 1, 'preclose'))
+    assert book.get(2).state == 'preclose'
+    book.update(Position(4, 'IF1508', 'sell', 1))
+    assert 4 not in book
+
+    assert book.remove(3).id == 3
+    assert book.remove(3) is None
+    assert book.getShortVolume() == 1
+
+    book.reset([Position(5, 'IF1509', 'buy', 1)])
+    assert len(book) == 1
+    assert book.getNetVolume() == 1
+    assert book.getNetVolume('IF1508') == 0
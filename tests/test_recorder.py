@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from recorder import BulkRecorder
+from database.models import ModelTest
+import time
+
+
+def test_bulk_recorder_flush_by_size():
+    """
+    测试缓存数量达到上限时批量写入
+    """
+    count = ModelTest.objects.count()
+    recorder = BulkRecorder(ModelTest, batchSize=10, flushInterval=3600, fastWrite=False)
+    for i in range(25):
+        recorder.append(ModelTest(a=i))
+    assert ModelTest.objects.count() - count == 20
+    assert len(recorder) == 5
+    assert recorder.flushCount == 2
+
+    # 关闭时写入剩余数据
+    recorder.close()
+    assert ModelTest.objects.count() - count == 25
+    assert len(recorder) == 0
+    assert recorder.rowCount == 25
+    assert recorder.getRate() > 0
+
+
+def test_bulk_recorder_flush_by_time():
+    """
+    测试超过时间间隔时写入
+    """
+    count = ModelTest.objects.count()
+    recorder = BulkRecorder(ModelTest, batchSize=1000, flushInterval=0, fastWrite=False)
+    recorder.append(ModelTest(a=1))
+    assert ModelTest.objects.count() - count == 1
+
+
+def test_bulk_recorder_auto_flush():
+    """
+    测试没有新数据时后台线程按时间间隔写入缓存的数据
+    """
+    count = ModelTest.objects.count()
+    recorder = BulkRecorder(ModelTest, batchSize=1000, flushInterval=.1, fastWrite=False, autoFlush=True)
+    recorder.append(ModelTest(a=1))
+    recorder.append(ModelTest(a=2))
+    deadline = time.time() + 2
+    while len(recorder) > 0 and time.time() < deadline:
+        time.sleep(.05)
+    assert len(recorder) == 0
+    assert ModelTest.objects.count() - count == 2
+    recorder.close()
+    assert recorder.rowCount == 2
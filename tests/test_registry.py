@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from registry import OrderRegistry, OrderFill
+from comhelper import orderId2Ref
+from database.models import ModelOrder, ModelPosition
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import json
+
+# 测试创建的头寸,测试结束后删除,避免影响其他测试用例
+positionList = []
+
+
+def teardown():
+    """
+    删除测试创建的头寸和报单
+    """
+    positionIdList = [position.id for position in positionList]
+    ModelOrder.objects.filter(position__in=positionIdList).delete()
+    ModelPosition.objects.filter(id__in=positionIdList).delete()
+    del positionList[:]
+
+
+def createOrder(state='insert'):
+    """
+    创建一个测试用的报单
+    """
+    data = {'traderClass': 'CTPTrader', 'instrumentId': 'IF1508', 'direction': 'buy', 'volume': 1}
+    position = ModelPosition(state='preopen', **data)
+    position.save()
+    positionList.append(position)
+    order = ModelOrder(position=position, action='open', state=state, **data)
+    order.save()
+    return order
+
+
+def test_get_registered_order_without_query():
+    """
+    测试登记过的报单查找时不查询数据库
+    """
+    registry = OrderRegistry()
+    order = createOrder()
+    registry.register(order)
+    data = {'OrderRef': orderId2Ref(order.id), 'FrontID': 1, 'SessionID': 100}
+    with CaptureQueriesContext(connection) as queries:
+        assert registry.get(data) is order
+        assert registry.get(data) is order
+        assert registry.get({'OrderRef': orderId2Ref(order.id)}) is order
+        assert registry.get(data).position.id == order.position.id
+    assert len(queries) == 0
+    assert registry.hitCount == 4
+
+    registry.remove(order)
+    assert len(registry) == 0
+    assert registry.get(data).id == order.id
+    assert registry.missCount == 1
+
+
+def test_get_order_after_restart():
+    """
+    测试索引中没有的报单从数据库读取并登记
+    """
+    registry = OrderRegistry()
+    order = createOrder()
+    data = {'OrderRef': orderId2Ref(order.id), 'FrontID': 1, 'SessionID': 100}
+    with CaptureQueriesContext(connection) as queries:
+        result = registry.get(data)
+        assert result.position.id == order.position.id
+    assert len(queries) == 1
+    assert registry.get(data) is result
+    assert len(registry) == 1
+
+    # 已完成的报单不登记
+    order = createOrder(state='finish')
+    registry.get({'OrderRef': orderId2Ref(order.id)})
+    assert len(registry) == 1
+
+
+def test_order_fill():
+    """
+    测试成交汇总
+    """
+    fill = OrderFill(5)
+    assert fill.averagePrice() is None
+    assert fill.add('1', 100, 2)
+    assert not fill.add('1', 100, 2)
+    assert fill.add('2', 103, 3)
+    assert fill.tradeVolume == 5
+    assert fill.averagePrice() == (100 * 2 + 103 * 3) / 5
+    assert fill.remainingVolume() == 0
+    assert fill.isFilled()
+
+    # 从已保存的成交数量恢复
+    fill = OrderFill(5, 2, 100)
+    assert fill.remainingVolume() == 3
+    fill.add('3', 110, 3)
+    assert fill.averagePrice() == 106
+    assert fill.isFilled()
+
+    # 报单结束时只成交了部分数量
+    fill = OrderFill(5)
+    fill.add('4', 100, 1)
+    assert not fill.isFilled()
+    fill.targetVolume = 1
+    assert fill.isFilled()
+
+
+def test_registry_fill_from_saved_order():
+    """
+    测试按报单已保存的成交数量创建成交汇总
+    """
+    registry = OrderRegistry()
+    order = createOrder()
+    order.volume = 3
+    order.tradeVolume = 1
+    order.openPrice = 100
+    fill = registry.getFill(order)
+    assert fill.remainingVolume() == 2
+    assert registry.getFill(order) is fill
+    registry.remove(order)
+    assert registry.getFill(order) is not fill
+
+
+def test_registry_fill_ignore_replayed_trades():
+    """
+    测试重启后按已保存的成交编号忽略CTP重新推送的成交
+    """
+    registry = OrderRegistry()
+    order = createOrder()
+    order.volume = 3
+    fill = registry.getFill(order)
+    assert fill.add('  1001', 100, 1)
+    order.tradeVolume = fill.tradeVolume
+    order.openPrice = fill.averagePrice()
+    order.tradeIdList = json.dumps(fill.getTradeIdList())
+    order.save()
+
+    # 重启后从数据库读取报单
+    registry = OrderRegistry()
+    order = registry.get({'OrderRef': orderId2Ref(order.id)})
+    fill = registry.getFill(order)
+    assert not fill.add('  1001', 100, 1)
+    assert fill.tradeVolume == 1
+    assert fill.add('  1002', 103, 2)
+    assert fill.isFilled()
+    assert fill.averagePrice() == (100 + 103 * 2) / 3
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from __future__ import division
+from replay import ScaledClock, StepClock, MaxSpeedClock, iterateQuerySet
+from database.models import ModelTest
+from datetime import datetime, timedelta
+from threading import Thread
+import time
+
+
+def test_scaled_clock():
+    """
+    测试按记录时间倍速回放
+    """
+    clock = ScaledClock(speed=10)
+    t0 = datetime(2015, 8, 1, 9, 15)
+    wallTime0 = time.time()
+    for i in range(5):
+        assert clock.wait(t0 + timedelta(seconds=i * .5))
+    elapsed = time.time() - wallTime0
+    # 记录时间共2秒,10倍速回放约0.2秒
+    assert .18 <= elapsed < 1
+
+
+def test_max_speed_clock():
+    """
+    测试最快速度回放不做等待
+    """
+    clock = MaxSpeedClock()
+    t0 = datetime(2015, 8, 1, 9, 15)
+    wallTime0 = time.time()
+    for i in range(1000):
+        assert clock.wait(t0 + timedelta(seconds=i))
+    assert time.time() - wallTime0 < .5
+
+
+def test_step_clock():
+    """
+    测试单步回放
+    """
+    clock = StepClock()
+    sent = []
+
+    def replay():
+        for i in range(10):
+            if not clock.wait(None):
+                break
+            sent.append(i)
+
+    thread = Thread(target=replay)
+    thread.start()
+    time.sleep(.1)
+    assert sent == []
+    clock.step(3)
+    time.sleep(.1)
+    assert sent == [0, 1, 2]
+    clock.close()
+    thread.join()
+    assert sent == [0, 1, 2]
+
+
+def test_iterate_query_set():
+    """
+    测试按id分段读取查询结果
+    """
+    for i in range(25):
+        ModelTest(a=-1).save()
+    querySet = ModelTest.objects.filter(a=-1)
+    rows = list(iterateQuerySet(querySet, ['a'], chunkSize=10))
+    assert len(rows) == querySet.count()
+    assert rows[0] == {'a': -1}
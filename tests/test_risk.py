@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from risk import RiskGate, TokenBucket
+import error
+
+
+class Record(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def assertRejected(func, errorInfo):
+    try:
+        func()
+        assert False
+    except Exception as e:
+        assert unicode(e).startswith(u'%d:%s' % tuple(errorInfo))
+
+
+def test_token_bucket():
+    """
+    测试令牌桶
+    """
+    bucket = TokenBucket(2, 3)
+    now = 10 ** 12
+    assert bucket.consume(now=now)
+    assert bucket.consume(now=now)
+    assert bucket.consume(now=now)
+    assert not bucket.consume(now=now)
+    # 0.5秒增加1个令牌
+    assert bucket.consume(now=now + 5 * 10 ** 8)
+    assert not bucket.consume(now=now + 5 * 10 ** 8)
+    # 最多积累burst个
+    now += 100 * 10 ** 9
+    for i in range(3):
+        assert bucket.consume(now=now)
+    assert not bucket.consume(now=now)
+
+
+def test_position_limit():
+    """
+    测试头寸上限包括已打开和未成交的数量
+    """
+    gate = RiskGate(maxBuyVolume=3, maxSellVolume=1)
+    assert gate.checkOpen('IF1508', 'buy', 2) == 2
+    assert gate.getPendingVolume('IF1508', 'buy') == 2
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 2), error.RiskPositionLimit)
+    assert gate.rejectCount == 1
+    # 各品种分别计算
+    assert gate.checkOpen('IF1509', 'buy', 3) == 3
+    assert gate.checkOpen('IF1508', 'sell', 1) == 1
+
+    # 成交后转为已打开数量,撤单后释放
+    order = Record(instrumentId='IF1508', direction='buy', volume=2)
+    gate.onOpened(order, order)
+    assert gate.getOpenVolume('IF1508', 'buy') == 2
+    assert gate.getPendingVolume('IF1508', 'buy') == 0
+    assert gate.checkOpen('IF1508', 'buy', 1) == 1
+    gate.onOpenFailed(Record(instrumentId='IF1508', direction='buy', volume=1))
+    assert gate.getPendingVolume('IF1508', 'buy') == 0
+    gate.onClosed(order)
+    assert gate.getOpenVolume('IF1508', 'buy') == 0
+
+    # 启动时按头寸和未成交报单重新计算
+    gate.reset([order], [Record(instrumentId='IF1508', direction='buy', volume=1)])
+    assert gate.getOpenVolume('IF1508', 'buy') == 2
+    assert gate.getPendingVolume('IF1508', 'buy') == 1
+    assert gate.getPendingVolume('IF1509', 'buy') == 0
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 1), error.RiskPositionLimit)
+
+
+def test_clip_volume():
+    """
+    测试超过头寸上限时减少报单数量
+    """
+    gate = RiskGate(maxBuyVolume=3, clip=True)
+    assert gate.checkOpen('IF1508', 'buy', 2) == 2
+    assert gate.checkOpen('IF1508', 'buy', 2) == 1
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 1), error.RiskPositionLimit)
+    # 没有设置上限的方向不限制
+    assert gate.checkOpen('IF1508', 'sell', 100) == 100
+
+
+def test_order_and_cancel_rate():
+    """
+    测试报单和撤单频率限制
+    """
+    gate = RiskGate(orderRate=1, orderBurst=2, cancelRate=1)
+    gate.checkOpen('IF1508', 'buy', 1)
+    gate.checkOpen('IF1508', 'buy', 1)
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 1), error.RiskOrderRate)
+    # 被拒绝的报单不计入未成交数量
+    assert gate.getPendingVolume('IF1508', 'buy') == 2
+    gate.checkCancel()
+    assertRejected(gate.checkCancel, error.RiskCancelRate)
+    assert gate.rejectCount == 2
+
+
+def test_partially_closed():
+    """
+    测试平仓报单部分成交后释放已平仓的数量
+    """
+    gate = RiskGate(maxBuyVolume=3)
+    gate.checkOpen('IF1508', 'buy', 3)
+    position = Record(instrumentId='IF1508', direction='buy', volume=3)
+    gate.onOpened(position, position)
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 1), error.RiskPositionLimit)
+
+    # 平仓3手只成交2手,头寸剩余1手
+    position.volume -= 2
+    gate.onPartiallyClosed(position, 2)
+    assert gate.getOpenVolume('IF1508', 'buy') == 1
+    # 可以开仓到上限
+    assert gate.checkOpen('IF1508', 'buy', 2) == 2
+    assertRejected(lambda: gate.checkOpen('IF1508', 'buy', 1), error.RiskPositionLimit)
+
+    # 剩余的头寸平仓后全部释放
+    gate.onClosed(position)
+    assert gate.getOpenVolume('IF1508', 'buy') == 0
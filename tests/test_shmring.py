@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from shmring import ShmRingWriter, ShmRingReader, isShmAddress, getShmPath
+from replay import getStepAddress
+from wireformat import encodeMarketData, decodeMarketData, encodeBars
+from bar import Bar
+from comhelper import datetime2ns
+from datetime import datetime
+import tempfile
+import shutil
+import os
+
+
+def test_shm_address():
+    """
+    测试共享内存广播地址
+    """
+    assert isShmAddress('shm:///dev/shm/ctp-IF')
+    assert not isShmAddress('ipc:///tmp/ctp-IF')
+    assert getShmPath('shm:///dev/shm/ctp-IF') == '/dev/shm/ctp-IF'
+    assert getStepAddress('shm:///dev/shm/ctp-IF') == 'ipc:///dev/shm/ctp-IF-step'
+
+
+def test_write_and_read():
+    """
+    测试一个写入方多个读取方
+    """
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'ring')
+        writer = ShmRingWriter(path, slotCount=8, slotSize=64)
+        writer.send_multipart(['IF1508', 'before', '', ''])
+        reader0 = ShmRingReader(path)
+        reader1 = ShmRingReader(path, fromStart=True)
+        assert reader0.recv_multipart() is None
+
+        for i in range(3):
+            writer.send_multipart([u'IF1508', 'tick%d' % i, 'bar' if i == 1 else '', ''])
+        for i in range(3):
+            assert reader0.recv_multipart() == ['IF1508', 'tick%d' % i, 'bar' if i == 1 else '', '']
+        assert reader0.recv_multipart() is None
+        assert reader0.recv(timeout=.01) is None
+        # 读取方之间互不影响
+        assert reader1.recv_multipart()[1] == 'before'
+        assert reader1.recv_multipart()[1] == 'tick0'
+
+        # 超过一个槽位的消息写入连续的多个槽位
+        writer.send_multipart(['IF1508', 'x' * 100, 'y' * 30, ''])
+        writer.send_multipart(['IF1508', 'tick3', '', ''])
+        assert reader0.recv_multipart() == ['IF1508', 'x' * 100, 'y' * 30, '']
+        assert reader0.recv_multipart()[1] == 'tick3'
+        # 消息超过整个缓冲区的大小
+        try:
+            writer.send_multipart(['IF1508', 'x' * 64 * 8])
+            assert False
+        except Exception as e:
+            assert u'消息超过共享内存缓冲区的大小' in unicode(e)
+
+        reader0.close()
+        reader1.close()
+        writer.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_gap_detection():
+    """
+    测试读取方落后超过一圈时跳到最早的消息并记录丢失数量
+    """
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'ring')
+        writer = ShmRingWriter(path, slotCount=8, slotSize=64)
+        reader = ShmRingReader(path)
+        for i in range(20):
+            writer.send_multipart(['IF1508', str(i)])
+        result = []
+        messages = reader.recv_multipart()
+        while messages is not None:
+            result.append(int(messages[1]))
+            messages = reader.recv_multipart()
+        assert result == range(20 - len(result), 20)
+        assert reader.gapCount == 20 - len(result)
+        assert len(result) >= 7
+        reader.close()
+        writer.close()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_market_data_with_bars():
+    """
+    测试带有多根棒线的行情消息(二进制和JSON格式)可以通过默认大小的槽位广播
+    """
+    rawMarketData = {
+        'InstrumentID': 'IF1508',
+        'TradingDay': '20150801',
+        'ActionDay': '20150801',
+        'UpdateTime': '09:20:00',
+        'UpdateMillisec': 0,
+        'AskPrice1': 3900.2,
+        'BidPrice1': 3899.8,
+        'AskVolume1': 3,
+        'BidVolume1': 5,
+        'LastPrice': 3900.0,
+        'Volume': 1234,
+    }
+    endTime = datetime2ns(datetime(2015, 8, 1, 9, 20))
+    barList = [
+        Bar('IF1508', '1s', endTime - 10 ** 9, endTime, 3900, 3901, 3899, 3900, 1),
+        Bar('IF1508', '1m', endTime - 60 * 10 ** 9, endTime, 3890, 3901, 3889, 3900, 20),
+        Bar('IF1508', '5m', endTime - 300 * 10 ** 9, endTime, 3880, 3901, 3879, 3900, 100),
+    ]
+    root = tempfile.mkdtemp()
+    try:
+        path = os.path.join(root, 'ring')
+        writer = ShmRingWriter(path, slotCount=8)
+        reader = ShmRingReader(path)
+        for messageFormat in ('binary', 'json'):
+            messages = encodeMarketData(rawMarketData, messageFormat)
+            messages[2] = encodeBars(barList, messageFormat)
+            assert sum(len(p) for p in messages) > writer.dataSize
+            writer.send_multipart(messages)
+            data = decodeMarketData(reader.recv_multipart())
+            assert data['bid'] == 3899.8
+            assert [bar['period'] for bar in data['bars']] == ['1s', '1m', '5m']
+            assert data['bars'][2]['volume'] == 100
+        assert reader.gapCount == 0
+
+        # 读取方落后超过一圈时跳过被覆盖消息的后续槽位
+        for i in range(10):
+            writer.send_multipart(['IF1508', 'x' * 300, str(i), ''])
+        messages = reader.recv_multipart()
+        assert messages[1] == 'x' * 300
+        assert reader.gapCount > 0
+        reader.close()
+        writer.close()
+    finally:
+        shutil.rmtree(root)
@@ -341,4 +341,236 @@ def test_working_thread_running():
         trader.stop()
 
 
+def test_match_only_crossed_limit_orders():
+    """
+    测试多个限价报单时仅可以成交的报单被撮合
+    """
+    trader = SimulateTrader()
+    instrumentId = getDefaultInstrumentId()
+
+    # 创建三个不同限价的做多报单
+    order0 = trader.openPosition(instrumentId, 'buy', openLimitPrice=90)
+    order1 = trader.openPosition(instrumentId, 'buy', openLimitPrice=100)
+    order2 = trader.openPosition(instrumentId, 'buy', openLimitPrice=110)
+
+    # 发出一个只有最高限价可以成交的价格
+    trader.onDataArrived(instrumentId, ask=120, bid=105)
+    assert ModelOrder.objects.get(id=order0.id).state == 'insert'
+    assert ModelOrder.objects.get(id=order1.id).state == 'insert'
+    assert ModelOrder.objects.get(id=order2.id).state == 'finish'
+    assert ModelPosition.objects.get(id=order2.position.id).openPrice == (105 + 110) / 2
+
+    # 发出一个可以让其余报单全部成交的价格
+    trader.onDataArrived(instrumentId, ask=120, bid=90)
+    assert ModelOrder.objects.get(id=order0.id).state == 'finish'
+    assert ModelOrder.objects.get(id=order1.id).state == 'finish'
+    assert len(trader.getOrderList(action='open', state='insert')) == 0
+
+
+def test_open_and_close_position_async():
+    """
+    测试异步开仓和平仓
+    """
+    from futures import gather
+    trader = SimulateTrader()
+    instrumentId = getDefaultInstrumentId()
+
+    # 同时发出两个开仓报单,报价到达后一起成交
+    future0 = trader.openPositionAsync(instrumentId, 'buy', 1)
+    future1 = trader.openPositionAsync(instrumentId, 'sell', 1)
+    assert not future0.done()
+    assert not future1.done()
+    trader.onDataArrived(instrumentId, 100, 101)
+    order0, order1 = gather([future0, future1], timeout=1)
+    assert order0.action == 'open'
+    assert order0.position.state == 'open'
+    assert order1.position.openPrice == 100
+
+    # 平仓
+    future = trader.closePositionAsync(order0.position.id)
+    trader.onDataArrived(instrumentId, 100, 101)
+    order = future.result(1)
+    assert order.action == 'close'
+    assert ModelPosition.objects.get(id=order0.position.id).state == 'close'
+
+    # 撤销挂单
+    future = trader.openPositionAsync(instrumentId, 'buy', openLimitPrice=50)
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert not future.done()
+    order = trader.getOrderList(action='open', state='insert', openLimitPrice=50)[0]
+    trader.cancelOrder(order.id)
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert future.cancelled()
+
+
+def test_position_volume_and_close_all():
+    """
+    测试头寸数量查询,全部平仓以及启动时从数据库载入头寸
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    executer = ModelStrategyExecuter(
+        code='TestExecuter2', name=u'测试执行器2', dataGenerator=modelDataGenerator,
+        instrumentIdList=modelStrategyExecuter.instrumentIdList, traderClass='SimulateTrader')
+    executer.save()
+    trader = SimulateTrader(executer)
+    instrumentId = getDefaultInstrumentId()
+
+    trader.openPosition(instrumentId, 'buy', 2)
+    trader.openPosition(instrumentId, 'buy', 1)
+    trader.openPosition(instrumentId, 'sell', 1)
+    trader.openPosition('IF0000', 'sell', 1)
+    # 未成交的头寸不计入
+    assert trader.getNetVolume(instrumentId) == 0
+    trader.onDataArrived(instrumentId, 100, 101)
+    trader.onDataArrived('IF0000', 100, 101)
+
+    # 数量查询不访问数据库
+    with CaptureQueriesContext(connection) as queries:
+        assert trader.getLongVolume(instrumentId) == 3
+        assert trader.getShortVolume(instrumentId) == 1
+        assert trader.getNetVolume(instrumentId) == 2
+        assert trader.getNetVolume('IF0000') == -1
+        assert trader.getNetVolume() == 1
+        assert trader.getShortVolume() == 2
+    assert len(queries) == 0
+
+    # 重新创建交易接口时从数据库载入已打开的头寸
+    assert SimulateTrader(executer).getNetVolume(instrumentId) == 2
+
+    # 正在平仓的头寸仍然计入,平仓完成后不再计入
+    orderList = trader.closeAll(instrumentId)
+    assert len(orderList) == 3
+    assert trader.closeAll(instrumentId) == []
+    assert trader.getLongVolume(instrumentId) == 3
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert trader.getLongVolume(instrumentId) == 0
+    assert trader.getNetVolume(instrumentId) == 0
+    assert trader.getNetVolume() == -1
+    assert len(trader.closeAll()) == 1
+
+
+def test_risk_gate():
+    """
+    测试开仓前检查头寸上限,成交和撤单后更新计数
+    """
+    from risk import RiskGate
+    executer = ModelStrategyExecuter(
+        code='TestExecuter3', name=u'测试执行器3', dataGenerator=modelDataGenerator,
+        instrumentIdList=modelStrategyExecuter.instrumentIdList, traderClass='SimulateTrader',
+        maxBuyPosition=2, maxSellPosition=1, volume=1)
+    executer.save()
+    trader = SimulateTrader(executer, riskGate=RiskGate.fromExecuter(executer))
+    instrumentId = getDefaultInstrumentId()
+
+    trader.openPosition(instrumentId, 'buy')
+    limitOrder = trader.openPosition(instrumentId, 'buy', openLimitPrice=50)
+    try:
+        trader.openPosition(instrumentId, 'buy')
+        assert False
+    except Exception as e:
+        assert unicode(e).startswith(u'%d:' % error.RiskPositionLimit[0])
+    # 被拒绝的报单不写入数据库
+    assert len(trader.getOrderList(action='open')) == 2
+
+    # 撤销挂单后可以再开仓
+    trader.onDataArrived(instrumentId, 100, 101)
+    trader.cancelOrder(limitOrder.id)
+    trader.onDataArrived(instrumentId, 100, 101)
+    order = trader.openPosition(instrumentId, 'buy')
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert trader.riskGate.getOpenVolume(instrumentId, 'buy') == 2
+
+    # 平仓后释放
+    trader.closePosition(order.position.id)
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert trader.riskGate.getOpenVolume(instrumentId, 'buy') == 1
+
+    # 重新创建交易接口时从数据库恢复计数
+    trader = SimulateTrader(executer, riskGate=RiskGate.fromExecuter(executer))
+    assert trader.riskGate.getOpenVolume(instrumentId, 'buy') == 1
+    trader.openPosition(instrumentId, 'buy')
+    trader.openPosition(instrumentId, 'sell')
+    try:
+        trader.openPosition(instrumentId, 'sell')
+        assert False
+    except Exception as e:
+        assert unicode(e).startswith(u'%d:' % error.RiskPositionLimit[0])
+
+
+def test_open_and_close_positions():
+    """
+    测试批量开仓和批量平仓
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from risk import RiskGate
+    executer = ModelStrategyExecuter(
+        code='TestExecuter4', name=u'测试执行器4', dataGenerator=modelDataGenerator,
+        instrumentIdList=modelStrategyExecuter.instrumentIdList, traderClass='SimulateTrader',
+        maxBuyPosition=2, maxSellPosition=2, volume=1)
+    executer.save()
+    trader = SimulateTrader(executer, riskGate=RiskGate.fromExecuter(executer))
+    instrumentId = getDefaultInstrumentId()
+
+    # 所有头寸和报单在一个事务中写入
+    with CaptureQueriesContext(connection) as queries:
+        orderList = trader.openPositions([
+            (instrumentId, 'buy'),
+            {'instrumentId': 'IF0000', 'direction': 'sell', 'volume': 2, 'stopPrice': 200},
+        ])
+    assert len([q for q in queries if 'INSERT' in q['sql']]) == 4
+    assert [order.instrumentId for order in orderList] == [instrumentId, 'IF0000']
+    assert orderList[0].id < orderList[1].id
+    assert orderList[1].position.stopPrice == 200
+    for order in orderList:
+        assert ModelOrder.objects.get(id=order.id).position_id == order.position.id
+        assert ModelPosition.objects.get(id=order.position.id).state == 'preopen'
+
+    # 任何一项超过头寸上限时所有报单都不创建
+    try:
+        trader.openPositions([(instrumentId, 'buy'), ('IF0000', 'sell')])
+        assert False
+    except Exception as e:
+        assert unicode(e).startswith(u'%d:' % error.RiskPositionLimit[0])
+    assert len(trader.getOrderList(action='open')) == 2
+    assert trader.riskGate.getPendingVolume(instrumentId, 'buy') == 1
+
+    trader.onDataArrived(instrumentId, 100, 101)
+    trader.onDataArrived('IF0000', 100, 101)
+    assert trader.getNetVolume() == -1
+
+    orderList = trader.closePositions([order.position.id for order in orderList])
+    assert [order.action for order in orderList] == ['close', 'close']
+    assert ModelPosition.objects.get(id=orderList[1].position.id).state == 'preclose'
+    # 不处于打开状态的头寸不能平仓
+    try:
+        trader.closePositions([orderList[0].position.id])
+        assert False
+    except ModelPosition.DoesNotExist:
+        pass
+    trader.onDataArrived(instrumentId, 100, 101)
+    trader.onDataArrived('IF0000', 100, 101)
+    assert trader.getNetVolume() == 0
+    assert trader.riskGate.getOpenVolume('IF0000', 'sell') == 0
+
+
+def test_open_and_close_positions_async():
+    """
+    测试批量开仓和批量平仓的Future
+    """
+    from futures import gather
+    trader = SimulateTrader()
+    instrumentId = getDefaultInstrumentId()
 
+    futureList = trader.openPositionsAsync([(instrumentId, 'buy'), (instrumentId, 'sell', 2)])
+    assert len(futureList) == 2
+    assert not futureList[0].done()
+    trader.onDataArrived(instrumentId, 100, 101)
+    order0, order1 = gather(futureList, timeout=1)
+    assert order0.position.state == 'open'
+    assert order1.volume == 2
+
+    futureList = trader.closePositionsAsync([order0.position.id, order1.position.id])
+    trader.onDataArrived(instrumentId, 100, 101)
+    assert [order.action for order in gather(futureList, timeout=1)] == ['close', 'close']
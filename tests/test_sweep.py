@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from sweep import expandGrid, runSweep, formatTable
+from comhelper import datetime2ns
+from datetime import datetime, timedelta
+import numpy
+import tempfile
+import shutil
+import os
+
+
+def test_expand_grid():
+    """
+    测试展开参数网格
+    """
+    configList = expandGrid({'window': [200, 400], 'threshold': [2, 2.5, 3]})
+    assert len(configList) == 6
+    assert configList[0] == {'threshold': 2, 'window': 200}
+    assert configList[1] == {'threshold': 2, 'window': 400}
+    assert configList[-1] == {'threshold': 3, 'window': 400}
+    assert expandGrid({}) == [{}]
+
+
+def test_run_sweep():
+    """
+    测试使用多个进程运行参数扫描
+    """
+    rows = 20
+    t0 = datetime(2015, 8, 3, 9, 15)
+    bid = 3900. + numpy.arange(rows)
+    ticks = {
+        'timestamp': numpy.array([datetime2ns(t0 + timedelta(seconds=i)) for i in range(rows)]),
+        'AskPrice1': bid + 1,
+        'BidPrice1': bid,
+        'AskVolume1': numpy.ones(rows, dtype='<i4'),
+        'BidVolume1': numpy.ones(rows, dtype='<i4'),
+        'LastPrice': bid,
+        'Volume': numpy.arange(rows),
+        'instrument': numpy.zeros(rows, dtype='<i4'),
+    }
+
+    root = tempfile.mkdtemp()
+    try:
+        strategyFile = os.path.join(root, 'strategy.py')
+        with open(strategyFile, 'w') as f:
+            f.write(
+                'count = 0\n'
+                'def onInit(config):\n'
+                '    global closeAt\n'
+                '    closeAt = config["closeAt"]\n'
+                '    if closeAt < 0:\n'
+                '        raise Exception("invalid closeAt")\n'
+                'def onDataArrived(data, trader):\n'
+                '    global count\n'
+                '    count += 1\n'
+                '    if count == 1:\n'
+                '        trader.openPosition(data["instrumentID"], "buy")\n'
+                '    if count == closeAt:\n'
+                '        trader.closeAll()\n'
+            )
+        results = runSweep(strategyFile, {'closeAt': 0}, {'closeAt': [-1, 5, 10]}, ['IF1508'], ticks, processes=2)
+        assert [params for params, _ in results] == [{'closeAt': -1}, {'closeAt': 5}, {'closeAt': 10}]
+        assert 'invalid closeAt' in results[0][1]['error']
+        # 以bid开仓,以ask平仓
+        assert results[1][1]['pnl'] == 3905 - 3900
+        assert results[2][1]['pnl'] == 3910 - 3900
+        assert results[2][1]['tradeCount'] == 1
+
+        lines = formatTable(results).splitlines()
+        assert len(lines) == 4
+        assert lines[1].split()[:2] == ['10', '10.00']
+        assert lines[3].split() == ['-1', 'error']
+    finally:
+        shutil.rmtree(root)
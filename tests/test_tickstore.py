@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from tickstore import TickStore, TICK_COLUMNS, importFromDatabase
+from comhelper import getTickTime, datetime2ns, ns2datetime
+from datetime import datetime
+from database.models import ModelDataCatalog, ModelDepthMarketData
+import numpy
+import tempfile
+import shutil
+
+
+def test_save_and_load():
+    """
+    测试保存并读取行情数据文件
+    """
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        rows = 100
+        columns = dict((name, numpy.arange(rows)) for name, _ in TICK_COLUMNS)
+        columns['BidPrice1'] = numpy.arange(rows) + .5
+        store.save('IF1508', '20150801', columns)
+
+        assert store.getTradingDayList() == ['20150801']
+        assert store.getTradingDayList('IF1509') == []
+        assert store.getInstrumentIdList('20150801') == ['IF1508']
+        tickFile = store.load('IF1508', '20150801')
+        assert len(tickFile) == rows
+        assert tickFile.instrumentId == 'IF1508'
+        assert tickFile['BidPrice1'].dtype == numpy.float64
+        assert tickFile['BidVolume1'].dtype == numpy.int32
+        assert (tickFile['BidPrice1'] == columns['BidPrice1']).all()
+        assert (tickFile['timestamp'] == columns['timestamp']).all()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_import_from_database():
+    """
+    测试从数据库导入行情数据
+    """
+    dataCatalog = ModelDataCatalog(name='TestTickStore', remarks='')
+    dataCatalog.save()
+    for instrumentId in ('IF1508', 'IF1509'):
+        for i in range(10):
+            ModelDepthMarketData(
+                dataCatalog=dataCatalog, TradingDay='20150801', InstrumentID=instrumentId,
+                UpdateTime='09:15:%02d' % (10 - i), UpdateMillisec=500, BidPrice1=i, AskPrice1=i + 1
+            ).save()
+
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        pathList = importFromDatabase(store, dataCatalog=dataCatalog)
+        assert len(pathList) == 2
+        tickFile = store.load('IF1509', '20150801')
+        assert len(tickFile) == 10
+        # 数据按时间排序
+        assert list(tickFile['BidPrice1']) == range(9, -1, -1)
+        t = getTickTime('20150801', '09:15:01', 500)
+        assert tickFile['timestamp'][0] == datetime2ns(t)
+        assert ns2datetime(tickFile['timestamp'][0]) == t
+    finally:
+        shutil.rmtree(root)
+
+
+def test_import_night_session():
+    """
+    测试夜盘行情按业务日期(ActionDay)计算时间,不会被排到日盘之后
+    """
+    dataCatalog = ModelDataCatalog(name='TestTickStoreNight', remarks='')
+    dataCatalog.save()
+    # 交易日20150803(周一)的行情: 周五夜盘,周六凌晨,周一日盘;旧数据的业务日期可能为空
+    rows = [
+        ('20150731', '21:00:01'),
+        ('20150731', '23:59:59'),
+        ('20150801', '00:30:00'),
+        ('20150803', '09:15:00'),
+        ('', '09:15:01'),
+    ]
+    for i, (actionDay, updateTime) in enumerate(rows):
+        ModelDepthMarketData(
+            dataCatalog=dataCatalog, TradingDay='20150803', ActionDay=actionDay, InstrumentID='IF1508',
+            UpdateTime=updateTime, UpdateMillisec=0, BidPrice1=i, AskPrice1=i + 1
+        ).save()
+
+    root = tempfile.mkdtemp()
+    try:
+        store = TickStore(root)
+        importFromDatabase(store, dataCatalog=dataCatalog)
+        tickFile = store.load('IF1508', '20150803')
+        assert list(tickFile['BidPrice1']) == range(len(rows))
+        assert ns2datetime(tickFile['timestamp'][0]) == datetime(2015, 7, 31, 21, 0, 1)
+        assert ns2datetime(tickFile['timestamp'][2]) == datetime(2015, 8, 1, 0, 30)
+        assert ns2datetime(tickFile['timestamp'][4]) == datetime(2015, 8, 3, 9, 15, 1)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from wireformat import encodeMarketData, decodeMarketData, decodeTickInto, TICK_DTYPE, encodeBars
+from bar import Bar
+from datetime import datetime
+import numpy
+
+
+rawMarketData = {
+    'InstrumentID': 'IF1508',
+    'TradingDay': '20150801',
+    'UpdateTime': '09:15:01',
+    'UpdateMillisec': 500,
+    'AskPrice1': 3900.2,
+    'BidPrice1': 3899.8,
+    'AskVolume1': 3,
+    'BidVolume1': 5,
+    'LastPrice': 3900.0,
+    'Volume': 1234,
+}
+
+
+def test_binary_message():
+    """
+    测试二进制行情消息的编码和解码
+    """
+    messages = encodeMarketData(rawMarketData)
+    assert messages[0] == 'IF1508'
+    assert messages[2:] == ['', '']
+    data = decodeMarketData(messages)
+    assert data['instrumentID'] == 'IF1508'
+    assert data['ask'] == 3900.2
+    assert data['bid'] == 3899.8
+    assert data['askVolume'] == 3
+    assert data['bidVolume'] == 5
+    assert data['volume'] == 1234
+    assert data['dataTime'] == datetime(2015, 8, 1, 9, 15, 1, 500000)
+
+
+def test_night_session_time():
+    """
+    测试夜盘行情的时间使用业务日期(ActionDay)
+    """
+    nightMarketData = dict(rawMarketData, TradingDay='20150803', ActionDay='20150731', UpdateTime='21:00:01')
+    for messageFormat in ('binary', 'json'):
+        data = decodeMarketData(encodeMarketData(nightMarketData, messageFormat))
+        assert data['dataTime'] == datetime(2015, 7, 31, 21, 0, 1, 500000)
+
+
+def test_decode_into_buffer():
+    """
+    测试解码到预先分配的数组
+    """
+    buffer = numpy.zeros(2, dtype=TICK_DTYPE)
+    decodeTickInto(encodeMarketData(rawMarketData)[1], buffer, 1)
+    assert buffer[0]['ask'] == 0
+    assert buffer[1]['ask'] == 3900.2
+    assert buffer[1]['bidVolume'] == 5
+
+
+def test_json_message():
+    """
+    测试JSON格式的行情消息仍然可以解码
+    """
+    messages = encodeMarketData(rawMarketData, 'json')
+    assert messages[1].startswith('{')
+    data = decodeMarketData(messages)
+    assert data['instrumentID'] == 'IF1508'
+    assert data['bid'] == 3899.8
+    assert data['dataTime'] == datetime(2015, 8, 1, 9, 15, 1, 500000)
+
+
+def test_decode_version1_message():
+    """
+    测试版本1(不含时间戳)的消息仍然可以解码
+    """
+    from wireformat import TICK_STRUCT_V1
+    payload = TICK_STRUCT_V1.pack(1, 0, 0, 0, 3900.2, 3899.8, 3, 5, 3900.0, 1234)
+    data = decodeMarketData(['IF1508', payload, '', ''])
+    assert data['ask'] == 3900.2
+    assert data['recvTime'] == 0
+    assert data['sendTime'] == 0
+
+    buffer = numpy.ones(1, dtype=TICK_DTYPE)
+    decodeTickInto(payload, buffer)
+    assert buffer[0]['bid'] == 3899.8
+    assert buffer[0]['sendTime'] == 0
+
+
+def test_message_carry_timestamps():
+    """
+    测试消息携带收到行情和发送的时间戳
+    """
+    from latency import monotonicNs
+    recvTime = monotonicNs()
+    data = decodeMarketData(encodeMarketData(rawMarketData, recvTime=recvTime))
+    assert data['recvTime'] == recvTime
+    assert data['sendTime'] >= recvTime
+
+
+def test_message_carry_bars():
+    """
+    测试棒线数据随行情消息发送
+    """
+    barList = [
+        Bar('IF1508', '1m', 60 * 10 ** 9, 120 * 10 ** 9, 3900, 3905, 3898, 3901, 10),
+        Bar('IF1508', u'v100', 61 * 10 ** 9, 75 * 10 ** 9, 3900, 3902, 3900, 3902, 101),
+    ]
+    for messageFormat in ('binary', 'json'):
+        messages = encodeMarketData(rawMarketData, messageFormat)
+        assert 'bars' not in decodeMarketData(messages)
+        messages[2] = encodeBars(barList, messageFormat)
+        bars = decodeMarketData(messages)['bars']
+        assert len(bars) == 2
+        assert bars[0] == barList[0].toDict()
+        assert bars[1]['period'] == 'v100'
+        assert bars[1]['volume'] == 101
+    assert encodeBars([]) == ''
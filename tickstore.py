@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from comhelper import getTickTime, datetime2ns
+import numpy
+import struct
+import json
+import os
+
+MAGIC = 'CTPTICK\0'
+VERSION = 1
+ALIGNMENT = 64
+
+# 列定义(列名,数据类型)
+TICK_COLUMNS = [
+    ('timestamp', '<i8'),        # 纳秒时间戳,见comhelper.datetime2ns
+    ('LastPrice', '<f8'),
+    ('Volume', '<i8'),
+    ('Turnover', '<f8'),
+    ('OpenInterest', '<f8'),
+]
+for _level in range(1, 6):
+    TICK_COLUMNS.extend([
+        ('BidPrice%d' % _level, '<f8'),
+        ('BidVolume%d' % _level, '<i4'),
+        ('AskPrice%d' % _level, '<f8'),
+        ('AskVolume%d' % _level, '<i4'),
+    ])
+
+# 从ModelDepthMarketData导入时读取的字段
+IMPORT_FIELDS = ['TradingDay', 'UpdateTime', 'UpdateMillisec'] + [name for name, _ in TICK_COLUMNS[1:]] + ['ActionDay']
+
+
+def writeTickFile(path, instrumentId, tradingDay, columns):
+    """
+    写入一个行情数据文件
+    文件格式:
+        8字节标识 'CTPTICK\\0',4字节版本号,4字节头部长度(小端)
+        头部(json): 品种,交易日,记录数,各列的名称,数据类型和偏移
+        各列数据,每列为一个连续的定长数组,按64字节对齐
+    读取时各列直接使用numpy.memmap映射,不需要解析和复制数据
+    参数:
+        path 文件路径
+        instrumentId 品种
+        tradingDay 交易日
+        columns 列数据字典,列名 -> 数组,必须包含TICK_COLUMNS中的所有列且长度相同
+    """
+    arrays = [numpy.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in TICK_COLUMNS]
+    rows = len(arrays[0])
+    for array in arrays:
+        if len(array) != rows:
+            raise Exception(u'各列数据长度不一致')
+
+    # 计算各列的偏移,头部长度预留足够的空间以便对齐
+    header = {'instrumentId': instrumentId, 'tradingDay': tradingDay, 'rows': rows, 'columns': []}
+    headerSize = len(json.dumps(header)) + len(TICK_COLUMNS) * 64
+    offset = _align(len(MAGIC) + 8 + headerSize)
+    for (name, dtype), array in zip(TICK_COLUMNS, arrays):
+        header['columns'].append({'name': name, 'dtype': dtype, 'offset': offset})
+        offset = _align(offset + array.nbytes)
+    headerJson = json.dumps(header)
+    assert len(headerJson) <= headerSize
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    # 先写入临时文件再改名,避免读取到未写完的文件
+    tmpPath = path + '.tmp'
+    with open(tmpPath, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', VERSION, len(headerJson)))
+        f.write(headerJson)
+        for column, array in zip(header['columns'], arrays):
+            f.seek(column['offset'])
+            f.write(array.tostring())
+    os.rename(tmpPath, path)
+
+
+def _align(offset):
+    """
+    按ALIGNMENT对齐
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class TickFile(object):
+    """
+    只读的行情数据文件
+    用法:
+        tickFile = TickFile(path)
+        bid = tickFile['BidPrice1']  # numpy.memmap
+    """
+
+    def __init__(self, path):
+        """
+        打开文件并映射各列数据
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception(u'无效的行情数据文件:%s' % path)
+            version, headerLength = struct.unpack('<II', f.read(8))
+            if version != VERSION:
+                raise Exception(u'不支持的行情数据文件版本:%d' % version)
+            header = json.loads(f.read(headerLength))
+        self.instrumentId = header['instrumentId']
+        self.tradingDay = header['tradingDay']
+        self.rows = header['rows']
+        self.names = [column['name'] for column in header['columns']]
+        self.__columns = {}
+        for column in header['columns']:
+            if self.rows == 0:
+                self.__columns[column['name']] = numpy.empty(0, dtype=column['dtype'])
+            else:
+                self.__columns[column['name']] = numpy.memmap(
+                    path, dtype=column['dtype'], mode='r', offset=column['offset'], shape=(self.rows,))
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, name):
+        return self.__columns[name]
+
+    def __contains__(self, name):
+        return name in self.__columns
+
+
+class TickStore(object):
+    """
+    列式行情数据存储
+    每个品种每个交易日保存为一个文件: <根目录>/<交易日>/<品种>.tick
+    """
+
+    def __init__(self, root):
+        """
+        root 存储的根目录
+        """
+        self.root = root
+
+    def getPath(self, instrumentId, tradingDay):
+        """
+        获取品种在某个交易日的数据文件路径
+        """
+        return os.path.join(self.root, tradingDay, '%s.tick' % instrumentId)
+
+    def exists(self, instrumentId, tradingDay):
+        """
+        数据文件是否存在
+        """
+        return os.path.exists(self.getPath(instrumentId, tradingDay))
+
+    def load(self, instrumentId, tradingDay):
+        """
+        读取品种在某个交易日的数据
+        返回: TickFile
+        """
+        return TickFile(self.getPath(instrumentId, tradingDay))
+
+    def save(self, instrumentId, tradingDay, columns):
+        """
+        保存品种在某个交易日的数据
+        """
+        path = self.getPath(instrumentId, tradingDay)
+        writeTickFile(path, instrumentId, tradingDay, columns)
+        return path
+
+    def getTradingDayList(self, instrumentId=None):
+        """
+        获取有数据的交易日列表
+        instrumentId 品种,默认为None表示所有品种
+        """
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for tradingDay in sorted(os.listdir(self.root)):
+            if instrumentId is None or self.exists(instrumentId, tradingDay):
+                result.append(tradingDay)
+        return result
+
+    def getInstrumentIdList(self, tradingDay):
+        """
+        获取某个交易日有数据的品种列表
+        """
+        directory = os.path.join(self.root, tradingDay)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.tick'))
+
+
+def importFromDatabase(store, dataCatalog=None, instrumentIdList=None, tradingDayList=None):
+    """
+    从ModelDepthMarketData导入行情数据
+    参数:
+        store TickStore
+        dataCatalog 数据目录,默认为None表示所有目录
+        instrumentIdList 品种列表,默认为None表示所有品种
+        tradingDayList 交易日列表,默认为None表示所有交易日
+    返回:
+        写入的文件路径列表
+    """
+    from database.models import ModelDepthMarketData
+
+    querySet = ModelDepthMarketData.objects.all()
+    if dataCatalog is not None:
+        querySet = querySet.filter(dataCatalog=dataCatalog)
+    if instrumentIdList is not None:
+        querySet = querySet.filter(InstrumentID__in=instrumentIdList)
+    if tradingDayList is not None:
+        querySet = querySet.filter(TradingDay__in=tradingDayList)
+    querySet = querySet.order_by('TradingDay', 'InstrumentID', 'id')
+    rows = querySet.values_list('InstrumentID', *IMPORT_FIELDS).iterator()
+
+    result = []
+    key = None
+    buffer = []
+    for row in rows:
+        rowKey = (row[1], row[0])
+        if rowKey != key:
+            if buffer:
+                result.append(_saveBuffer(store, key, buffer))
+            key = rowKey
+            buffer = []
+        buffer.append(row[1:])
+    if buffer:
+        result.append(_saveBuffer(store, key, buffer))
+    return result
+
+
+def _saveBuffer(store, key, buffer):
+    """
+    将一个品种一个交易日的数据写入文件
+    """
+    tradingDay, instrumentId = key
+    columns = {}
+    columns['timestamp'] = numpy.array(
+        [datetime2ns(getTickTime(row[0], row[1], row[2], row[-1])) for row in buffer], dtype='<i8')
+    for i, (name, dtype) in enumerate(TICK_COLUMNS[1:]):
+        columns[name] = numpy.array([row[i + 3] for row in buffer], dtype=dtype)
+    # 按时间排序,时间相同时保持记录顺序
+    index = numpy.argsort(columns['timestamp'], kind='mergesort')
+    for name in columns:
+        columns[name] = columns[name][index]
+    return store.save(instrumentId, tradingDay, columns)
+
+
+def main():
+    """
+    命令行入口
+    python tickstore.py import <根目录> [--catalog 目录编号] [--instrument 品种 ...] [--day 交易日 ...]
+    python tickstore.py info <文件>
+    """
+    import argparse
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='cmd')
+    importParser = subparsers.add_parser('import', help=u'从数据库导入行情数据')
+    importParser.add_argument('root')
+    importParser.add_argument('--catalog', type=int)
+    importParser.add_argument('--instrument', nargs='*')
+    importParser.add_argument('--day', nargs='*')
+    infoParser = subparsers.add_parser('info', help=u'查看行情数据文件')
+    infoParser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.cmd == 'import':
+        from comhelper import setDjangoEnvironment
+        setDjangoEnvironment(runtime=True)
+        pathList = importFromDatabase(TickStore(args.root), args.catalog, args.instrument, args.day)
+        for path in pathList:
+            print path
+        print u'共写入%d个文件' % len(pathList)
+
+    if args.cmd == 'info':
+        tickFile = TickFile(args.path)
+        print 'instrumentId =', tickFile.instrumentId
+        print 'tradingDay =', tickFile.tradingDay
+        print 'rows =', tickFile.rows
+        print 'columns =', ','.join(tickFile.names)
+
+
+if __name__ == '__main__':
+    main()
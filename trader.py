@@ -2,16 +2,25 @@
 # encoding: utf-8
 from __future__ import division
 from database.models import ModelPosition, ModelOrder
+from django.db import transaction
 from datetime import datetime
 from callback import CallbackManager
-from comhelper import orderId2Ref
-from comhelper import wait
+from orderbook import OrderBook
+from comhelper import getRspError
+from futures import Future, RequestManager
+from registry import OrderRegistry
+from positionbook import PositionBook
+from orderfield import InputOrderFieldPool
+from latency import recorder as latencyRecorder
 import threading
 import error
+import json
 import uuid
-import pyctp
 import inspect
 
+# NOTE: pyctp在创建CTP交易接口时才导入,模拟交易和回测不依赖pyctp
+pyctp = None
+
 class Trader(object):
 
     """
@@ -29,15 +38,28 @@ class Trader(object):
     3. 子类甚至可以不需要重载回调方法,除非子类有特殊的数据存储需要
     """
 
-    def __init__(self, modelStrategyExecuter=None):
+    def __init__(self, modelStrategyExecuter=None, journal=None, callbackManager=None, riskGate=None):
         """
         相关的初始化操作
         modelStrategyExecuter
+        journal 数据写入日志(WriteBehindJournal),默认为None表示同步写入数据库
+        callbackManager 回调管理器,默认为None表示在触发事件的线程中同步调用回调函数,
+            可以使用AsyncCallbackManager在工作线程中调用
+        riskGate 报单前的风险控制(risk.RiskGate),默认为None表示不检查
         NOTE: 这里的参数使用的是执行器的数据实体,但是这似乎是有问题,如果获取交易数据流,需要进一步考虑
         """
         self.events = [m for m in dir(self) if callable(getattr(self, m)) and m.startswith('on')]
         self.modelStrategyExecuter = modelStrategyExecuter
-        self.__callbackManager = CallbackManager()
+        self.journal = journal
+        self.__callbackManager = callbackManager or CallbackManager()
+        # 报单id -> 等待报单结果的Future,见openPositionAsync
+        self.__futureDict = {}
+        self.__futureLock = threading.RLock()
+        self.__local = threading.local()
+        # 已打开的头寸,用于头寸数量查询,启动时与数据库核对
+        self.positionBook = PositionBook()
+        self.riskGate = riskGate
+        self.reconcilePositions()
 
     def getClass(self):
         """
@@ -55,6 +77,24 @@ class Trader(object):
         """转调回调管理器"""
         return self.__callbackManager.unbind(bindId)
 
+    def saveModel(self, model):
+        """
+        保存数据实体
+        如果使用了写入日志,已存在的记录交由日志的后台线程写入,新记录仍然同步保存以获得id
+        """
+        if self.journal is None or model.pk is None:
+            model.save()
+        else:
+            self.journal.put(model)
+
+    def flush(self):
+        """
+        等待写入日志中的数据全部写入数据库
+        NOTE: 从数据库读取交易数据前需要调用,保证可以读到之前的修改
+        """
+        if self.journal is not None:
+            self.journal.flush()
+
     def openPosition(self, instrumentId, direction, volume=1, openLimitPrice=0, stopPrice=0, profitPrice=0):
         """
         开仓操作
@@ -67,7 +107,12 @@ class Trader(object):
             profitPrice 头寸止盈价格,默认为0,表示不设置止盈
         返回:
             order 开仓报单数据实体
+        异常:
+            设置了风险控制时,超过头寸上限或报单频率抛出异常,不创建报单
         """
+        if self.riskGate is not None:
+            volume = self.riskGate.checkOpen(instrumentId, direction, volume)
+
         data = {
             'strategyExecuter': self.modelStrategyExecuter,
             'traderClass': self.getClass(),
@@ -82,7 +127,7 @@ class Trader(object):
         # 创建头寸数据
         position = ModelPosition(**data)
         position.state = 'preopen'
-        position.save()
+        self.saveModel(position)
 
         # 创建报单数据
         order = ModelOrder(**data)
@@ -91,7 +136,8 @@ class Trader(object):
         order.state = 'insert'
         order.errorId = 0
         order.errorMsg = ""
-        order.save()
+        self.saveModel(order)
+        self.__registerFuture(order)
 
         return order
 
@@ -106,10 +152,12 @@ class Trader(object):
         TODO: closeLimitPrice 要如何处理还没考虑清楚
         """
         # 读取头寸信息
+        self.flush()
         position = ModelPosition.objects.get(id=positionId, state='open')
         position.state = 'preclose'
         position.closeLimitPrice = closeLimitPrice
-        position.save()
+        self.saveModel(position)
+        self.positionBook.update(position)
 
         # 创建平仓订单
         order = ModelOrder()
@@ -126,10 +174,241 @@ class Trader(object):
         order.stopPrice = position.stopPrice
         order.profitPrice = position.profitPrice
         order.state = 'insert'
-        order.save()
+        self.saveModel(order)
+        self.__registerFuture(order)
 
         return order
 
+    def openPositions(self, legList):
+        """
+        批量开仓,用于组合和配对交易同时建立多个头寸
+        所有头寸和报单在一个事务中写入数据库,报单按legList的顺序连续提交
+        参数:
+            legList 开仓参数列表,每一项为openPosition的参数,可以是元组或字典,
+                如 [('IF1508', 'buy'), {'instrumentId': 'IF1509', 'direction': 'sell', 'volume': 2}]
+        返回:
+            orderList 开仓报单数据实体列表,与legList的顺序一致
+        异常:
+            设置了风险控制时,任何一项超过头寸上限或报单频率都抛出异常,所有报单都不创建
+        """
+        positionList = []
+        orderList = []
+        for leg in legList:
+            if isinstance(leg, dict):
+                args, kwargs = (), leg
+            else:
+                args, kwargs = leg, {}
+            data = dict(zip(('instrumentId', 'direction', 'volume', 'openLimitPrice', 'stopPrice', 'profitPrice'),
+                            args), **kwargs)
+            data.setdefault('volume', 1)
+            data.setdefault('openLimitPrice', 0)
+            data.setdefault('stopPrice', 0)
+            data.setdefault('profitPrice', 0)
+            data['strategyExecuter'] = self.modelStrategyExecuter
+            data['traderClass'] = self.getClass()
+
+            # 创建头寸数据
+            position = ModelPosition(**data)
+            position.state = 'preopen'
+            positionList.append(position)
+
+            # 创建报单数据
+            order = ModelOrder(**data)
+            order.action = 'open'
+            order.state = 'insert'
+            order.errorId = 0
+            order.errorMsg = ""
+            orderList.append(order)
+
+        if self.riskGate is not None:
+            checkedList = []
+            try:
+                for order in orderList:
+                    order.volume = self.riskGate.checkOpen(order.instrumentId, order.direction, order.volume)
+                    checkedList.append(order)
+            except Exception:
+                # 释放已经通过检查的数量
+                for order in checkedList:
+                    self.riskGate.onOpenFailed(order)
+                raise
+            for position, order in zip(positionList, orderList):
+                position.volume = order.volume
+
+        try:
+            self.__saveBatch(positionList, orderList)
+        except Exception:
+            if self.riskGate is not None:
+                for order in orderList:
+                    self.riskGate.onOpenFailed(order)
+            raise
+        return orderList
+
+    def closePositions(self, positionIdList, closeLimitPrice=0):
+        """
+        批量平仓,所有头寸的状态修改和平仓报单在一个事务中写入数据库
+        参数:
+            positionIdList 要平仓的头寸的标识列表
+            closeLimitPrice 平仓限价
+        返回:
+            orderList 平仓报单数据实体列表,与positionIdList的顺序一致
+        """
+        self.flush()
+        positionDict = ModelPosition.objects.in_bulk(positionIdList)
+        positionList = []
+        for positionId in positionIdList:
+            position = positionDict.get(positionId)
+            if position is None or position.state != 'open':
+                raise ModelPosition.DoesNotExist(u'头寸不存在或者不处于打开状态:%s' % positionId)
+            position.state = 'preclose'
+            position.closeLimitPrice = closeLimitPrice
+            positionList.append(position)
+
+        # 创建平仓订单
+        orderList = []
+        for position in positionList:
+            order = ModelOrder()
+            order.strategyExecuter = self.modelStrategyExecuter
+            order.traderClass = self.getClass()
+            order.instrumentId = position.instrumentId
+            order.action = 'close'
+            order.direction = position.direction
+            order.volume = position.volume
+            order.openLimitPrice = position.openLimitPrice
+            order.openPrice = position.openPrice
+            order.closeLimitPrice = closeLimitPrice
+            order.stopPrice = position.stopPrice
+            order.profitPrice = position.profitPrice
+            order.state = 'insert'
+            orderList.append(order)
+
+        self.__saveBatch(positionList, orderList)
+        for position in positionList:
+            self.positionBook.update(position)
+        return orderList
+
+    def __saveBatch(self, positionList, orderList):
+        """
+        在一个事务中保存头寸和报单,orderList[i]对应positionList[i]
+        NOTE: 逐条保存以获得数据库分配的id,整个批量报单只提交一次事务
+        """
+        with transaction.atomic():
+            for position, order in zip(positionList, orderList):
+                position.save()
+                order.position = position
+                order.save()
+        self.__registerFutures(orderList)
+
+    def openPositionAsync(self, *args, **kwargs):
+        """
+        开仓操作,不等待成交
+        参数:
+            与openPosition相同
+        返回:
+            future 头寸建立时结果为开仓报单数据实体(order.position为头寸),
+                开仓出错时抛出异常,挂单被取消时为已取消状态
+        例子:
+            future0 = trader.openPositionAsync('IF1508', 'buy')
+            future1 = trader.openPositionAsync('IF1509', 'sell')
+            order0, order1 = gather([future0, future1], timeout=5)
+        """
+        return self.__callAsync(self.openPosition, *args, **kwargs)
+
+    def closePositionAsync(self, *args, **kwargs):
+        """
+        平仓操作,不等待成交
+        参数:
+            与closePosition相同
+        返回:
+            future 头寸平仓时结果为平仓报单数据实体,平仓出错时抛出异常
+        """
+        return self.__callAsync(self.closePosition, *args, **kwargs)
+
+    def openPositionsAsync(self, legList):
+        """
+        批量开仓,不等待成交
+        参数:
+            与openPositions相同
+        返回:
+            futureList 与legList顺序一致的Future列表,结果与openPositionAsync相同
+        例子:
+            futureList = trader.openPositionsAsync([('IF1508', 'buy'), ('IF1509', 'sell')])
+            order0, order1 = gather(futureList, timeout=5)
+        """
+        return self.__callBatchAsync(self.openPositions, len(legList), legList)
+
+    def closePositionsAsync(self, positionIdList, closeLimitPrice=0):
+        """
+        批量平仓,不等待成交
+        参数:
+            与closePositions相同
+        返回:
+            futureList 与positionIdList顺序一致的Future列表,结果与closePositionAsync相同
+        """
+        return self.__callBatchAsync(self.closePositions, len(positionIdList), positionIdList, closeLimitPrice)
+
+    def __callAsync(self, func, *args, **kwargs):
+        """
+        调用报单方法并返回等待报单结果的Future
+        NOTE: Future在报单保存后,提交(撮合或发送到CTP)之前登记,不会错过立即到达的回报
+        """
+        future = Future()
+        self.__local.future = future
+        try:
+            func(*args, **kwargs)
+        finally:
+            self.__local.future = None
+        return future
+
+    def __callBatchAsync(self, func, count, *args, **kwargs):
+        """
+        调用批量报单方法并返回每个报单的Future,登记的时机与__callAsync相同
+        """
+        futureList = [Future() for i in range(count)]
+        self.__local.futureList = futureList
+        try:
+            func(*args, **kwargs)
+        finally:
+            self.__local.futureList = None
+        return futureList
+
+    def __registerFutures(self, orderList):
+        """
+        登记当前线程中等待批量报单结果的Future列表
+        """
+        futureList = getattr(self.__local, 'futureList', None)
+        if futureList is None:
+            return
+        self.__local.futureList = None
+        with self.__futureLock:
+            for order, future in zip(orderList, futureList):
+                self.__futureDict[order.id] = future
+
+    def __registerFuture(self, order):
+        """
+        登记当前线程中等待报单结果的Future
+        """
+        future = getattr(self.__local, 'future', None)
+        if future is None:
+            return
+        self.__local.future = None
+        with self.__futureLock:
+            self.__futureDict[order.id] = future
+
+    def __resolveFuture(self, order, result=None, exception=None, cancel=False):
+        """
+        设置等待报单结果的Future
+        """
+        with self.__futureLock:
+            future = self.__futureDict.pop(order.id, None)
+        if future is None:
+            return
+        if cancel:
+            future.cancel()
+        elif exception is not None:
+            future.setException(exception)
+        else:
+            future.setResult(result)
+
     def cancelOrder(self, orderId):
         """
         取消挂单
@@ -137,7 +416,12 @@ class Trader(object):
             orderId 原始挂单报单单号
         返回:
             cancelOrder 取消单数据实体
+        异常:
+            设置了风险控制时,超过撤单频率抛出异常
         """
+        if self.riskGate is not None:
+            self.riskGate.checkCancel()
+        self.flush()
         toOrder = ModelOrder.objects.get(id=orderId)
         order = ModelOrder()
         order.strategyExecuter = self.modelStrategyExecuter
@@ -152,7 +436,7 @@ class Trader(object):
         order.stopPrice = toOrder.stopPrice
         order.profitPrice = toOrder.profitPrice
         order.state = 'insert'
-        order.save()
+        self.saveModel(order)
 
         return order
 
@@ -165,6 +449,7 @@ class Trader(object):
         返回:
             order 止损修改单数据实体
         """
+        self.flush()
         position = ModelPosition.objects.get(id=positionId, state='open')
 
         # 创建修改止损订单
@@ -183,7 +468,7 @@ class Trader(object):
         order.profitPrice = position.profitPrice
         order.stopPrice = stopPrice
         order.state = 'insert'
-        order.save()
+        self.saveModel(order)
 
         return order
 
@@ -196,6 +481,7 @@ class Trader(object):
         返回:
             order 止损修改单数据实体
         """
+        self.flush()
         position = ModelPosition.objects.get(id=positionId, state='open')
 
         # 创建修改止损订单
@@ -214,7 +500,7 @@ class Trader(object):
         order.profitPrice = position.profitPrice
         order.profitPrice = profitPrice
         order.state = 'insert'
-        order.save()
+        self.saveModel(order)
 
         return order
 
@@ -227,12 +513,65 @@ class Trader(object):
         返回:
             positionList 符合查询条件的头寸列表(注意是列表不是生成器)
         """
+        self.flush()
         query = ModelPosition.objects.filter(strategyExecuter=self.modelStrategyExecuter)
         query = query.filter(**kwargs)
         if update:
             query = query.select_for_update()
         return list(query)
 
+    def reconcilePositions(self):
+        """
+        从数据库重新载入已打开(包括正在平仓)的头寸,与内存中的头寸簿核对
+        返回: 头寸簿中头寸的数量
+        """
+        self.flush()
+        query = ModelPosition.objects.filter(strategyExecuter=self.modelStrategyExecuter)
+        query = query.filter(state__in=('open', 'preclose'))
+        self.positionBook.reset(list(query))
+        if self.riskGate is not None:
+            query = ModelOrder.objects.filter(strategyExecuter=self.modelStrategyExecuter)
+            query = query.filter(action='open', state='insert')
+            self.riskGate.reset(self.positionBook.getPositionList(), list(query))
+        return len(self.positionBook)
+
+    def getLongVolume(self, instrumentId=None):
+        """
+        多头数量,不访问数据库
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        return self.positionBook.getLongVolume(instrumentId)
+
+    def getShortVolume(self, instrumentId=None):
+        """
+        空头数量,不访问数据库
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        return self.positionBook.getShortVolume(instrumentId)
+
+    def getNetVolume(self, instrumentId=None):
+        """
+        净头寸数量,多头为正,空头为负,不访问数据库
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+        """
+        return self.positionBook.getNetVolume(instrumentId)
+
+    def closeAll(self, instrumentId=None, direction=None):
+        """
+        平掉所有已打开的头寸,正在平仓的头寸不再重复平仓,平仓报单批量提交(见closePositions)
+        参数:
+            instrumentId 品种,默认为None表示全部品种
+            direction 头寸方向,默认为None表示全部方向
+        返回:
+            平仓报单列表
+        """
+        positionIdList = [position.id for position in self.positionBook.getPositionList(instrumentId, direction)
+                          if position.state == 'open']
+        return self.closePositions(positionIdList)
+
     def getOrderList(self, update=False, **kwargs):
         """
         挂单查询
@@ -242,6 +581,7 @@ class Trader(object):
         返回:
             orderList 服务查询条件的挂单列表(注意是列表不是生成器)
         """
+        self.flush()
         query = ModelOrder.objects.filter(strategyExecuter=self.modelStrategyExecuter)
         query = query.filter(**kwargs)
         if update:
@@ -259,11 +599,15 @@ class Trader(object):
         # 保存order状态
         order.state = 'finish'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
         # 保存position状态
         position.state = 'open'
         position.openTime = datetime.now()
-        position.save()
+        self.saveModel(position)
+        self.positionBook.add(position)
+        if self.riskGate is not None:
+            self.riskGate.onOpened(order, position)
+        self.__resolveFuture(order, order)
 
         # 将事件传入绑定函数
         parameters = {'order': order, 'position': position}
@@ -279,11 +623,15 @@ class Trader(object):
         """
         position.state = 'close'
         position.closeTime = datetime.now()
-        position.save()
+        self.saveModel(position)
+        self.positionBook.remove(position.id)
+        if self.riskGate is not None:
+            self.riskGate.onClosed(position)
 
         order.state = 'finish'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
+        self.__resolveFuture(order, order)
 
         # 将事件传入绑定函数
         parameters = {'order': order, 'position': position}
@@ -300,17 +648,20 @@ class Trader(object):
         # 设置取消单的状态
         order.state = 'finish'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
         # 设置报单状态
         toOrder.state = 'cancel'
         toOrder.finishTime = datetime.now()
-        toOrder.save()
+        self.saveModel(toOrder)
 
         # 设置头寸状态
         position = toOrder.position
         position.state = 'cancel'
-        position.save()
+        self.saveModel(position)
+        if self.riskGate is not None and toOrder.action == 'open':
+            self.riskGate.onOpenFailed(toOrder)
+        self.__resolveFuture(toOrder, cancel=True)
 
     def onStopPriceSetted(self, order, position):
         """
@@ -323,11 +674,12 @@ class Trader(object):
         # 设置订单完成状态
         order.state = 'finish'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
         # 设置头寸的的止损
         position.stopPrice = order.stopPrice
-        position.save()
+        self.saveModel(position)
+        self.positionBook.update(position)
 
     def onProfitPriceSetted(self, order, position):
         """
@@ -340,11 +692,12 @@ class Trader(object):
         # 设置订单完成状态
         order.state = 'finish'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
         # 设置头寸的的止损
         position.profitPrice = order.profitPrice
-        position.save()
+        self.saveModel(position)
+        self.positionBook.update(position)
 
     def onOpenPositionError(self, order, errorId, errorMsg, position):
         """
@@ -360,10 +713,13 @@ class Trader(object):
         order.state = 'error'
         order.errorId = errorId
         order.errorMsg = errorMsg
-        order.save()
+        self.saveModel(order)
         # 保存position状态信息
         position.state = 'error'
-        position.save()
+        self.saveModel(position)
+        if self.riskGate is not None:
+            self.riskGate.onOpenFailed(order)
+        self.__resolveFuture(order, exception=Exception('%d:%s' % (errorId, errorMsg)))
 
         # 将事件传入绑定函数
         parameters = {
@@ -389,11 +745,13 @@ class Trader(object):
         order.finishTime = datetime.now()
         order.errorId = errorId
         order.errorMsg = errorMsg
-        order.save()
+        self.saveModel(order)
         # 保存头寸状态信息(还原头寸的状态)
         position.state = 'open'
         position.closeLimitPrice = 0
-        order.save()
+        self.saveModel(position)
+        self.positionBook.update(position)
+        self.__resolveFuture(order, exception=Exception('%d:%s' % (errorId, errorMsg)))
 
         # 将事件传入绑定函数
         parameters = {
@@ -418,7 +776,7 @@ class Trader(object):
         order.errorMsg = errorMsg
         order.state = 'error'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
     def onSetProfitPriceError(self, order, errorId, errorMsg, position=None):
         """
@@ -434,7 +792,7 @@ class Trader(object):
         order.errorMsg = errorMsg
         order.state = 'error'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
     def onCancelOrderError(self, order, errorId, errorMsg, toOrder=None):
         """
@@ -450,25 +808,58 @@ class Trader(object):
         order.errorMsg = errorMsg
         order.state = 'error'
         order.finishTime = datetime.now()
-        order.save()
+        self.saveModel(order)
 
 
 class SimulateTrader(Trader):
     """
     模拟交易类接口
     NOTE: 对象清理的问题需要进一步考虑
+    NOTE: 挂单保存在内存报单簿(OrderBook)中,每次报价到达时只处理该品种可以成交的挂单,
+    数据库仅在报单和头寸状态变化时更新
     """
 
-    def __init__(self, modelStrategyExecuter=None):
+    def __init__(self, modelStrategyExecuter=None, journal=None, callbackManager=None, riskGate=None):
         """
         初始化处理
         """
         # 调用父类构造函数
-        super(SimulateTrader, self).__init__(modelStrategyExecuter)
+        super(SimulateTrader, self).__init__(modelStrategyExecuter, journal, callbackManager, riskGate)
 
         # 线程退出标识
         self.__running = False
 
+        # 内存报单簿及待处理的设置止损,设置止盈和撤单报单
+        self.__lock = threading.RLock()
+        self.__orderBook = OrderBook()
+        self.__setStopOrderList = []
+        self.__setProfitOrderList = []
+        self.__cancelOrderList = []
+        self.__loadOrderBook()
+
+    def __loadOrderBook(self):
+        """
+        从数据库中载入尚未完成的报单和已打开的头寸
+        """
+        for order in self.getOrderList(state='insert'):
+            self.__addOrder(order)
+        for position in self.getPositionList(state='open'):
+            self.__orderBook.addPosition(position)
+
+    def __addOrder(self, order):
+        """
+        将新的报单加入待处理队列
+        """
+        with self.__lock:
+            if order.action in ('open', 'close'):
+                self.__orderBook.addOrder(order)
+            elif order.action == 'setstop':
+                self.__setStopOrderList.append(order)
+            elif order.action == 'setprofit':
+                self.__setProfitOrderList.append(order)
+            elif order.action == 'cancel':
+                self.__cancelOrderList.append(order)
+
     def getRandomAddress():
         """
         获取一个随机的监听地址
@@ -503,29 +894,20 @@ class SimulateTrader(Trader):
     def processOpenOrder(self, instrumentId, ask, bid):
         """
         处理开仓报单
-        NOTE: 这里可能和取消订单操作出现资源争用问题
         """
         def _openPosition(order, price):
             # 设置成交报价
             position = order.position
             order.openPrice = price
             position.openPrice = price
+            # 登记头寸的止损止盈
+            self.__orderBook.addPosition(position)
             # 触发成交事件
             self.onPositionOpened(order, position)
 
-        # 尝试处理所有开仓报单
-        openOrderList = self.getOrderList(action='open', state='insert')
-        for order in openOrderList:
-            if order.instrumentId == instrumentId:
-                direction = order.direction
-                limitPrice = order.openLimitPrice
-                price = {'buy': bid, 'sell': ask}[direction]
-                la = {'buy': lambda x: x>=price, 'sell': lambda x: x<=price}[direction]
-                if limitPrice == 0:
-                    _openPosition(order, price)
-                else:
-                    if la(limitPrice):
-                        _openPosition(order, (price + limitPrice) / 2)
+        # 仅处理可以成交的开仓报单
+        for order, price in self.__orderBook.matchOrders(instrumentId, 'open', ask, bid):
+            _openPosition(order, price)
 
     def processCloseOrder(self, instrumentId, ask, bid):
         """
@@ -539,126 +921,160 @@ class SimulateTrader(Trader):
             # 触发成交事件
             self.onPositionClosed(order, position)
 
-        closeOrderList = self.getOrderList(action='close', state='insert')
-        for order in closeOrderList:
-            if order.instrumentId == instrumentId:
-                direction = order.direction
-                limitPrice = order.closeLimitPrice
-                price = {'buy': ask, 'sell': bid}[direction]
-                la = {'buy': lambda x: x<=price, 'sell': lambda x: x>=price}[direction]
-                if limitPrice == 0:
-                    _closePosition(order, price)
-                else:
-                    if la(limitPrice):
-                        _closePosition(order, (price + limitPrice) / 2)
+        # 仅处理可以成交的平仓报单
+        for order, price in self.__orderBook.matchOrders(instrumentId, 'close', ask, bid):
+            _closePosition(order, price)
 
     def processCancelOrder(self):
         """
         取消订单操作
         """
-        cancelOrderList = self.getOrderList(action='cancel', state='insert')
+        cancelOrderList, self.__cancelOrderList = self.__cancelOrderList, []
         for order in cancelOrderList:
-            toOrder = order.order
-            if len(self.getOrderList(id=toOrder.id, state='insert')) >= 1:
+            toOrder = self.__orderBook.removeOrder(order.order_id)
+            if toOrder is not None:
                 self.onOrderCanceled(order, toOrder)
             else:
                 errorId, errorMsg = error.OrderNoActive
-                self.onCancelOrderError(order, errorId, errorMsg, toOrder)
+                self.onCancelOrderError(order, errorId, errorMsg, order.order)
 
     def processSetStopPrice(self):
         """
         处理止损设置
         """
-        setStopOrderList = self.getOrderList(action='setstop', state='insert')
+        setStopOrderList, self.__setStopOrderList = self.__setStopOrderList, []
         for order in setStopOrderList:
             position = order.position
             self.onStopPriceSetted(order, position)
+            self.__orderBook.updatePosition(position)
 
     def processSetProfitPrice(self):
         """
         处理止盈设置
         """
-        setProfitOrderList = self.getOrderList(action='setprofit', state='insert')
+        setProfitOrderList, self.__setProfitOrderList = self.__setProfitOrderList, []
         for order in setProfitOrderList:
             position = order.position
             self.onProfitPriceSetted(order, position)
+            self.__orderBook.updatePosition(position)
 
     def processStopPrice(self, instrumentId, ask, bid):
         """
         处理止损
+        多头头寸在ask小于等于止损价时平仓,空头头寸在bid大于等于止损价时平仓
         """
-        openPositionList = self.getPositionList(state='open')
-        for position in openPositionList:
-            direction = position.direction
-            price = {'buy': ask, 'sell': bid}[direction]
-            la = {'buy': lambda x: price<=x, 'sell': lambda x: price>=x}[direction]
-            if position.stopPrice != 0:
-                if la(position.stopPrice):
-                    self.closePosition(position.id)
+        for position in self.__orderBook.matchTriggers(instrumentId, 'stop', ask, bid):
+            self.closePosition(position.id)
 
     def processProfitPrice(self, instrumentId, ask, bid):
         """
         处理止盈
+        多头头寸在ask大于等于止盈价时平仓,空头头寸在bid小于等于止盈价时平仓
         """
-        openPositionList = self.getPositionList(state='open')
-        for position in openPositionList:
-            direction = position.direction
-            price = {'buy': ask, 'sell': bid}[direction]
-            la = {'buy': lambda x: price>=x, 'sell': lambda x: price>=x}[direction]
-            if position.profitPrice != 0:
-                if la(position.profitPrice):
-                    self.closePosition(position.id)
+        for position in self.__orderBook.matchTriggers(instrumentId, 'profit', ask, bid):
+            self.closePosition(position.id)
 
     def onDataArrived(self, instrumentId, ask, bid):
         """
         品种的最近报价到达
         """
-        # 处理止损设置
-        self.processSetStopPrice()
-        # 处理止盈设置
-        self.processSetProfitPrice()
-        # 处理止损
-        self.processStopPrice(instrumentId, ask, bid)
-        # 处理止盈
-        self.processProfitPrice(instrumentId, ask, bid)
-        # 处理开仓报单
-        self.processOpenOrder(instrumentId, ask, bid)
-        # 处理平仓报单
-        self.processCloseOrder(instrumentId, ask, bid)
-        # 处理撤单
-        self.processCancelOrder()
+        with self.__lock:
+            # 处理止损设置
+            self.processSetStopPrice()
+            # 处理止盈设置
+            self.processSetProfitPrice()
+            # 处理止损
+            self.processStopPrice(instrumentId, ask, bid)
+            # 处理止盈
+            self.processProfitPrice(instrumentId, ask, bid)
+            # 处理开仓报单
+            self.processOpenOrder(instrumentId, ask, bid)
+            # 处理平仓报单
+            self.processCloseOrder(instrumentId, ask, bid)
+            # 处理撤单
+            self.processCancelOrder()
 
     def openPosition(self, *args, **kwargs):
         """
         打开头寸的处理
         """
         order = super(SimulateTrader, self).openPosition(*args, **kwargs)
+        self.__addOrder(order)
         return order
 
     def closePosition(self, *args, **kwargs):
         """
         关闭头寸的处理
         """
-        order = super(SimulateTrader, self).closePosition(*args, **kwargs)
+        with self.__lock:
+            order = super(SimulateTrader, self).closePosition(*args, **kwargs)
+            # 头寸进入预平仓状态,不再检查止损止盈
+            self.__orderBook.removePosition(order.position_id)
+            self.__addOrder(order)
         return order
 
+    def openPositions(self, *args, **kwargs):
+        """
+        批量开仓的处理
+        """
+        orderList = super(SimulateTrader, self).openPositions(*args, **kwargs)
+        for order in orderList:
+            self.__addOrder(order)
+        return orderList
+
+    def closePositions(self, *args, **kwargs):
+        """
+        批量平仓的处理
+        """
+        with self.__lock:
+            orderList = super(SimulateTrader, self).closePositions(*args, **kwargs)
+            for order in orderList:
+                self.__orderBook.removePosition(order.position_id)
+                self.__addOrder(order)
+        return orderList
+
     def cancelOrder(self, *args, **kwargs):
         """
         撤单处理
         """
         order = super(SimulateTrader, self).cancelOrder(*args, **kwargs)
+        self.__addOrder(order)
+        return order
+
+    def setStopPrice(self, *args, **kwargs):
+        """
+        设置止损的处理
+        """
+        order = super(SimulateTrader, self).setStopPrice(*args, **kwargs)
+        self.__addOrder(order)
+        return order
+
+    def setProfitPrice(self, *args, **kwargs):
+        """
+        设置止盈的处理
+        """
+        order = super(SimulateTrader, self).setProfitPrice(*args, **kwargs)
+        self.__addOrder(order)
         return order
 
 
+# CTP报单已结束的状态: 全部成交,部分成交不在队列中,未成交不在队列中,撤单
+CTP_ORDER_STATUS_FINISHED = ('0', '2', '4', '5')
+
+
 class _CTPTrader(Trader):
     """
     CTP交易接口
     """
 
-    def __init__(self, frontAddress, brokerID, userID, password, modelStrategyExecuter=None):
+    def __init__(self, frontAddress, brokerID, userID, password, modelStrategyExecuter=None, journal=None,
+                 callbackManager=None, riskGate=None):
         """
         初始化处理
         """
+        global pyctp
+        import pyctp
+
         # 保存ctp信息到实例变量
         self.frontAddress = frontAddress
         self.brokerID = brokerID
@@ -667,6 +1083,9 @@ class _CTPTrader(Trader):
 
         # 创建CTP Trader交易接口
         self.ctp = pyctp.Trader(frontAddress, brokerID, userID, password)
+        self.requestManager = RequestManager()
+        self.orderRegistry = OrderRegistry()
+        self.orderFieldPool = InputOrderFieldPool(pyctp.struct.CThostFtdcInputOrderField, brokerID, userID)
         self.__SettlementInfoConfirm()
 
         # 绑定ctp接口的相关回调函数
@@ -676,16 +1095,15 @@ class _CTPTrader(Trader):
         self.ctp.bind(pyctp.callback.OnRtnTrade, self.__OnRtnTrade)
 
         # 调用父类构造函数
-        super(_CTPTrader, self).__init__(modelStrategyExecuter)
+        super(_CTPTrader, self).__init__(modelStrategyExecuter, journal, callbackManager, riskGate)
 
-    def __SettlementInfoConfirm(self):
+    def __SettlementInfoConfirm(self, timeout=5):
         """
         确认昨日成交信息
         """
-        result = []
-
         def OnRspSettlementInfoConfirm(**kwargs):
-            result.append(kwargs)
+            self.requestManager.onResponse(
+                'SettlementInfoConfirm', kwargs.get('Data'), kwargs.get('IsLast', True), getRspError(kwargs))
 
         # 调用确认交易信息接口
         self.ctp.bind(pyctp.callback.OnRspSettlementInfoConfirm, OnRspSettlementInfoConfirm)
@@ -694,14 +1112,18 @@ class _CTPTrader(Trader):
         data.InvestorID = self.userID
         data.ConfirmDate = ''
         data.ConfirmTime = ''
-        self.ctp.ReqSettlementInfoConfirm(data)
-        wait(lambda: len(result)>0)
-
-        # 检查返回结果
-        errorId = result[0]['RspInfo']['ErrorID']
-        errorMsg = result[0]['RspInfo']['ErrorMsg']
-        if errorId != 0:
-            raise Exception("%d:%s" % (errorId, errorMsg))
+        requestId, future = self.requestManager.newRequest('SettlementInfoConfirm')
+        try:
+            self.ctp.ReqSettlementInfoConfirm(data)
+        except:
+            self.requestManager.discard(requestId)
+            raise
+
+        # 等待返回结果,出错时抛出异常
+        try:
+            future.result(timeout)
+        finally:
+            self.requestManager.cancel(requestId)
 
     def __OnRspOrderInsert(self, **kwargs):
         """
@@ -714,16 +1136,16 @@ class _CTPTrader(Trader):
 
         # 读取CTP接口的返回数据
         data = kwargs['Data']
-        orderRef = data['OrderRef']
         print data
 
         # 关联出原始报单对象和头寸信息
-        orderId = int(orderRef)
-        order = ModelOrder.objects.get(id=orderId)
-        position = order.position
+        order = self.orderRegistry.get(data)
+        if order.state != 'insert':
+            return
 
         # 触发出错事件
-        self.onOpenPositionError(order, errorId, errorMsg, position)
+        self.orderRegistry.remove(order)
+        self.__onOrderError(order, errorId, errorMsg)
 
     def __OnErrRtnOrderInsert(self, **kwargs):
         """
@@ -736,94 +1158,97 @@ class _CTPTrader(Trader):
     def __OnRtnOrder(self, **kwargs):
         """
         订单状态修改回报信息
+        报单结束时(全部成交,部分成交后撤单,未成交撤单)以VolumeTraded作为最终的成交数量,
+        成交回报可能在报单回报之后到达,收到全部成交回报后才结束报单
         """
         # 读取CTP接口的返回数据
         data = kwargs['Data']
         orderStatus = data['OrderStatus']
         statusMsg = data['StatusMsg']
-        orderRef = data['OrderRef']
 
         # 关联出原始报单对象和头寸信息
-        orderId = int(orderRef)
-        order = ModelOrder.objects.get(id=orderId)
-        position = order.position
+        order = self.orderRegistry.get(data)
 
         print 'OnRtnOrder() : OrderStatus=%s, StatusMsg=%s' % (orderStatus, statusMsg)
         print data
-        if orderStatus not in ['0', 'a']:
-            # TODO: 这个地方的错误代码要如何返回
-            errorId = -1
-            errorMsg = "%s:%s" % (orderStatus, statusMsg)
-            # 触发出错事件
-            self.onOpenPositionError(order, errorId, errorMsg, position)
+        if order.state != 'insert' or orderStatus not in CTP_ORDER_STATUS_FINISHED:
+            return
+
+        fill = self.orderRegistry.getFill(order)
+        fill.targetVolume = data['VolumeTraded']
+        self.__finishFill(order, fill, "%s:%s" % (orderStatus, statusMsg))
 
     def __OnRtnTrade(self, **kwargs):
         """
-        订单处理完成回报
-        NOTE: 只有订单处理成功才会收到此信息
+        成交回报
+        每笔成交累加到报单的成交汇总中,全部成交后才触发头寸建立(或平仓)事件
         """
-        print 'OnRtnTrade() : 已调用，报单执行成功!'
-        print(kwargs['Data'])
-
         # 读取CTP接口的返回数据
         data = kwargs['Data']
-        orderRef = data['OrderRef']
+        print 'OnRtnTrade() : TradeID=%s, Price=%s, Volume=%s' % (data.get('TradeID'), data['Price'], data['Volume'])
 
         # 关联出原始报单对象和头寸信息
-        orderId = int(orderRef)
-        order = ModelOrder.objects.get(id=orderId)
+        order = self.orderRegistry.get(data)
+        if order.state != 'insert':
+            return
         position = order.position
 
+        # 更新成交数量和成交均价,成交编号和成交数量一起保存,重启后CTP重新推送的成交不会重复计入
+        fill = self.orderRegistry.getFill(order)
+        if not fill.add(data.get('TradeID'), data['Price'], data['Volume']):
+            return
+        order.tradeVolume = fill.tradeVolume
+        order.tradeIdList = json.dumps(fill.getTradeIdList())
         if order.action == 'open':
-            order.openPrice = data['Price']
-            position.openPrice = data['Price']
-            self.onPositionOpened(order, position)
-
+            order.openPrice = position.openPrice = fill.averagePrice()
         if order.action == 'close':
-            order.closePrice = data['Price']
-            position.closePrice = data['Price']
-            self.onPositionClosed(order, position)
+            order.closePrice = position.closePrice = fill.averagePrice()
+
+        if fill.isFilled():
+            self.__finishFill(order, fill)
+        else:
+            # 记录部分成交的进度,重启后可以继续汇总
+            self.saveModel(order)
 
-    def __getInsertOrderField(self, order):
+    def __finishFill(self, order, fill, statusMsg=''):
         """
-        获取一个有效的建单数据格式
-        将报单转化为CTP报单格式
+        报单的成交数量达到目标后结束报单
+        全部成交时触发头寸建立(或平仓)事件;
+        部分成交的开仓单按已成交的数量建立头寸,部分成交的平仓单扣减头寸数量后按平仓出错处理;
+        没有成交时按出错处理
         """
-        inputOrderField = pyctp.struct.CThostFtdcInputOrderField()
-        inputOrderField.BrokerID = self.brokerID
-        inputOrderField.InvestorID = self.userID
-        inputOrderField.InstrumentID = order.instrumentId
-        inputOrderField.OrderRef = orderId2Ref(order.id)  # 将orderId转化为CTP接口的orderRef
-        inputOrderField.UserID = self.userID
-        inputOrderField.OrderPriceType = '1'  # 任意价
+        if not fill.isFilled():
+            return
+        self.orderRegistry.remove(order)
+        position = order.position
+
+        if fill.tradeVolume == 0:
+            errorId = error.OrderNotFilled[0]
+            self.__onOrderError(order, errorId, statusMsg or error.OrderNotFilled[1])
+            return
 
-        # inputOrderField.Direction = '0'  # 买
-        # inputOrderField.CombOffsetFlag = '0'  # 开仓
         if order.action == 'open':
-            inputOrderField.CombOffsetFlag = '0'
-            inputOrderField.Direction = {'buy': '0', 'sell': '1'}[order.direction]
-        elif order.action == 'close':
-            inputOrderField.CombOffsetFlag = '1'
-            inputOrderField.Direction = {'buy': '1', 'sell': '0'}[order.direction]
+            position.volume = fill.tradeVolume
+            self.onPositionOpened(order, position)
+
+        if order.action == 'close':
+            if fill.tradeVolume >= position.volume:
+                self.onPositionClosed(order, position)
+            else:
+                position.volume -= fill.tradeVolume
+                if self.riskGate is not None:
+                    self.riskGate.onPartiallyClosed(position, fill.tradeVolume)
+                errorId = error.OrderPartiallyFilled[0]
+                self.onClosePositionError(order, errorId, statusMsg or error.OrderPartiallyFilled[1], position)
+
+    def __onOrderError(self, order, errorId, errorMsg):
+        """
+        按报单类型触发出错事件
+        """
+        if order.action == 'close':
+            self.onClosePositionError(order, errorId, errorMsg, order.position)
         else:
-            raise Exception(u'未知的操作方向')
-
-        inputOrderField.CombHedgeFlag = '1'  # 投机
-        inputOrderField.LimitPrice = 0  # 限价 0表不限制
-        inputOrderField.VolumeTotalOriginal = order.volume  # 手数
-        inputOrderField.TimeCondition = '1'  # 立即完成否则撤消
-        inputOrderField.GTDDate = ''
-        inputOrderField.VolumeCondition = '1'  # 成交类型  '1' 任何数量  '2' 最小数量 '3'全部数量
-        inputOrderField.MinVolume = order.volume  # 最小数量
-        inputOrderField.ContingentCondition = '1'  # 触发类型 '1' 立即否则撤消
-        inputOrderField.StopPrice = 0  # 止损价
-        inputOrderField.ForceCloseReason = '0'  # 强平标识 '0'非强平
-        inputOrderField.IsAutoSuspend = 0  # 自动挂起标识
-        inputOrderField.BusinessUnit = ''  # 业务单元
-        inputOrderField.RequestID = 1
-        inputOrderField.UserForceClose = 0  # 用户强平标识
-        inputOrderField.IsSwapOrder = 0  # 互换单标识
-        return inputOrderField
+            self.onOpenPositionError(order, errorId, errorMsg, order.position)
 
     def openPosition(self, *args, **kwargs):
         """
@@ -831,9 +1256,15 @@ class _CTPTrader(Trader):
         """
         # 调用父类方法
         order = super(_CTPTrader, self).openPosition(*args, **kwargs)
-        # 向CTP接口进行报单操作
-        data = self.__getInsertOrderField(order)
-        self.ctp.ReqOrderInsert(data)
+        # 登记报单,回报时不需要查询数据库
+        self.orderRegistry.register(order)
+        # 向CTP接口进行报单操作,报单数据从模板池中获取
+        data = self.orderFieldPool.acquire(order)
+        try:
+            self.ctp.ReqOrderInsert(data)
+        finally:
+            self.orderFieldPool.release(data)
+        latencyRecorder.recordOrder(order)
         # 返回报单的数据实例
         return order
 
@@ -843,12 +1274,53 @@ class _CTPTrader(Trader):
         """
         # 调用父类方法
         order = super(_CTPTrader, self).closePosition(*args, **kwargs)
-        # 向CTP接口进行报单操作
-        data = self.__getInsertOrderField(order)
-        self.ctp.ReqOrderInsert(data)
+        # 登记报单,回报时不需要查询数据库
+        self.orderRegistry.register(order)
+        # 向CTP接口进行报单操作,报单数据从模板池中获取
+        data = self.orderFieldPool.acquire(order)
+        try:
+            self.ctp.ReqOrderInsert(data)
+        finally:
+            self.orderFieldPool.release(data)
+        latencyRecorder.recordOrder(order)
         # 返回报单的数据实例
         return order
 
+    def openPositions(self, *args, **kwargs):
+        """
+        批量开仓的处理
+        """
+        orderList = super(_CTPTrader, self).openPositions(*args, **kwargs)
+        self.__insertOrders(orderList)
+        return orderList
+
+    def closePositions(self, *args, **kwargs):
+        """
+        批量平仓的处理
+        """
+        orderList = super(_CTPTrader, self).closePositions(*args, **kwargs)
+        self.__insertOrders(orderList)
+        return orderList
+
+    def __insertOrders(self, orderList):
+        """
+        登记报单并连续向CTP接口报单
+        NOTE: 先准备好全部CTP报单数据再逐个发送,缩短第一笔和最后一笔报单之间的间隔
+        各报单的时延按最后一笔报单发出的时间记录
+        """
+        dataList = []
+        for order in orderList:
+            self.orderRegistry.register(order)
+            dataList.append(self.orderFieldPool.acquire(order))
+        try:
+            for data in dataList:
+                self.ctp.ReqOrderInsert(data)
+        finally:
+            for data in dataList:
+                self.orderFieldPool.release(data)
+        for order in orderList:
+            latencyRecorder.recordOrder(order)
+
 
 class CTPTrader(object):
     """
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+from comhelper import getTickTime, datetime2ns, ns2datetime
+from latency import monotonicNs
+from datetime import datetime
+import numpy
+import struct
+import json
+
+# 二进制行情消息的格式版本
+TICK_VERSION = 2
+
+# 二进制行情消息格式(小端,无对齐):
+# 版本号,标识(保留),保留,时间戳(纳秒),卖价,买价,卖量,买量,最新价,成交量,
+# 数据生成器收到行情的时间,广播发送的时间(单调时钟纳秒,见latency.monotonicNs)
+TICK_STRUCT = struct.Struct('<BBHqddiidqqq')
+
+# 版本1的消息格式,没有最后两个时间戳,仍然可以解码
+TICK_STRUCT_V1 = struct.Struct('<BBHqddiidq')
+
+# 与TICK_STRUCT内存布局相同的numpy数据类型,用于批量解码
+TICK_DTYPE = numpy.dtype([
+    ('version', 'u1'),
+    ('flags', 'u1'),
+    ('reserved', '<u2'),
+    ('timestamp', '<i8'),
+    ('ask', '<f8'),
+    ('bid', '<f8'),
+    ('askVolume', '<i4'),
+    ('bidVolume', '<i4'),
+    ('lastPrice', '<f8'),
+    ('volume', '<i8'),
+    ('recvTime', '<i8'),
+    ('sendTime', '<i8'),
+])
+assert TICK_DTYPE.itemsize == TICK_STRUCT.size
+
+# 二进制棒线消息的格式版本
+BAR_VERSION = 1
+
+# 二进制棒线消息格式(小端,无对齐): 1字节版本号,之后为各根棒线:
+# 周期(8字节,右补0),起始时间,结束时间(纳秒),开盘价,最高价,最低价,收盘价,成交量
+BAR_STRUCT = struct.Struct('<8sqqddddq')
+
+# 行情消息格式
+MESSAGE_FORMAT_BINARY = 'binary'
+MESSAGE_FORMAT_JSON = 'json'
+
+
+def encodeTick(timestamp, ask, bid, askVolume, bidVolume, lastPrice=0, volume=0, recvTime=0, sendTime=0):
+    """
+    编码二进制行情消息
+    参数:
+        timestamp 纳秒时间戳,见comhelper.datetime2ns
+        ask,bid,askVolume,bidVolume 一档报价
+        lastPrice 最新价
+        volume 成交量
+        recvTime 数据生成器收到行情的时间,0表示没有记录
+        sendTime 广播发送的时间,0表示没有记录
+    返回:
+        二进制字符串
+    """
+    return TICK_STRUCT.pack(
+        TICK_VERSION, 0, 0, timestamp, ask, bid, askVolume, bidVolume, lastPrice, volume, recvTime, sendTime)
+
+
+def decodeTick(payload):
+    """
+    解码二进制行情消息
+    返回:
+        字典结构的行情数据,字段与JSON格式一致,dataTime为datetime,
+        recvTime和sendTime为各环节的时间戳,版本1的消息为0
+    """
+    version = ord(payload[0])
+    if version == TICK_VERSION:
+        _, _, _, timestamp, ask, bid, askVolume, bidVolume, lastPrice, volume, recvTime, sendTime = \
+            TICK_STRUCT.unpack(payload)
+    elif version == 1:
+        _, _, _, timestamp, ask, bid, askVolume, bidVolume, lastPrice, volume = TICK_STRUCT_V1.unpack(payload)
+        recvTime = sendTime = 0
+    else:
+        raise Exception(u'不支持的行情消息版本:%d' % version)
+    return {
+        'ask': ask,
+        'bid': bid,
+        'askVolume': askVolume,
+        'bidVolume': bidVolume,
+        'lastPrice': lastPrice,
+        'volume': volume,
+        'timestamp': timestamp,
+        'dataTime': ns2datetime(timestamp),
+        'recvTime': recvTime,
+        'sendTime': sendTime,
+    }
+
+
+def decodeTickInto(payload, buffer, index=0):
+    """
+    将二进制行情消息解码到预先分配的数组中,不创建新的对象
+    参数:
+        payload 二进制行情消息
+        buffer dtype为TICK_DTYPE的numpy数组
+        index 写入的位置
+    """
+    version = ord(payload[0])
+    if version == TICK_VERSION:
+        size = TICK_STRUCT.size
+    elif version == 1:
+        size = TICK_STRUCT_V1.size
+    else:
+        raise Exception(u'不支持的行情消息版本:%d' % version)
+    row = buffer[index:index + 1].view(numpy.uint8)
+    row[:size] = numpy.frombuffer(payload, numpy.uint8, size)
+    row[size:] = 0
+
+
+def encodeBars(barList, messageFormat=MESSAGE_FORMAT_BINARY):
+    """
+    编码广播消息中的棒线数据(BarData)
+    参数:
+        barList 已完成的棒线列表(bar.Bar)
+        messageFormat 'binary' 二进制, 'json' JSON
+    返回:
+        字符串,没有棒线时为空字符串
+    """
+    if not barList:
+        return ''
+    if messageFormat == MESSAGE_FORMAT_JSON:
+        return json.dumps([bar.toDict() for bar in barList])
+    parts = [chr(BAR_VERSION)]
+    for bar in barList:
+        parts.append(BAR_STRUCT.pack(
+            str(bar.period), bar.beginTime, bar.endTime, bar.open, bar.high, bar.low, bar.close, bar.volume))
+    return ''.join(parts)
+
+
+def decodeBars(payload, instrumentId=None):
+    """
+    解码棒线数据,根据内容自动识别二进制和JSON格式
+    参数:
+        payload 棒线数据
+        instrumentId 品种,二进制格式中不包含品种
+    返回:
+        字典列表,字段与bar.Bar相同
+    """
+    if not payload:
+        return []
+    if payload[:1] == '[':
+        return json.loads(payload)
+    version = ord(payload[0])
+    if version != BAR_VERSION:
+        raise Exception(u'不支持的棒线消息版本:%d' % version)
+    result = []
+    for offset in range(1, len(payload), BAR_STRUCT.size):
+        period, beginTime, endTime, open, high, low, close, volume = BAR_STRUCT.unpack_from(payload, offset)
+        result.append({
+            'instrumentId': instrumentId,
+            'period': period.rstrip('\0'),
+            'beginTime': beginTime,
+            'endTime': endTime,
+            'open': open,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+        })
+    return result
+
+
+def encodeMarketData(rawMarketData, messageFormat=MESSAGE_FORMAT_BINARY, recvTime=0):
+    """
+    将CTP行情数据编码为广播消息
+    消息格式:[品种编号(InstrumentID),报价数据(MarketData),棒线数据(BarData),指标数据(IndexData)]
+    参数:
+        rawMarketData CThostFtdcDepthMarketDataField的字典结构
+        messageFormat 报价数据的格式,'binary' 二进制, 'json' JSON(用于调试)
+        recvTime 数据生成器收到行情的时间(单调时钟纳秒),编码时记录发送时间
+    返回:
+        消息列表
+    """
+    instrumentID = rawMarketData['InstrumentID']
+    tradingDay = rawMarketData['TradingDay']
+    updateTime = rawMarketData['UpdateTime']
+    updateMillisec = rawMarketData['UpdateMillisec']
+    actionDay = rawMarketData.get('ActionDay') or tradingDay
+
+    if messageFormat == MESSAGE_FORMAT_BINARY:
+        timestamp = datetime2ns(getTickTime(tradingDay, updateTime, updateMillisec, actionDay))
+        marketData = encodeTick(
+            timestamp,
+            rawMarketData['AskPrice1'],
+            rawMarketData['BidPrice1'],
+            rawMarketData['AskVolume1'],
+            rawMarketData['BidVolume1'],
+            rawMarketData['LastPrice'],
+            rawMarketData['Volume'],
+            recvTime,
+            monotonicNs()
+        )
+    elif messageFormat == MESSAGE_FORMAT_JSON:
+        marketData = json.dumps({
+            'ask': rawMarketData['AskPrice1'],
+            'bid': rawMarketData['BidPrice1'],
+            'askVolume': rawMarketData['AskVolume1'],
+            'bidVolume': rawMarketData['BidVolume1'],
+            'timeString': "%s %s %6d" % (actionDay, updateTime, int(updateMillisec) * 1000),
+            'timeFormat': u'%Y%m%d %H:%M:%S %f',
+            'recvTime': recvTime,
+            'sendTime': monotonicNs(),
+        })
+    else:
+        raise Exception(u'未知的消息格式:%s' % messageFormat)
+
+    return [instrumentID, marketData, '', '']
+
+
+def decodeMarketData(messages):
+    """
+    解码广播消息中的报价数据,根据消息内容自动识别二进制和JSON格式
+    参数:
+        messages 接收到的消息列表
+    返回:
+        字典结构的行情数据,包含instrumentID和dataTime,消息中有棒线数据时包含bars(见decodeBars)
+    """
+    payload = messages[1]
+    if payload[:1] == '{':
+        data = json.loads(payload)
+        data['dataTime'] = datetime.strptime(data['timeString'], data['timeFormat'])
+    else:
+        data = decodeTick(payload)
+    data['instrumentID'] = messages[0]
+    if len(messages) > 2 and messages[2]:
+        data['bars'] = decodeBars(messages[2], messages[0])
+    return data